@@ -0,0 +1,146 @@
+import argparse
+from datetime import date, timedelta
+import statistics
+import sys
+import time
+import uuid
+
+from wanderly.cache import NullCache
+from wanderly.database import Database, get_pool
+from wanderly.utils import decode_cursor, encode_cursor
+
+# The trips list before and after `flask archive run`, for one traveler
+# with a growing history of past trips:
+#   PYTHONPATH=src python -m benchmarks.archive
+# Past trips all return before 2000, before anything `flask seed-bulk`
+# generates, so only the benchmark's own traveler is archived. Exits
+# non-zero when the archived trips list slows down as the history grows.
+HISTORIES = (0, 1000, 4000, 16000)
+
+UPCOMING_TRIPS = 24
+PLANS_PER_TRIP = 10
+TRIPS_PER_PAGE = 8
+CUTOFF = date(2000, 1, 1)
+
+# Allowed growth of the archived trips list p95 over the smallest history.
+TOLERANCE = 1.5
+SLACK_MS = 1.0
+
+
+def add_trips(user_id, count, first_day):
+    # `count` trips of a week each, a day apart from `first_day` on, with
+    # their plans.
+    with get_pool().connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                           WITH new_trips AS (
+                               INSERT INTO trips (destination, depart_date,
+                                                  return_date, user_id)
+                               SELECT 'Trip ' || n, %(first)s::date + n,
+                                      %(first)s::date + n + 7, %(user_id)s
+                               FROM generate_series(1, %(count)s) AS n
+                               RETURNING id, depart_date
+                           )
+                           INSERT INTO plans (at_date, at_time, activity,
+                                              cost, note, trip_id)
+                           SELECT depart_date + n %% 7,
+                                  time '08:00' + n * interval '1 hour',
+                                  'Activity ' || n, n * 5, 'Book ahead', id
+                           FROM new_trips, generate_series(1, %(plans)s) AS n
+                           """, {'user_id': user_id, 'count': count,
+                                 'first': first_day,
+                                 'plans': PLANS_PER_TRIP})
+        conn.commit()
+
+
+def timed(run, iterations):
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        run()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {
+        'p50_ms': statistics.median(timings),
+        'p95_ms': timings[int(len(timings) * 0.95) - 1],
+    }
+
+
+def trips_list(storage, user_id):
+    # The first trips page and the one after it, as the dashboard reads
+    # them.
+    page = storage.get_trips_page(user_id, TRIPS_PER_PAGE)
+    if page['has_more']:
+        cursor = decode_cursor(encode_cursor(page['trips'][-1]))
+        storage.get_trips_page(user_id, TRIPS_PER_PAGE, after=cursor)
+
+
+def past_trips(storage, user_id):
+    page = storage.get_past_trips_page(user_id, TRIPS_PER_PAGE)
+    if page['has_more']:
+        last = page['trips'][-1]
+        storage.get_past_trips_page(user_id, TRIPS_PER_PAGE,
+                                    (last['return_date'].isoformat(),
+                                     last['id']))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks.archive',
+        description="Trips list latency before and after archiving.",
+        )
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--histories', type=int, nargs='+',
+                        default=HISTORIES)
+    args = parser.parse_args(argv)
+
+    storage = Database(cache=NullCache())
+    user_id = storage.create_new_user(
+        'Archive Benchmark', f'{uuid.uuid4().hex}@bench.wanderly.test', 'x')
+    rows = []
+    try:
+        add_trips(user_id, UPCOMING_TRIPS, date(2030, 1, 1))
+        print(f"{'past trips':<12}{'list p50':>10}{'list p95':>10}"
+              f"{'archived':>10}{'p95':>10}{'moved in':>10}"
+              f"{'past p95':>10}")
+        for size in sorted(args.histories):
+            add_trips(user_id, size, CUTOFF - timedelta(size + 8))
+
+            before = timed(lambda: trips_list(storage, user_id),
+                           args.iterations)
+            started = time.perf_counter()
+            while storage.archive_trips(CUTOFF):
+                pass
+            moved_s = time.perf_counter() - started
+            after = timed(lambda: trips_list(storage, user_id),
+                          args.iterations)
+            past = timed(lambda: past_trips(storage, user_id),
+                         args.iterations)
+
+            # Each size starts from an empty archive.
+            with get_pool().connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute('DELETE FROM trips_archive '
+                                   'WHERE user_id = %s', (user_id,))
+                conn.commit()
+
+            rows.append((size, after['p95_ms']))
+            print(f"{size:<12}{before['p50_ms']:>10.2f}"
+                  f"{before['p95_ms']:>10.2f}{after['p50_ms']:>10.2f}"
+                  f"{after['p95_ms']:>10.2f}{moved_s:>9.2f}s"
+                  f"{past['p95_ms']:>10.2f}")
+    finally:
+        storage.close()
+        with get_pool().connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute('DELETE FROM users WHERE id = %s', (user_id,))
+            conn.commit()
+
+    smallest, largest = rows[0][1], rows[-1][1]
+    if largest > smallest * TOLERANCE + SLACK_MS:
+        sys.exit(f"archived trips list p95 grew from {smallest:.2f} ms to "
+                 f"{largest:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+import http.cookiejar
+import re
+import urllib.error
+import urllib.parse
+import urllib.request
+
+_QUERY_COUNT = re.compile(r'db;[^,]*desc="(\d+) queries"')
+
+
+def query_count(server_timing):
+    # The app reports its queries in the Server-Timing header's db entry.
+    match = _QUERY_COUNT.search(server_timing or '')
+    return int(match.group(1)) if match else None
+
+
+class InProcessDriver:
+    # Drives the app through Flask's test client.
+    name = 'inprocess'
+
+    def __init__(self):
+        from wanderly.app import app  # pylint: disable=import-outside-toplevel
+        app.config['SERVER_TIMING'] = True
+        self.app = app
+
+    def session(self):
+        return InProcessSession(self.app.test_client())
+
+
+class InProcessSession:
+
+    def __init__(self, client):
+        self.client = client
+
+    def request(self, method, path, data=None):
+        response = self.client.open(path, method=method, data=data)
+        response.close()
+        return (response.status_code,
+                query_count(response.headers.get('Server-Timing')))
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HttpDriver:
+    # Drives a running server (e.g. gunicorn) over HTTP. Query counts need
+    # the server to send Server-Timing (WANDERLY_SERVER_TIMING=1).
+    name = 'http'
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+
+    def session(self):
+        return HttpSession(self.base_url)
+
+
+class HttpSession:
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()),
+            _NoRedirect,
+            )
+
+    def request(self, method, path, data=None):
+        body = urllib.parse.urlencode(data).encode() if data else None
+        request = urllib.request.Request(
+            self.base_url + path,
+            data=body,
+            method=method,
+            )
+        try:
+            with self.opener.open(request) as response:
+                response.read()
+                return (response.status,
+                        query_count(response.headers.get('Server-Timing')))
+        except urllib.error.HTTPError as error:
+            error.read()
+            return error.code, query_count(error.headers.get('Server-Timing'))
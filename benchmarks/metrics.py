@@ -0,0 +1,35 @@
+import argparse
+import time
+
+from wanderly.metrics import Metrics
+from wanderly.tracing import Trace
+
+# Cost of recording one request's metrics, the work record_metrics adds to
+# every response. Run with PROMETHEUS_MULTIPROC_DIR set to measure the
+# multiprocess (gunicorn) mode.
+#   PYTHONPATH=src python -m benchmarks.metrics
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.metrics')
+    parser.add_argument('--requests', type=int, default=50_000)
+    args = parser.parse_args(argv)
+
+    metrics = Metrics()
+    trace = Trace()
+    for method in ('find_trip_for_user', 'get_itinerary_page'):
+        trace.method = method
+        trace.record_query('SELECT 1', 'SELECT 1', 0.001, 1)
+
+    started = time.perf_counter()
+    for _ in range(args.requests):
+        metrics.record_request('show_trip_schedule', 'GET', 200, 0.01, trace)
+        metrics.gauges_due()
+    elapsed = time.perf_counter() - started
+
+    mode = 'multiprocess' if metrics.multiprocess else 'single process'
+    print(f"{elapsed / args.requests * 1e6:.1f}us per request ({mode})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+import argparse
+import json
+import statistics
+import time
+
+from wanderly.cache import NullCache
+from wanderly.database import Database
+from wanderly.tracing import end_trace, start_trace
+
+from .run import DAYS_PER_PAGE, TRIPS_PER_PAGE, pick_travelers
+
+# The queries behind the dashboard and the itinerary, run straight against
+# the database with caching off, once with plain statements and once with
+# prepared ones. Postgres reports the planning time of each through
+# EXPLAIN ANALYZE. Needs a `flask seed-bulk` dataset:
+#   PYTHONPATH=src python -m benchmarks.prepared
+PATHS = {
+    'dashboard': lambda storage, t: (
+        storage.get_trips_version(t['user_id']),
+        storage.get_trips_page(t['user_id'], TRIPS_PER_PAGE),
+        ),
+    'itinerary': lambda storage, t: (
+        storage.find_trip_for_user(t['trip_id'], t['user_id']),
+        storage.get_itinerary_page(t['trip_id'], 1, DAYS_PER_PAGE),
+        ),
+}
+
+
+def planning_ms(storage, statements):
+    total = 0.0
+    with storage._database_connect() as conn:  # pylint: disable=protected-access
+        with conn.cursor() as cursor:
+            for statement in statements:
+                cursor.execute('EXPLAIN (ANALYZE, FORMAT JSON) ' + statement)
+                plan = cursor.fetchone()[0]
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                total += plan[0]['Planning Time']
+    return total
+
+
+def measure(path, travelers, prepare, iterations, warmup):
+    identity_map = {}
+    storage = Database(identity_map=identity_map, cache=NullCache(),
+                       prepare=prepare)
+    timings, planning = [], []
+    try:
+        # Prepared statements move to a generic plan after five executions,
+        # so the warmup runs every traveler past that point.
+        for i in range(warmup + iterations):
+            for traveler in travelers:
+                identity_map.clear()
+                trace = start_trace()
+                started = time.perf_counter()
+                try:
+                    path(storage, traveler)
+                finally:
+                    end_trace()
+                if i < warmup:
+                    continue
+                timings.append((time.perf_counter() - started) * 1000)
+                if i == warmup:
+                    planning.append(planning_ms(
+                        storage, [query['sql'] for query in trace.queries]))
+    finally:
+        storage.close()
+
+    return {
+        'mean_ms': round(statistics.mean(timings), 3),
+        'p50_ms': round(statistics.median(timings), 3),
+        'planning_ms': round(statistics.mean(planning), 3),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks.prepared',
+        description="Plain versus prepared statements on the hot paths.",
+        )
+    parser.add_argument('--travelers', type=int, default=4)
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--warmup', type=int, default=10)
+    args = parser.parse_args(argv)
+
+    travelers, _dataset = pick_travelers(args.travelers)
+    print(f"{'path':<12}{'statements':<12}{'mean':>9}{'p50':>9}"
+          f"{'planning':>10}")
+    for name, path in PATHS.items():
+        results = {}
+        for label, prepare in (('plain', False), ('prepared', True)):
+            row = results[label] = measure(
+                path, travelers, prepare, args.iterations, args.warmup)
+            print(f"{name:<12}{label:<12}{row['mean_ms']:>9.3f}"
+                  f"{row['p50_ms']:>9.3f}{row['planning_ms']:>10.3f}")
+        plain, prepared = results['plain'], results['prepared']
+        print(f"{name:<12}{'saved':<12}"
+              f"{plain['mean_ms'] - prepared['mean_ms']:>9.3f}{'':>9}"
+              f"{plain['planning_ms'] - prepared['planning_ms']:>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
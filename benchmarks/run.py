@@ -0,0 +1,313 @@
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import json
+import math
+import platform
+import subprocess
+import sys
+import time
+
+from wanderly.database import get_pool
+
+from .drivers import HttpDriver, InProcessDriver
+
+TRIPS_PER_PAGE = 8
+DAYS_PER_PAGE = 4
+PASSWORD = 'wanderly'
+BENCH_PREFIX = 'Benchmark '
+
+
+# ---- DATASET ----
+def pick_travelers(count):
+    # Travelers from a `flask seed-bulk` dataset with a realistic number of
+    # trips, each with their largest trip by activity count. The choice
+    # only depends on the data, so runs against the same seed match.
+    query = """
+            WITH travelers AS (
+                SELECT users.id, users.email, COUNT(*) AS trips
+                FROM users
+                JOIN trips ON trips.user_id = users.id
+                WHERE users.email LIKE '%%@seed.wanderly.test'
+                GROUP BY users.id
+                HAVING COUNT(*) BETWEEN 10 AND 300
+                ORDER BY users.id
+                LIMIT %s
+            )
+            SELECT travelers.*, biggest.trip_id,
+                   (SELECT COUNT(*) FROM plan_day_totals
+                    WHERE plan_day_totals.trip_id = biggest.trip_id) AS days
+            FROM travelers
+            CROSS JOIN LATERAL (
+                SELECT trips.id AS trip_id
+                FROM trips
+                JOIN trip_totals ON trip_totals.trip_id = trips.id
+                WHERE trips.user_id = travelers.id
+                ORDER BY trip_totals.activity_count DESC, trips.id
+                LIMIT 1
+            ) AS biggest
+            ORDER BY travelers.id
+            """
+    with get_pool().connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(query, (count,))
+            rows = cursor.fetchall()
+            cursor.execute('SELECT (SELECT COUNT(*) FROM users), '
+                           '(SELECT COUNT(*) FROM trips), '
+                           '(SELECT COUNT(*) FROM plans)')
+            sizes = cursor.fetchone()
+        conn.commit()
+
+    if len(rows) < count:
+        sys.exit(f"Need {count} seeded travelers with 10-300 trips; found "
+                 f"{len(rows)}. Load data with `flask seed-bulk` first.")
+
+    travelers = [{
+        'user_id': user_id,
+        'email': email,
+        'trip_pages': math.ceil(trips / TRIPS_PER_PAGE),
+        'trip_id': trip_id,
+        'day_pages': max(math.ceil(days / DAYS_PER_PAGE), 1),
+    } for user_id, email, trips, trip_id, days in rows]
+    dataset = dict(zip(('users', 'trips', 'plans'), sizes))
+    return travelers, dataset
+
+
+def prepare_activities(travelers, count):
+    # Edit and delete scenarios need activities that already exist.
+    with get_pool().connection() as conn:
+        with conn.cursor() as cursor:
+            for traveler in travelers:
+                cursor.execute("""
+                               INSERT INTO plans (activity, trip_id)
+                               SELECT %s || n, %s
+                               FROM generate_series(1, %s) AS n
+                               RETURNING id
+                               """, (BENCH_PREFIX, traveler['trip_id'],
+                                     count + 1))
+                ids = [row[0] for row in cursor.fetchall()]
+                traveler['edit_id'] = ids[0]
+                traveler['delete_ids'] = ids[1:]
+        conn.commit()
+
+
+def clean_up(travelers):
+    with get_pool().connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                           DELETE FROM plans
+                           WHERE trip_id = ANY(%s) AND activity LIKE %s
+                           """, ([t['trip_id'] for t in travelers],
+                                 BENCH_PREFIX + '%'))
+        conn.commit()
+
+
+# ---- SCENARIOS ----
+def activity_form(i):
+    return {
+        'date': '',
+        'time': f'{1 + i % 12}:{(i * 7) % 60:02d} PM',
+        'activity': f'{BENCH_PREFIX}{i}',
+        'note': '',
+        'cost': str(i % 300),
+        'page': 1,
+    }
+
+
+# Each scenario builds (method, path, form data) for a traveler's i-th
+# request.
+SCENARIOS = {
+    'login': lambda t, i: (
+        'POST', '/login', {'email': t['email'], 'password': PASSWORD}),
+    'trips_first_page': lambda t, i: ('GET', '/trips?page=1', None),
+    'trips_middle_page': lambda t, i: (
+        'GET', f"/trips?page={(t['trip_pages'] + 1) // 2}", None),
+    'trips_last_page': lambda t, i: (
+        'GET', f"/trips?page={t['trip_pages']}", None),
+    'itinerary_first_page': lambda t, i: (
+        'GET', f"/trips/{t['trip_id']}?page=1", None),
+    'itinerary_last_page': lambda t, i: (
+        'GET', f"/trips/{t['trip_id']}?page={t['day_pages']}", None),
+    'activity_add': lambda t, i: (
+        'POST', f"/trips/{t['trip_id']}/activity/add", activity_form(i)),
+    'activity_edit': lambda t, i: (
+        'POST', f"/trips/{t['trip_id']}/activities/{t['edit_id']}/edit",
+        activity_form(i)),
+    'activity_delete': lambda t, i: (
+        'POST',
+        f"/trips/{t['trip_id']}/activiites/{t['delete_ids'][i]}/delete",
+        {'page': 1}),
+}
+
+
+def percentile(sorted_values, percent):
+    if not sorted_values:
+        return None
+    rank = max(math.ceil(percent / 100 * len(sorted_values)) - 1, 0)
+    return sorted_values[rank]
+
+
+def run_scenario(driver, sessions, travelers, build, requests, warmup):
+    def worker(index):
+        session, traveler = sessions[index], travelers[index]
+        timings, queries, errors = [], [], 0
+        for i in range(warmup + requests):
+            method, path, data = build(traveler, i)
+            started = time.perf_counter()
+            status, query_count = session.request(method, path, data)
+            elapsed = time.perf_counter() - started
+            if i < warmup:
+                continue
+            timings.append(elapsed)
+            if query_count is not None:
+                queries.append(query_count)
+            if status >= 400:
+                errors += 1
+        return timings, queries, errors
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(sessions)) as executor:
+        results = list(executor.map(worker, range(len(sessions))))
+    wall = time.perf_counter() - started
+
+    timings = sorted(t for result in results for t in result[0])
+    queries = [q for result in results for q in result[1]]
+    # Warmup requests are inside the wall time, so scale them back out.
+    measured = wall * requests / (requests + warmup)
+    return {
+        'requests': len(timings),
+        'errors': sum(result[2] for result in results),
+        'p50_ms': round(percentile(timings, 50) * 1000, 3),
+        'p95_ms': round(percentile(timings, 95) * 1000, 3),
+        'p99_ms': round(percentile(timings, 99) * 1000, 3),
+        'mean_ms': round(sum(timings) / len(timings) * 1000, 3),
+        'rps': round(len(timings) / measured, 1),
+        'queries_per_request': (round(sum(queries) / len(queries), 2)
+                                if queries else None),
+        'driver': driver.name,
+    }
+
+
+# ---- BASELINE ----
+def compare(results, baseline, threshold):
+    # A scenario regresses when p95 grows or throughput drops by more than
+    # the threshold, or when it issues any more queries than before.
+    regressions = []
+    for name, current in results['scenarios'].items():
+        before = baseline.get('scenarios', {}).get(name)
+        if not before:
+            continue
+        if current['p95_ms'] > before['p95_ms'] * (1 + threshold):
+            regressions.append(
+                f"{name}: p95 {before['p95_ms']}ms -> {current['p95_ms']}ms")
+        if current['rps'] < before['rps'] * (1 - threshold):
+            regressions.append(
+                f"{name}: rps {before['rps']} -> {current['rps']}")
+        if (current['queries_per_request'] is not None
+                and before['queries_per_request'] is not None
+                and current['queries_per_request']
+                > before['queries_per_request']):
+            regressions.append(
+                f"{name}: queries/request {before['queries_per_request']} "
+                f"-> {current['queries_per_request']}")
+    return regressions
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True,
+            ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_table(results):
+    print(f"{'scenario':<22}{'p50':>9}{'p95':>9}{'p99':>9}"
+          f"{'rps':>9}{'queries':>9}{'errors':>8}")
+    for name, row in results['scenarios'].items():
+        queries = row['queries_per_request']
+        print(f"{name:<22}{row['p50_ms']:>9.2f}{row['p95_ms']:>9.2f}"
+              f"{row['p99_ms']:>9.2f}{row['rps']:>9.1f}"
+              f"{'-' if queries is None else queries:>9}{row['errors']:>8}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks',
+        description="Route latency and throughput benchmarks.",
+        )
+    parser.add_argument('--driver', choices=('inprocess', 'http'),
+                        default='inprocess')
+    parser.add_argument('--base-url', default='http://127.0.0.1:8000',
+                        help="Server to drive with --driver http.")
+    parser.add_argument('--requests', type=int, default=200,
+                        help="Timed requests per worker and scenario.")
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--scenario', action='append', choices=SCENARIOS,
+                        help="Run only these scenarios (repeatable).")
+    parser.add_argument('--out', help="Write results to this JSON file.")
+    parser.add_argument('--baseline', help="Compare with this results file.")
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help="Allowed regression as a fraction (0.1 = 10%%).")
+    args = parser.parse_args(argv)
+
+    if args.driver == 'http':
+        driver = HttpDriver(args.base_url)
+    else:
+        driver = InProcessDriver()
+
+    travelers, dataset = pick_travelers(args.concurrency)
+    prepare_activities(travelers, args.warmup + args.requests)
+    sessions = [driver.session() for _ in travelers]
+
+    results = {
+        'meta': {
+            'driver': driver.name,
+            'requests': args.requests,
+            'warmup': args.warmup,
+            'concurrency': args.concurrency,
+            'dataset': dataset,
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'started_at': datetime.now(timezone.utc).isoformat(),
+        },
+        'scenarios': {},
+    }
+
+    try:
+        for session, traveler in zip(sessions, travelers):
+            status, _queries = session.request(
+                'POST', '/login',
+                {'email': traveler['email'], 'password': PASSWORD})
+            if status != 302:
+                sys.exit(f"Could not sign in as {traveler['email']}.")
+
+        for name in args.scenario or SCENARIOS:
+            results['scenarios'][name] = run_scenario(
+                driver, sessions, travelers, SCENARIOS[name],
+                args.requests, args.warmup)
+    finally:
+        clean_up(travelers)
+
+    print_table(results)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as file:
+            baseline = json.load(file)
+        for key in ('driver', 'concurrency', 'dataset'):
+            if baseline['meta'].get(key) != results['meta'][key]:
+                print(f"Note: baseline {key} differs "
+                      f"({baseline['meta'].get(key)} vs "
+                      f"{results['meta'][key]}).")
+        regressions = compare(results, baseline, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+    return 0
@@ -0,0 +1,114 @@
+import argparse
+import statistics
+import sys
+import time
+
+from wanderly.cache import NullCache
+from wanderly.database import Database, get_pool
+
+from .run import pick_travelers
+
+# Search and as-you-type suggestions against a `flask seed-bulk` dataset:
+#   PYTHONPATH=src python -m benchmarks.search
+# Besides the usual travelers it searches as the user with the most
+# documents, the worst case for ranking every match. Exits non-zero when a
+# p95 misses its target.
+TARGETS_MS = {'search': 50.0, 'suggest': 20.0}
+
+SEARCHES = (
+    'museum',
+    'coffee',
+    'cooking class',
+    '"walking tour" lisbon',
+    'tickets emailed',
+    'dinner -reservation',
+    'nothing matches this',
+)
+
+SUGGESTIONS = ('m', 'mu', 'muse', 'co', 'check', 'ky', 'boat t')
+
+RESULTS_PER_PAGE = 20
+
+
+def heaviest_user():
+    with get_pool().connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                           SELECT user_id, COUNT(*)
+                           FROM search_documents
+                           GROUP BY user_id
+                           ORDER BY COUNT(*) DESC, user_id
+                           LIMIT 1
+                           """)
+            row = cursor.fetchone()
+        conn.commit()
+    return row
+
+
+def measure(storage, user_ids, run, terms, iterations):
+    timings = []
+    for _ in range(iterations):
+        for user_id in user_ids:
+            for term in terms:
+                started = time.perf_counter()
+                run(storage, user_id, term)
+                timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {
+        'p50_ms': statistics.median(timings),
+        'p95_ms': timings[int(len(timings) * 0.95) - 1],
+        'max_ms': timings[-1],
+    }
+
+
+def search_with_next_page(storage, user_id, term):
+    page = storage.search(user_id, term, RESULTS_PER_PAGE)
+    if page['has_more']:
+        last = page['results'][-1]
+        storage.search(user_id, term, RESULTS_PER_PAGE,
+                       (last['rank'], last['id']))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks.search',
+        description="Full-text search and suggestion latency.",
+        )
+    parser.add_argument('--travelers', type=int, default=8)
+    parser.add_argument('--iterations', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    travelers, _dataset = pick_travelers(args.travelers)
+    heaviest, documents = heaviest_user()
+    groups = {
+        'travelers': [traveler['user_id'] for traveler in travelers],
+        f'heaviest ({documents} docs)': [heaviest],
+    }
+    runs = {
+        'search': (search_with_next_page, SEARCHES),
+        'suggest': (lambda storage, user_id, term:
+                    storage.suggest(user_id, term), SUGGESTIONS),
+    }
+
+    storage = Database(cache=NullCache())
+    missed = []
+    try:
+        print(f"{'users':<24}{'query':<10}{'p50':>9}{'p95':>9}{'max':>9}"
+              f"{'target':>9}")
+        for label, user_ids in groups.items():
+            for name, (run, terms) in runs.items():
+                row = measure(storage, user_ids, run, terms, args.iterations)
+                print(f"{label:<24}{name:<10}{row['p50_ms']:>9.2f}"
+                      f"{row['p95_ms']:>9.2f}{row['max_ms']:>9.2f}"
+                      f"{TARGETS_MS[name]:>9.1f}")
+                if row['p95_ms'] > TARGETS_MS[name]:
+                    missed.append(f'{label} {name}')
+    finally:
+        storage.close()
+
+    if missed:
+        sys.exit(f"p95 over target: {', '.join(missed)}")
+
+
+if __name__ == '__main__':
+    main()
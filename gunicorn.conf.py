@@ -0,0 +1,11 @@
+# gunicorn reads this file from the directory it is started in:
+#   gunicorn --chdir src wsgi:app
+import os
+
+
+def child_exit(_server, worker):
+    # With multiprocess metrics, drop the dead worker's live gauges.
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        # pylint: disable-next=import-outside-toplevel
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
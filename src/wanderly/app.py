@@ -1,22 +1,50 @@
-import secrets
+import hashlib
+import mimetypes
 import os
+import time
 from functools import wraps
-import bcrypt
 
 from flask import (
     Flask,
+    Response,
+    before_render_template,
     flash,
     g,
     jsonify,
+    make_response,
+    message_flashed,
     redirect,
     render_template,
     request,
+    send_from_directory,
     session,
+    template_rendered,
     url_for
 )
+from werkzeug.utils import secure_filename
 
 from dotenv import load_dotenv
-from .database import Database
+from jinja2 import FileSystemBytecodeCache, pass_context
+from .assets import (
+    BUNDLES,
+    DIST_DIR,
+    MANIFEST,
+    load_manifest,
+    pick_encoding,
+    )
+from .cache import get_cache
+from .cli import (
+    archive_cli,
+    assets_cli,
+    db_cli,
+    reminders_cli,
+    seed_bulk_command,
+    templates_cli,
+    totals_cli,
+    )
+from .database import Database, get_pool, replica_dsns, replica_lag
+from .exports import csv_lines, ics_lines, read_plans_csv
+from .fragments import Fragments, activity_key, day_key
 from .filters import (
     formatted_date,
     formatted_date_activity,
@@ -24,16 +52,32 @@ from .filters import (
     safe_default,
     safe_default_money,
     )
+from .metrics import get_metrics
+from .migrate import check_schema_once
+from .passwords import HasherBusy, get_hasher
+from .sessions import create_session_interface, secret_keys
+from .tracing import add_timing, current_trace, end_trace, start_trace
 from .utils import (
     check_date_range,
+    decode_cursor,
+    decode_past_cursor,
+    decode_search_cursor,
+    encode_cursor,
+    encode_past_cursor,
+    encode_search_cursor,
     error_for_activity_input,
     error_for_create_user,
     error_for_login,
+    error_for_plan_batch,
     error_for_trips,
+    finish_plan_batch,
     get_first_name,
     error_for_page,
+    page_number,
+    page_window,
+    plan_batch_results,
     plans_by_date,
-    plans_per_page,
+    split_plan_batch,
     total_pages,
     remove_punc_for_cost,
 )
@@ -41,9 +85,41 @@ from .utils import (
 load_dotenv()
 
 app = Flask(__name__)
-app.secret_key = secrets.token_hex(32)
+# Compiled templates are kept on disk, so a fresh worker loads them instead
+# of compiling; `flask templates compile` fills the cache ahead of time.
+app.jinja_options = {
+    **app.jinja_options,
+    'bytecode_cache': FileSystemBytecodeCache(
+        os.environ.get('WANDERLY_TEMPLATE_CACHE_DIR')),
+}
+app.secret_key, app.config['SECRET_KEY_FALLBACKS'] = secret_keys()
+session_interface = create_session_interface()
+if session_interface is not None:
+    app.session_interface = session_interface
+app.config['EXPOSE_STATS'] = os.environ.get('WANDERLY_EXPOSE_STATS') == '1'
+app.config['RELEASE'] = os.environ.get('WANDERLY_RELEASE', '')
+app.config['SERVER_TIMING'] = os.environ.get('WANDERLY_SERVER_TIMING') == '1'
+app.config['SLOW_QUERY_MS'] = float(
+    os.environ.get('WANDERLY_SLOW_QUERY_MS', 200))
+app.config['METRICS'] = os.environ.get('WANDERLY_METRICS') == '1'
+app.config['REPLICAS'] = bool(replica_dsns())
+app.cli.add_command(db_cli)
+app.cli.add_command(totals_cli)
+app.cli.add_command(seed_bulk_command)
+app.cli.add_command(templates_cli)
+app.cli.add_command(assets_cli)
+app.cli.add_command(reminders_cli)
+app.cli.add_command(archive_cli)
+get_hasher()
+if app.config['METRICS']:
+    get_metrics()
 TRIPS_PER_PAGE = 8
 DAYS_PER_PAGE = 4
+PAST_TRIPS_PER_PAGE = 8
+SEARCH_RESULTS_PER_PAGE = 20
+SEARCH_MAX_LENGTH = 200
+IMPORT_MAX_ROWS = 5000
+BATCH_MAX_OPERATIONS = 500
 
 # ---- SEED DATA ----
 def seed_user():
@@ -55,12 +131,14 @@ def seed_user():
             'password':os.getenv("SEED_PASSWORD")
         }
 
-        if not storage.user_exists(user['email']):
-            hash = bcrypt.hashpw(user['password'].encode('utf-8'), bcrypt.gensalt())
-            storage.create_new_user(user['name'], user['email'], hash.decode('utf-8'))
-            print("Seed user created.")
-        else:
-            print("Seed user already exists.")
+        try:
+            password = get_hasher().hash(user['password'])
+            if storage.create_new_user(user['name'], user['email'], password):
+                print("Seed user created.")
+            else:
+                print("Seed user already exists.")
+        finally:
+            storage.close()
 
 # ---- JINJA FILTERS ----
 app.jinja_env.filters['formatted_date'] = formatted_date
@@ -69,15 +147,107 @@ app.jinja_env.filters['formatted_time'] = formatted_time
 app.jinja_env.filters['safe_default'] = safe_default
 app.jinja_env.filters['safe_default_money'] = safe_default_money
 
+# ---- FRAGMENTS ----
+# Itinerary days and activity rows are rendered once and reused from the
+# cache until one of their plans changes. Debug mode skips the cache so
+# template edits show up straight away.
+fragments = Fragments(app.jinja_env, get_cache(), app.config['RELEASE'])
+PREFILL_FIELDS = ('time', 'activity', 'note', 'cost')
+
+
+@pass_context
+def itinerary_day(context, date, activities):
+    trip = context['trip']
+    page = context['current_page']
+    edit_activity_id = context.get('edit_activity_id')
+    prefill = {name: context.get(name, '') for name in PREFILL_FIELDS}
+
+    key = None
+    if not app.debug and not any(
+            act['id'] == edit_activity_id for act in activities):
+        key = day_key(trip['id'], date, activities, page,
+                      tuple(prefill.values()))
+    return fragments.render(key, '_itinerary_day.html',
+                            trip=trip,
+                            date=date,
+                            activities=activities,
+                            totals=context['day_totals'][date],
+                            current_page=page,
+                            edit_activity_id=edit_activity_id,
+                            **prefill
+                            )
+
+
+@pass_context
+def activity_row(context, act):
+    trip = context['trip']
+    page = context['current_page']
+    key = None if app.debug else activity_key(trip['id'], act, page)
+    return fragments.render(key, '_activity_row.html',
+                            trip=trip,
+                            act=act,
+                            current_page=page
+                            )
+
+
+app.jinja_env.globals['itinerary_day'] = itinerary_day
+app.jinja_env.globals['activity_row'] = activity_row
+
+# ---- ASSETS ----
+# `flask assets build` writes content-hashed, minified bundles with gzip
+# and brotli variants. Their names change with their content, so they are
+# cached for a year. Without a build, or in debug mode, pages link the
+# source files instead.
+ASSET_MAX_AGE = 365 * 24 * 60 * 60
+
+
+def asset_urls(bundle):
+    manifest = {} if app.debug else load_manifest(app.static_folder)
+    if bundle in manifest:
+        return [url_for('serve_asset', filename=manifest[bundle])]
+    return [url_for('static', filename=source) for source in BUNDLES[bundle]]
+
+
+app.jinja_env.globals['asset_urls'] = asset_urls
+
+
+@app.route("/assets/<filename>")
+def serve_asset(filename):
+    # Bundles from earlier builds stay servable for pages cached before a
+    # deploy.
+    dist = os.path.join(app.static_folder, DIST_DIR)
+    if (filename == MANIFEST
+            or not os.path.isfile(os.path.join(dist, filename))):
+        return "Not Found", 404
+
+    encoding, path = pick_encoding(dist, filename, request.accept_encodings)
+    response = send_from_directory(
+        dist,
+        path,
+        mimetype=mimetypes.guess_type(filename)[0],
+        max_age=ASSET_MAX_AGE,
+        )
+    if encoding:
+        response.content_encoding = encoding
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
 # ---- AUTH HELPER FUNCTIONS ----
-def valid_credentials(email, password):
-    user = g.storage.get_user_credentials(email)
-    if user:
-        curr_password = password.encode('utf-8')
-        stored_password = user["password"].encode('utf-8')
-        if bcrypt.checkpw(curr_password, stored_password):
-            return user
-    return None
+def valid_credentials(user, password):
+    hasher = get_hasher()
+    if not hasher.check(password, user['password']):
+        return False
+
+    # Upgrade hashes made with an older work factor while the plain
+    # password is at hand.
+    if hasher.needs_rehash(user['password']):
+        try:
+            g.storage.update_user_password(user['id'], hasher.hash(password))
+        except HasherBusy:
+            pass
+    return True
 
 
 def user_logged_in():
@@ -100,8 +270,18 @@ def require_trip(f):
     @require_logged_in_user
     def decorated_function(*args, **kwargs):
         trip_id = kwargs.get('trip_id')
-        trip = g.storage.find_trip_by_id(trip_id)
+        # Fetch the activity in the same query when the route names one, so
+        # require_activity finds it in the request's identity map.
+        trip, _activity = g.storage.find_trip_for_user(
+            trip_id,
+            session['user_id'],
+            kwargs.get('activity_id')
+            )
         if not trip:
+            # Links to a trip that has since been archived still work.
+            if request.method == 'GET' and g.storage.find_past_trip(
+                    trip_id, session['user_id']):
+                return redirect(url_for('show_past_trip', trip_id=trip_id))
             flash('Trip not found.', 'error')
             return redirect(url_for('index'))
         return f(trip, *args, **kwargs)
@@ -113,18 +293,170 @@ def require_activity(f):
     @require_trip
     def decorated_function(trip, *args, **kwargs):
         activity_id = kwargs.get('activity_id')
-        activity = g.storage.find_activity_by_id(activity_id)
+        _trip, activity = g.storage.find_trip_for_user(
+            trip['id'],
+            session['user_id'],
+            activity_id
+            )
         if not activity:
             flash('Activity not found.', 'error')
-            return redirect(url_for('show_trip_schedule'))
+            return redirect(url_for('show_trip_schedule', trip_id=trip['id']))
         return f(activity, trip, *args, **kwargs)
     return decorated_function
 
 
+# ---- CONDITIONAL GET ----
+def page_etag(scope, revision):
+    # The revision covers the data; the user, the full URL (page, cursor,
+    # prefilled form values) and the release cover everything else that
+    # shapes the HTML.
+    key = f"{session['user_id']}|{request.full_path}|{app.config['RELEASE']}"
+    digest = hashlib.sha256(key.encode('utf-8')).hexdigest()[:16]
+    return f'{scope}-{revision}-{digest}'
+
+
+def not_modified(etag, last_modified):
+    # Pending flash messages are part of the page, so those views always
+    # render. If-Modified-Since alone is not trusted: it carries no user.
+    if app.debug or session.get('_flashes'):
+        return None
+    if not request.if_none_match.contains(etag):
+        return None
+    return with_validators(make_response('', 304), etag, last_modified)
+
+
+def with_validators(response, etag, last_modified):
+    response = make_response(response)
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
 # ---- BEFORE REQUEST -----
+# ---- TRACING ----
+@app.before_request
+def begin_trace():
+    start_trace(slow_query_ms=app.config['SLOW_QUERY_MS'])
+
+
+@before_render_template.connect_via(app)
+def start_render_timer(_sender, **_extra):
+    trace = current_trace()
+    if trace is not None:
+        trace.render_started = time.perf_counter()
+
+
+@template_rendered.connect_via(app)
+def stop_render_timer(_sender, **_extra):
+    trace = current_trace()
+    if trace is not None and trace.render_started is not None:
+        add_timing('tpl', time.perf_counter() - trace.render_started)
+        trace.render_started = None
+
+
+@app.after_request
+def report_trace(response):
+    trace = current_trace()
+    if trace is None:
+        return response
+
+    if app.debug:
+        for statement, count, methods in trace.repeated_statements():
+            app.logger.warning(
+                "%s %s ran the same statement %s times (from %s): %s",
+                request.method,
+                request.path,
+                count,
+                ', '.join(methods),
+                ' '.join(statement.split())
+                )
+    if app.debug or app.config['SERVER_TIMING']:
+        response.headers['Server-Timing'] = trace.server_timing()
+    return response
+
+
+@app.teardown_request
+def clear_trace(_exception):
+    end_trace()
+
+
+# ---- METRICS ----
+@app.after_request
+def record_metrics(response):
+    trace = current_trace()
+    if not app.config['METRICS'] or trace is None:
+        return response
+
+    metrics = get_metrics()
+    metrics.record_request(
+        request.endpoint or 'unmatched',
+        request.method,
+        response.status_code,
+        time.perf_counter() - trace.started,
+        trace
+        )
+    if metrics.gauges_due():
+        metrics.update_gauges(get_pool().stats(), get_cache().stats(),
+                              replica_lag())
+    return response
+
+
+@message_flashed.connect_via(app)
+def count_flash(_sender, category, **_extra):
+    if app.config['METRICS']:
+        get_metrics().count_flash(request.endpoint or 'unmatched', category)
+
+
+@app.route("/metrics")
+def show_metrics():
+    if not app.config['METRICS']:
+        return "Not Found", 404
+    body, content_type = get_metrics().render()
+    return body, 200, {'Content-Type': content_type}
+
+
 @app.before_request
 def load_db():
-    g.storage = Database()
+    check_schema_once(get_pool())
+    g.identity_map = {}
+    read_after = session.get('read_after') if app.config['REPLICAS'] else None
+    g.storage = Database(identity_map=g.identity_map, read_after=read_after)
+
+
+@app.after_request
+def remember_writes(response):
+    # A request that wrote sends this session's reads to the primary until
+    # a replica has replayed the write.
+    storage = g.get('storage')
+    if not app.config['REPLICAS'] or storage is None:
+        return response
+    read_after = storage.read_after_writes()
+    if read_after:
+        session['read_after'] = read_after
+    elif 'read_after' in session and session['read_after'][1] < time.time():
+        session.pop('read_after')
+    return response
+
+
+@app.teardown_request
+def release_db(_exception):
+    storage = g.pop('storage', None)
+    if storage is not None:
+        storage.close()
+
+
+# ---- STATS ----
+@app.route("/internal/stats")
+def show_stats():
+    if not (app.debug or app.config['EXPOSE_STATS']):
+        return "Not Found", 404
+    return jsonify(
+        pool=get_pool().stats(),
+        replicas=replica_lag(),
+        hasher=get_hasher().stats(),
+        cache=get_cache().stats(),
+        )
 
 
 # ---- AUTH ----
@@ -144,13 +476,16 @@ def create_user():
         flash(error, "error")
         return render_template("signup.html")
 
-    if g.storage.user_exists(email):
+    try:
+        hash = get_hasher().hash(password)
+    except HasherBusy:
+        flash("We're busy right now. Please try again in a moment.", "error")
+        return render_template('signup.html'), 503
+
+    if not g.storage.create_new_user(name, email, hash):
         flash("The email is already in use.", "error")
         return render_template('signup.html')
 
-    hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
-
-    g.storage.create_new_user(name, email, hash.decode('utf-8'))
     flash("User has been created", "success")
     return redirect(url_for('login'))
 
@@ -165,16 +500,22 @@ def login():
     email = request.form['email'].strip()
     password = request.form['password'].strip()
 
-    if not g.storage.user_exists(email):
-        flash("The email is not in our records.", "error")
-        return render_template('login.html')
-
     error = error_for_login(email, password)
     if error:
         flash(error, "error")
         return render_template('login.html')
 
-    user = valid_credentials(email, password)
+    user = g.storage.get_user_credentials(email)
+    if not user:
+        flash("The email is not in our records.", "error")
+        return render_template('login.html')
+
+    try:
+        if not valid_credentials(user, password):
+            user = None
+    except HasherBusy:
+        flash("We're busy right now. Please try again in a moment.", "error")
+        return render_template('login.html'), 503
 
     if user:
         session['user_id'] = user['id']
@@ -201,68 +542,94 @@ def index():
     return redirect(url_for('show_trips'))
 
 
-@app.route("/trips")
-@require_logged_in_user
-def show_trips():
-    page = request.args.get('page', 1)
-    total_items = g.storage.get_trip_count(session['user_id'])
-    pages = total_pages(total_items, TRIPS_PER_PAGE)
-
-    error = error_for_page(page, pages)
-    if error:
-        flash(error['message'], 'error')
-        return redirect(url_for('show_trips', page=error['page']))
+def redirect_to_page(error, endpoint, **url_args):
+    flash(error['message'], 'error')
+    if app.config['METRICS']:
+        get_metrics().count_page_redirect(request.endpoint)
+    return redirect(url_for(endpoint, page=error['page'], **url_args))
 
-    page = int(page)
-    offset = (page - 1) * TRIPS_PER_PAGE
 
-    trips = g.storage.get_trips_by_user_id(
+def load_trips_page(endpoint, **url_args):
+    page = request.args.get('page', 1)
+    after = request.args.get('after')
+    before = request.args.get('before')
+    cursor = decode_cursor(after or before) if (after or before) else None
+    if (after or before) and not cursor:
+        flash('Invalid page cursor. Redirected.', 'error')
+        return redirect(url_for(endpoint, page=1, **url_args)), None
+
+    current_page = page_number(page)
+    result = g.storage.get_trips_page(
         session['user_id'],
         limit=TRIPS_PER_PAGE,
-        offset=offset
+        offset=(current_page - 1) * TRIPS_PER_PAGE,
+        after=cursor if after else None,
+        before=cursor if before else None,
         )
-    first_name = get_first_name(trips, session['user_id'], g.storage)
+    trips = result['trips']
+    pages = total_pages(result['total'], TRIPS_PER_PAGE)
 
-    return render_template("trips.html",
-                           first_name=first_name,
-                           trips=trips,
-                           current_page=page,
-                           pages=pages
-                           )
+    if cursor:
+        if not trips and result['total']:
+            error = {'message': 'Page not found. Redirected.', 'page': 1}
+            return redirect_to_page(error, endpoint, **url_args), None
+    else:
+        error = error_for_page(page, pages)
+        if error:
+            return redirect_to_page(error, endpoint, **url_args), None
+
+    if before:
+        has_prev, has_next = result['has_more'], True
+    elif after:
+        has_prev, has_next = True, result['has_more']
+    else:
+        has_prev, has_next = current_page > 1, result['has_more']
+
+    return None, {
+        'first_name': get_first_name(trips, session['user_id'], g.storage),
+        'trips': trips,
+        'current_page': current_page,
+        'pages': pages,
+        'page_links': page_window(current_page, pages),
+        'page_args': {'after': after} if after else
+                     {'before': before} if before else {},
+        'prev_cursor':
+            encode_cursor(trips[0]) if trips and has_prev else None,
+        'next_cursor':
+            encode_cursor(trips[-1]) if trips and has_next else None,
+    }
+
+
+@app.route("/trips")
+@require_logged_in_user
+def show_trips():
+    # The page is read, or found in the cache, under this same revision,
+    # so the ETag always names the version the body was rendered from.
+    version = g.storage.get_trips_version(session['user_id'])
+    etag = page_etag('trips', version['revision'])
+    response = not_modified(etag, version['updated_at'])
+    if response:
+        return response
+
+    response, context = load_trips_page('show_trips')
+    if response:
+        return response
+
+    return with_validators(
+        render_template("trips.html", **context),
+        etag,
+        version['updated_at']
+        )
 
 
 @app.route("/trips/<int:trip_id>/edit", methods=["GET"])
 @require_trip
 def show_trip_to_edit(_trip, trip_id):
-    page = request.args.get('page', 1)
-    total_items = g.storage.get_trip_count(session['user_id'])
-    pages = total_pages(total_items, TRIPS_PER_PAGE)
-
-    error = error_for_page(page, pages)
-    if error:
-        flash(error['message'], 'error')
-        return redirect(url_for(
-            'show_trip_to_edit',
-            trip_id=trip_id,
-            page=error['page'])
-            )
-
-    page = int(page)
-    offset = (page - 1) * TRIPS_PER_PAGE
-
-    trips = g.storage.get_trips_by_user_id(
-        session['user_id'],
-        limit=TRIPS_PER_PAGE,
-        offset=offset)
-    first_name = get_first_name(trips, session['user_id'], g.storage)
+    response, context = load_trips_page('show_trip_to_edit', trip_id=trip_id)
+    if response:
+        return response
 
-    return render_template("trips.html",
-                           first_name=first_name,
-                           trips=trips,
-                           edit_trip_id=trip_id,
-                           current_page=page,
-                           pages=pages
-                           )
+    return render_template("trips.html", edit_trip_id=trip_id, **context)
 
 
 @app.route("/trips/<int:trip_id>/edit", methods=["POST"])
@@ -332,62 +699,68 @@ def create_trip():
 @app.route("/trips/<int:trip_id>")
 @require_trip
 def show_trip_schedule(trip, trip_id):
-    all_plans = g.storage.get_itinerary(trip_id)
-    itinerary = plans_by_date(all_plans)
+    # As for the trips list, the itinerary is cached under trip['revision'].
+    etag = page_etag(f'trip{trip_id}', trip['revision'])
+    response = not_modified(etag, trip['updated_at'])
+    if response:
+        return response
 
     page = request.args.get('page', 1)
-    pages = total_pages(len(itinerary.keys()), DAYS_PER_PAGE)
+    itinerary = g.storage.get_itinerary_page(
+        trip_id,
+        page_number(page),
+        DAYS_PER_PAGE
+        )
+    pages = total_pages(itinerary['total_days'], DAYS_PER_PAGE)
     error = error_for_page(page, pages)
     if error:
-        flash(error['message'], 'error')
-        return redirect(url_for(
-            'show_trip_schedule',
-            trip_id=trip_id,
-            page=error['page'])
-            )
+        return redirect_to_page(error, 'show_trip_schedule', trip_id=trip_id)
 
     page = int(page)
-    plans = plans_per_page(itinerary, page, DAYS_PER_PAGE)
-    time = request.args.get("time", "")
+    plans = plans_by_date(itinerary['plans'])
+    at_time = request.args.get("time", "")
     activity = request.args.get("activity", "")
     note = request.args.get("note", "")
     cost = request.args.get("cost", "")
 
-    return render_template("itinerary.html",
-                           plans=plans,
-                           trip=trip,
-                           time=time,
-                           activity=activity,
-                           note=note,
-                           cost=cost,
-                           current_page = page,
-                           pages=pages
-                           )
+    return with_validators(
+        render_template("itinerary.html",
+                        plans=plans,
+                        day_totals=itinerary['day_totals'],
+                        trip=trip,
+                        time=at_time,
+                        activity=activity,
+                        note=note,
+                        cost=cost,
+                        current_page = page,
+                        pages=pages
+                        ),
+        etag,
+        trip['updated_at']
+        )
 
 
 @app.route("/trips/<int:trip_id>/activities/<int:activity_id>/edit",
            methods=["GET"])
 @require_activity
 def show_activity_to_edit(_activity, trip, trip_id, activity_id):
-    all_plans = g.storage.get_itinerary(trip_id)
-    itinerary = plans_by_date(all_plans)
-
     page = request.args.get('page', 1)
-    pages = total_pages(len(itinerary.keys()), DAYS_PER_PAGE)
+    itinerary = g.storage.get_itinerary_page(
+        trip_id,
+        page_number(page),
+        DAYS_PER_PAGE
+        )
+    pages = total_pages(itinerary['total_days'], DAYS_PER_PAGE)
     error = error_for_page(page, pages)
     if error:
-        flash(error['message'], 'error')
-        return redirect(url_for(
-            'show_trip_schedule',
-            trip_id=trip_id,
-            page=error['page'])
-            )
+        return redirect_to_page(error, 'show_trip_schedule', trip_id=trip_id)
 
     page = int(page)
-    plans = plans_per_page(itinerary, page, DAYS_PER_PAGE)
+    plans = plans_by_date(itinerary['plans'])
 
     return render_template("itinerary.html",
                            plans=plans,
+                           day_totals=itinerary['day_totals'],
                            trip=trip,
                            edit_activity_id=activity_id,
                            current_page=page,
@@ -400,17 +773,17 @@ def show_activity_to_edit(_activity, trip, trip_id, activity_id):
 def add_new_plan(trip, trip_id):
     page = request.form.get('page', 1, type=int)
     date = request.form['date'] or None
-    time = request.form['time'] or None
+    at_time = request.form['time'] or None
     activity = request.form['activity'].strip()
     note = request.form['note'].strip() or None
     cost = remove_punc_for_cost(request.form['cost']) or None
 
-    error = error_for_activity_input(date, time, activity, cost)
+    error = error_for_activity_input(date, at_time, activity, cost)
     if error:
         flash(error, "error")
         return redirect(url_for('show_trip_schedule',
                                 trip_id=trip_id,
-                                time=time,
+                                time=at_time,
                                 activity=activity,
                                 note=note,
                                 cost=cost)
@@ -419,7 +792,7 @@ def add_new_plan(trip, trip_id):
     if check:
         flash(check, "info")
 
-    g.storage.add_new_activity(date, time, activity, note, cost, trip_id)
+    g.storage.add_new_activity(date, at_time, activity, note, cost, trip_id)
     flash("Activity added.", "success")
     return redirect(url_for(
         'show_trip_schedule',
@@ -433,12 +806,12 @@ def add_new_plan(trip, trip_id):
 def edit_activity(activity, _trip, trip_id, activity_id):
     page = request.form.get('page', 1, type=int)
     date = request.form['date'] or None
-    time = request.form['time'] or None
+    at_time = request.form['time'] or None
     activity = request.form['activity'].strip()
     note = request.form['note'].strip() or None
     cost = remove_punc_for_cost(request.form['cost']) or None
 
-    error = error_for_activity_input(date, time, activity, cost)
+    error = error_for_activity_input(date, at_time, activity, cost)
     if error:
         for err in error:
             flash(err, "error")
@@ -450,7 +823,7 @@ def edit_activity(activity, _trip, trip_id, activity_id):
 
     g.storage.edit_activity_info(
         date,
-        time,
+        at_time,
         activity,
         note,
         cost,
@@ -483,6 +856,325 @@ def delete_activity(_activity, _trip, trip_id, activity_id):
         page=page)
         )
 
+
+# ---- INLINE EDITS ----
+# app.js swaps these fragments into the page in place of a full reload: a
+# trip card or activity row in view or edit mode, and after a save the
+# redrawn card or day. When a save moves the item elsewhere (new dates on
+# a trip, a new date on a plan) the response carries Wanderly-Location
+# and the script loads that page instead. Without JavaScript the edit
+# links and forms above are used as before.
+def fragment_location(url):
+    response = make_response('')
+    response.headers['Wanderly-Location'] = url
+    return response
+
+
+@app.route("/trips/<int:trip_id>/card")
+@require_trip
+def show_trip_card(trip, **_route_ids):
+    return render_template("_trip_card.html",
+                           trip=trip,
+                           current_page=request.args.get('page', 1, type=int),
+                           page_args={}
+                           )
+
+
+@app.route("/trips/<int:trip_id>/card/edit")
+@require_trip
+def show_trip_card_edit(trip, **_route_ids):
+    return render_template("_trip_card_edit.html",
+                           trip=trip,
+                           current_page=request.args.get('page', 1, type=int)
+                           )
+
+
+@app.route("/trips/<int:trip_id>/card", methods=["POST"])
+@require_trip
+def save_trip_card(trip, trip_id):
+    destination = request.form['destination'].strip()
+    start_date = request.form['start_date'] or None
+    end_date = request.form['end_date'] or None
+    page = request.form.get('page', 1, type=int)
+
+    error = error_for_trips(destination, start_date, end_date)
+    if error:
+        return render_template("_trip_card_edit.html",
+                               trip=trip,
+                               errors=error,
+                               current_page=page
+                               ), 422
+
+    saved = g.storage.edit_trip_heading(
+        destination,
+        start_date,
+        end_date,
+        trip_id
+        )
+    if saved is None:
+        # Deleted, e.g. from another tab, since the form was opened.
+        flash('Trip not found.', 'error')
+        return fragment_location(url_for('show_trips', page=page))
+
+    # Trips are listed by date, so new dates can move the card.
+    if (saved['depart_date'], saved['return_date']) != (
+            trip['depart_date'], trip['return_date']):
+        flash("Trip saved.", "success")
+        return fragment_location(url_for('show_trips', page=page))
+
+    return render_template("_trip_card.html",
+                           trip={**trip, **saved},
+                           current_page=page,
+                           page_args={}
+                           )
+
+
+@app.route("/trips/<int:trip_id>/activities/<int:activity_id>/row")
+@require_activity
+def show_activity_row(activity, trip, **_route_ids):
+    return render_template("_activity_row.html",
+                           trip=trip,
+                           act=activity,
+                           current_page=request.args.get('page', 1, type=int)
+                           )
+
+
+@app.route("/trips/<int:trip_id>/activities/<int:activity_id>/row/edit")
+@require_activity
+def show_activity_row_edit(activity, trip, **_route_ids):
+    return render_template("_activity_row_edit.html",
+                           trip=trip,
+                           act=activity,
+                           current_page=request.args.get('page', 1, type=int)
+                           )
+
+
+@app.route("/trips/<int:trip_id>/activities/<int:activity_id>/row",
+           methods=["POST"])
+@require_activity
+def save_activity_row(activity, trip, trip_id, activity_id):
+    page = request.form.get('page', 1, type=int)
+    date = request.form['date'] or None
+    at_time = request.form['time'] or None
+    title = request.form['activity'].strip()
+    note = request.form['note'].strip() or None
+    cost = remove_punc_for_cost(request.form['cost']) or None
+
+    error = error_for_activity_input(date, at_time, title, cost)
+    if error:
+        return render_template("_activity_row_edit.html",
+                               trip=trip,
+                               act=activity,
+                               errors=error,
+                               current_page=page
+                               ), 422
+
+    g.storage.edit_activity_info(
+        date,
+        at_time,
+        title,
+        note,
+        cost,
+        trip_id,
+        activity_id
+        )
+    # A plan moved to another day may land on another page.
+    old_date = activity['at_date'].isoformat() if activity['at_date'] else None
+    day = None
+    if date == old_date:
+        day = g.storage.get_itinerary_day(trip_id, activity['at_date'])
+    if day is None:
+        flash("Itinerary updated!", "success")
+        return fragment_location(url_for(
+            'show_trip_schedule',
+            trip_id=trip_id,
+            page=page)
+            )
+
+    date_key = activity['at_date'] or ''
+    return render_template("_day_update.html",
+                           trip={**trip, **day['trip_totals']},
+                           date=date_key,
+                           activities=day['plans'],
+                           day_totals={date_key: day['totals']},
+                           current_page=page
+                           )
+
+
+# ---- PAST TRIPS ----
+@app.route("/trips/past")
+@require_logged_in_user
+def show_past_trips():
+    after = request.args.get('after')
+    cursor = decode_past_cursor(after) if after else None
+    if after and not cursor:
+        flash('Invalid page cursor. Redirected.', 'error')
+        return redirect(url_for('show_past_trips'))
+
+    page = g.storage.get_past_trips_page(
+        session['user_id'],
+        PAST_TRIPS_PER_PAGE,
+        cursor
+        )
+    trips = page['trips']
+    next_cursor = None
+    if page['has_more']:
+        next_cursor = encode_past_cursor(trips[-1])
+
+    return render_template("past_trips.html",
+                           trips=trips,
+                           next_cursor=next_cursor,
+                           first_page=cursor is None
+                           )
+
+
+@app.route("/trips/past/<int:trip_id>")
+@require_logged_in_user
+def show_past_trip(trip_id):
+    trip = g.storage.find_past_trip(trip_id, session['user_id'])
+    if not trip:
+        flash('Trip not found.', 'error')
+        return redirect(url_for('show_past_trips'))
+
+    plans = plans_by_date(g.storage.get_past_itinerary(trip_id))
+    return render_template("past_trip.html", trip=trip, plans=plans)
+
+
+# ---- SEARCH ----
+@app.route("/search")
+@require_logged_in_user
+def search():
+    text = request.args.get('q', '').strip()[:SEARCH_MAX_LENGTH]
+    after = request.args.get('after')
+    cursor = decode_search_cursor(after) if after else None
+    if after and not cursor:
+        flash('Invalid page cursor. Redirected.', 'error')
+        return redirect(url_for('search', q=text))
+
+    results = []
+    next_cursor = None
+    if text:
+        found = g.storage.search(
+            session['user_id'],
+            text,
+            SEARCH_RESULTS_PER_PAGE,
+            cursor
+            )
+        results = found['results']
+        if found['has_more']:
+            next_cursor = encode_search_cursor(results[-1])
+
+    return render_template("search.html",
+                           query=text,
+                           results=results,
+                           next_cursor=next_cursor,
+                           first_page=cursor is None
+                           )
+
+
+@app.route("/search/suggest")
+def suggest():
+    if not user_logged_in():
+        return jsonify(suggestions=[]), 401
+    text = request.args.get('q', '')[:SEARCH_MAX_LENGTH]
+    return jsonify(suggestions=g.storage.suggest(session['user_id'], text))
+
+
+# ---- EXPORT / IMPORT ----
+def exported_plans(trip_id):
+    # The body is streamed after the request's teardown has already given
+    # g.storage's connection back, so the export checks out its own.
+    storage = Database()
+    try:
+        yield from storage.iter_trip_plans(trip_id)
+    finally:
+        storage.close()
+
+
+def export_response(lines, trip, extension, mimetype):
+    filename = secure_filename(trip['destination']) or 'trip'
+    return Response(
+        lines,
+        mimetype=mimetype,
+        headers={
+            'Content-Disposition':
+                f'attachment; filename="{filename}.{extension}"',
+        },
+        )
+
+
+@app.route("/trips/<int:trip_id>/export.csv")
+@require_trip
+def export_trip_csv(trip, trip_id):
+    plans = exported_plans(trip_id)
+    return export_response(csv_lines(plans), trip, 'csv', 'text/csv')
+
+
+@app.route("/trips/<int:trip_id>/export.ics")
+@require_trip
+def export_trip_ics(trip, trip_id):
+    plans = exported_plans(trip_id)
+    lines = ics_lines(trip, plans, request.host)
+    return export_response(lines, trip, 'ics', 'text/calendar')
+
+
+@app.route("/trips/<int:trip_id>/import", methods=["POST"])
+@require_trip
+def import_trip_csv(_trip, trip_id):
+    upload = request.files.get('file')
+    if not upload or not upload.filename:
+        flash("Choose a CSV file to import.", "error")
+        return redirect(url_for('show_trip_schedule', trip_id=trip_id))
+
+    rows, errors = read_plans_csv(upload.stream, IMPORT_MAX_ROWS)
+    if errors:
+        for error in errors[:5]:
+            flash(error, "error")
+        if len(errors) > 5:
+            flash(f"{len(errors) - 5} more errors not shown.", "error")
+        return redirect(url_for('show_trip_schedule', trip_id=trip_id))
+
+    imported = g.storage.import_activities(trip_id, rows)
+    flash(f"Imported {imported} activities.", "success")
+    return redirect(url_for('show_trip_schedule', trip_id=trip_id))
+
+
+# ---- API ----
+def api_error(message, status):
+    return jsonify(error=message), status
+
+
+@app.route("/api/trips/<int:trip_id>/plans:batch", methods=["POST"])
+def batch_plans(trip_id):
+    # The JSON counterpart of the activity forms: create, update and
+    # delete operations are all validated first, then applied together.
+    if not user_logged_in():
+        return api_error("Sign in required.", 401)
+    if not request.is_json:
+        return api_error("Expected a JSON body.", 415)
+
+    trip, _activity = g.storage.find_trip_for_user(trip_id, session['user_id'])
+    if not trip:
+        return api_error("Trip not found.", 404)
+
+    payload = request.get_json(silent=True)
+    error = error_for_plan_batch(payload, BATCH_MAX_OPERATIONS)
+    if error:
+        return api_error(*error)
+
+    operations = payload['operations']
+    results = plan_batch_results(operations)
+    applied = None
+    if not any(result.get('status') == 'invalid' for result in results):
+        creates, updates, deletes = split_plan_batch(
+            operations, results, trip)
+        applied = g.storage.apply_plan_batch(
+            trip_id, creates, updates, deletes)
+
+    if not finish_plan_batch(results, applied):
+        return jsonify(applied=False, results=results), 422
+    return jsonify(applied=True, results=results)
+
 if __name__ == "__main__":
     if os.environ.get('FLASK_ENV') == 'production':
         app.run(debug=False)
@@ -0,0 +1,112 @@
+import gzip
+import hashlib
+import json
+import os
+import re
+
+# Each page loads one stylesheet bundle, and pages that don't pick one get
+# every stylesheet. The sources keep the order the layout used to link
+# them in, so the cascade is unchanged.
+BUNDLES = {
+    'site.css': ('css/app.css', 'css/auth.css', 'css/layout.css',
+                 'css/trips.css', 'css/create-trip.css',
+                 'css/itinerary.css'),
+    'auth.css': ('css/app.css', 'css/auth.css', 'css/layout.css'),
+    'trips.css': ('css/app.css', 'css/layout.css', 'css/trips.css',
+                  'css/create-trip.css'),
+    'itinerary.css': ('css/app.css', 'css/layout.css', 'css/trips.css',
+                      'css/create-trip.css', 'css/itinerary.css'),
+    'app.js': ('js/app.js',),
+}
+
+DIST_DIR = 'dist'
+MANIFEST = 'manifest.json'
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+_CSS_COMMENT = re.compile(r'/\*.*?\*/', re.S)
+_CSS_SPACE = re.compile(r'\s+')
+_CSS_PUNCTUATION = re.compile(r'\s*([{};,>])\s*')
+
+_manifests = {}
+
+
+def minify_css(source):
+    css = _CSS_COMMENT.sub('', source)
+    css = _CSS_SPACE.sub(' ', css)
+    css = _CSS_PUNCTUATION.sub(r'\1', css)
+    css = css.replace(': ', ':').replace(';}', '}')
+    return css.strip()
+
+
+def minify_js(source):
+    # Only surrounding whitespace and blank lines go; line breaks stay, so
+    # automatic semicolon insertion reads the script as before.
+    lines = (line.strip() for line in source.splitlines())
+    return '\n'.join(line for line in lines if line)
+
+
+def _compressors():
+    compressors = {'gzip': lambda data: gzip.compress(data, 9, mtime=0)}
+    try:
+        import brotli  # pylint: disable=import-outside-toplevel
+    except ImportError:
+        return compressors, False
+    compressors['br'] = lambda data: brotli.compress(data, quality=11)
+    return compressors, True
+
+
+def build(static_folder):
+    # Writes each bundle as <name>.<hash>.<ext> into static/dist, next to
+    # its .gz (and, with the brotli package, .br) variant, and records the
+    # hashed names in the manifest.
+    dist = os.path.join(static_folder, DIST_DIR)
+    os.makedirs(dist, exist_ok=True)
+    compressors, has_brotli = _compressors()
+
+    manifest = {}
+    for name, sources in BUNDLES.items():
+        parts = []
+        for source in sources:
+            with open(os.path.join(static_folder, source),
+                      encoding='utf-8') as file:
+                parts.append(file.read())
+        minify = minify_css if name.endswith('.css') else minify_js
+        data = '\n'.join(minify(part) for part in parts).encode('utf-8')
+
+        stem, extension = os.path.splitext(name)
+        digest = hashlib.sha256(data).hexdigest()[:12]
+        filename = manifest[name] = f'{stem}.{digest}{extension}'
+
+        with open(os.path.join(dist, filename), 'wb') as file:
+            file.write(data)
+        for encoding, suffix in ENCODINGS:
+            if encoding in compressors:
+                with open(os.path.join(dist, filename + suffix), 'wb') as file:
+                    file.write(compressors[encoding](data))
+
+    with open(os.path.join(dist, MANIFEST), 'w', encoding='utf-8') as file:
+        json.dump(manifest, file, indent=2, sort_keys=True)
+    _manifests.pop(static_folder, None)
+    return manifest, has_brotli
+
+
+def load_manifest(static_folder):
+    # Read once per process; an unbuilt tree has an empty manifest.
+    if static_folder not in _manifests:
+        try:
+            with open(os.path.join(static_folder, DIST_DIR, MANIFEST),
+                      encoding='utf-8') as file:
+                _manifests[static_folder] = json.load(file)
+        except FileNotFoundError:
+            _manifests[static_folder] = {}
+    return _manifests[static_folder]
+
+
+def pick_encoding(dist, filename, accept_encodings):
+    # The best precompressed variant the client accepts, never compressing
+    # on the fly. Returns (encoding or None, file to send).
+    for encoding, suffix in ENCODINGS:
+        if accept_encodings[encoding] and os.path.exists(
+                os.path.join(dist, filename + suffix)):
+            return encoding, filename + suffix
+    return None, filename
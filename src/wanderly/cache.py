@@ -0,0 +1,174 @@
+from collections import OrderedDict
+import os
+import pickle
+import threading
+import time
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+class Cache:
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value, ttl=None):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def stats(self):
+        raise NotImplementedError
+
+
+class NullCache(Cache):
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl=None):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def clear(self):
+        pass
+
+    def stats(self):
+        return {'backend': 'none'}
+
+
+class LRUCache(Cache):
+
+    def __init__(self, max_entries=1024, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {
+            'hits': 0,
+            'misses': 0,
+            'sets': 0,
+            'evictions': 0,
+            'expirations': 0,
+        }
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._counters['misses'] += 1
+                return None
+
+            value, expires_at = entry
+            if expires_at and expires_at <= time.monotonic():
+                del self._entries[key]
+                self._counters['expirations'] += 1
+                self._counters['misses'] += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self._counters['hits'] += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            self._counters['sets'] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counters['evictions'] += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats['size'] = len(self._entries)
+        stats.update(backend='memory', max_entries=self.max_entries)
+        return stats
+
+
+class RedisCache(Cache):
+
+    def __init__(self, url, ttl=300, prefix='wanderly:'):
+        try:
+            import redis  # pylint: disable=import-outside-toplevel
+        except ImportError as error:
+            raise RuntimeError(
+                "CACHE_URL points at Redis but the redis package is not "
+                "installed. Run `pip install redis`."
+                ) from error
+
+        self.ttl = ttl
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url)
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'sets': 0}
+
+    def get(self, key):
+        data = self._client.get(self.prefix + key)
+        self._count('misses' if data is None else 'hits')
+        return None if data is None else pickle.loads(data)
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        self._client.set(self.prefix + key, pickle.dumps(value),
+                         ex=ttl or None)
+        self._count('sets')
+
+    def delete(self, key):
+        self._client.delete(self.prefix + key)
+
+    def clear(self):
+        for key in self._client.scan_iter(self.prefix + '*'):
+            self._client.delete(key)
+
+    def stats(self):
+        # Redis evicts on its own; its eviction count lives in INFO stats.
+        with self._lock:
+            stats = dict(self._counters)
+        stats['backend'] = 'redis'
+        return stats
+
+    def _count(self, key):
+        with self._lock:
+            self._counters[key] += 1
+
+
+def create_cache():
+    url = os.environ.get('CACHE_URL', 'memory')
+    ttl = float(os.environ.get('CACHE_TTL', 300))
+
+    if url == 'none':
+        return NullCache()
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisCache(url, ttl=ttl)
+    return LRUCache(
+        max_entries=int(os.environ.get('CACHE_MAX_ENTRIES', 1024)),
+        ttl=ttl,
+        )
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = create_cache()
+    return _cache
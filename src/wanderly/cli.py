@@ -0,0 +1,210 @@
+from datetime import date, timedelta
+import time
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+import psycopg2
+
+from .assets import build as build_assets
+from .database import Database, get_pool
+from .migrate import available_migrations, current_version, upgrade
+from .passwords import get_hasher
+from .pool import PoolTimeout
+from .reminders import create_transport, send_due_reminders
+from .seeding import seed_bulk
+
+db_cli = AppGroup('db', help="Manage the database schema.")
+
+
+@db_cli.command('upgrade')
+@click.option('--target', type=int, default=None,
+              help="Stop after applying this migration version.")
+def db_upgrade(target):
+    with get_pool().connection() as conn:
+        applied = upgrade(conn, target=target)
+
+    if not applied:
+        click.echo("Database schema is up to date.")
+    for migration in applied:
+        click.echo(f"Applied {migration.version:04d}_{migration.name}")
+
+
+@db_cli.command('current')
+def db_current():
+    with get_pool().connection() as conn:
+        version = current_version(conn)
+
+    click.echo(f"Current version: {version}")
+    for migration in available_migrations():
+        if migration.version > version:
+            click.echo(f"Pending: {migration.version:04d}_{migration.name}")
+
+
+totals_cli = AppGroup('totals', help="Check and rebuild cost totals.")
+
+
+@totals_cli.command('check')
+def totals_check():
+    storage = Database()
+    try:
+        mismatches = storage.check_plan_totals()
+    finally:
+        storage.close()
+
+    click.echo(f"Day totals out of date: {mismatches['day_mismatches']}")
+    click.echo(f"Trip totals out of date: {mismatches['trip_mismatches']}")
+    if any(mismatches.values()):
+        raise click.ClickException(
+            "Totals have drifted; run `flask totals rebuild`.")
+
+
+@totals_cli.command('rebuild')
+def totals_rebuild():
+    storage = Database()
+    try:
+        drifted = storage.rebuild_plan_totals()
+    finally:
+        storage.close()
+
+    click.echo(f"Rebuilt day and trip totals; {drifted} trips had drifted.")
+
+
+@click.command('seed-bulk',
+               help="Load synthetic users, trips and plans for load testing.")
+@click.option('--users', type=int, default=10_000, show_default=True,
+              help="Number of users to generate.")
+@click.option('--seed', type=int, default=0, show_default=True,
+              help="Random seed; the same seed gives the same data.")
+@click.option('--batch-size', type=int, default=50_000, show_default=True,
+              help="Plans per COPY batch.")
+@click.option('--password', default='wanderly', show_default=True,
+              help="Password shared by every generated user.")
+def seed_bulk_command(users, seed, batch_size, password):
+    started = time.perf_counter()
+
+    def progress(counts):
+        click.echo(f"{counts['users']:,} users, {counts['trips']:,} trips, "
+                   f"{counts['plans']:,} plans "
+                   f"({time.perf_counter() - started:.1f}s)")
+
+    # One hash for everyone: hashing per user would dominate the run.
+    password_hash = get_hasher().hash(password)
+    with get_pool().connection() as conn:
+        counts = seed_bulk(conn, users, password_hash, seed=seed,
+                           batch_size=batch_size, progress=progress)
+
+    click.echo(f"Seeded {counts['users']:,} users, {counts['trips']:,} trips "
+               f"and {counts['plans']:,} plans in "
+               f"{time.perf_counter() - started:.1f}s.")
+
+
+templates_cli = AppGroup('templates', help="Manage compiled templates.")
+
+
+@templates_cli.command('compile')
+def templates_compile():
+    # Loading a template compiles it and stores the bytecode in the cache
+    # directory, where every worker started afterwards picks it up.
+    env = current_app.jinja_env
+    names = env.list_templates(extensions=('html',))
+    for name in names:
+        env.get_template(name)
+    directory = env.bytecode_cache.directory
+    click.echo(f"Compiled {len(names)} templates into {directory}")
+
+
+assets_cli = AppGroup('assets', help="Build static asset bundles.")
+
+
+@assets_cli.command('build')
+def assets_build():
+    manifest, has_brotli = build_assets(current_app.static_folder)
+    for name, filename in sorted(manifest.items()):
+        click.echo(f"{name} -> {filename}")
+    if not has_brotli:
+        click.echo("brotli is not installed, so only gzip variants were "
+                   "written. Run `pip install brotli` to add .br files.")
+
+
+reminders_cli = AppGroup('reminders', help="Send activity reminders.")
+
+
+@reminders_cli.command('run')
+@click.option('--once', is_flag=True,
+              help="Send what is due now and exit instead of polling.")
+@click.option('--interval', type=float, default=60, show_default=True,
+              help="Seconds between scans.")
+@click.option('--batch-size', type=int, default=50, show_default=True,
+              help="Reminders claimed per transaction.")
+@click.option('--lead-minutes', type=int, default=60, show_default=True,
+              envvar='REMINDER_LEAD_MINUTES',
+              help="How long before a plan its reminder goes out.")
+@click.option('--max-attempts', type=int, default=5, show_default=True,
+              help="Give up on a reminder after this many failed sends.")
+@click.option('--sender', default='Wanderly <wanderly@localhost>',
+              show_default=True, envvar='REMINDER_FROM',
+              help="From address of the reminders.")
+def reminders_run(once, interval, batch_size, lead_minutes, max_attempts,
+                  sender):
+    # Any number of these can run side by side; each claims its own rows.
+    # Every scan checks out its own connection, so a database restart or a
+    # dropped connection only fails the scans until it is back.
+    transport = create_transport()
+    try:
+        while True:
+            storage = Database()
+            try:
+                counts = send_due_reminders(
+                    storage, transport, sender,
+                    lead=timedelta(minutes=lead_minutes),
+                    batch_size=batch_size,
+                    max_attempts=max_attempts,
+                    )
+            except (psycopg2.OperationalError, psycopg2.InterfaceError,
+                    PoolTimeout) as error:
+                if once:
+                    raise
+                click.echo(f"Scan failed, retrying: {str(error).strip()}",
+                           err=True)
+                counts = {}
+            finally:
+                storage.close()
+            if any(counts.values()):
+                click.echo(', '.join(f"{count} {status}"
+                                     for status, count in counts.items()
+                                     if count))
+            if once:
+                break
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+
+
+archive_cli = AppGroup('archive', help="Move past trips to the archive.")
+
+
+@archive_cli.command('run')
+@click.option('--after-days', type=int, default=30, show_default=True,
+              envvar='ARCHIVE_AFTER_DAYS',
+              help="Archive trips that returned more than this many days ago.")
+@click.option('--batch-size', type=int, default=500, show_default=True,
+              help="Trips moved per transaction.")
+def archive_run(after_days, batch_size):
+    # Each batch commits on its own, so trips are only locked briefly and
+    # an interrupted run loses nothing.
+    started = time.perf_counter()
+    before = date.today() - timedelta(days=after_days)
+    storage = Database()
+    archived = 0
+    try:
+        while True:
+            moved = storage.archive_trips(before, batch_size)
+            archived += moved
+            if moved < batch_size:
+                break
+    finally:
+        storage.close()
+
+    click.echo(f"Archived {archived:,} trips that returned before {before} "
+               f"in {time.perf_counter() - started:.1f}s.")
@@ -1,148 +1,815 @@
 from contextlib import contextmanager
+import csv
+import io
+import logging
 import os
+import random
+import re
+import threading
+import time
 import psycopg2
-from psycopg2.extras import DictCursor
+from psycopg2.extensions import parse_dsn
+from psycopg2.extras import DictCursor, execute_values
 
+from .cache import get_cache
+from .pool import ConnectionPool, PoolTimeout
+from .prepared import execute_prepared, prepared_statement
+from .tracing import TracingConnection, traced_methods
 
+logger = logging.getLogger(__name__)
+
+_pool = None
+_replica_pools = None
+_pool_lock = threading.Lock()
+_replica_lag = (0.0, [])
+
+
+def database_dsn():
+    if os.environ.get('FLASK_ENV') == 'production':
+        return os.environ['DATABASE_URL']
+    return 'dbname=wanderly'
+
+
+def replica_dsns():
+    # Comma-separated DSNs of streaming replicas of the primary.
+    return [
+        dsn.strip()
+        for dsn in os.environ.get('DATABASE_REPLICA_URLS', '').split(',')
+        if dsn.strip()
+    ]
+
+
+def create_pool(dsn=None):
+    return ConnectionPool(
+        dsn or database_dsn(),
+        min_size=int(os.environ.get('DB_POOL_MIN_SIZE', 1)),
+        max_size=int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+        max_uses=int(os.environ.get('DB_POOL_MAX_USES', 1000)),
+        idle_timeout=float(os.environ.get('DB_POOL_IDLE_TIMEOUT', 300)),
+        checkout_timeout=float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+        health_check_interval=float(
+            os.environ.get('DB_POOL_HEALTH_CHECK_INTERVAL', 30)),
+        connection_factory=TracingConnection,
+        )
+
+
+def get_pool():
+    # One pool per process: a pool inherited across a fork (gunicorn
+    # --preload) shares sockets with the parent, so the child builds its own.
+    global _pool
+    if _pool is None or _pool.pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool.pid != os.getpid():
+                _pool = create_pool()
+    return _pool
+
+
+def get_replica_pools():
+    global _replica_pools
+    if _replica_pools is None or any(
+            pool.pid != os.getpid() for pool in _replica_pools):
+        with _pool_lock:
+            if _replica_pools is None or any(
+                    pool.pid != os.getpid() for pool in _replica_pools):
+                _replica_pools = [create_pool(dsn) for dsn in replica_dsns()]
+    return _replica_pools
+
+
+def replica_name(pool):
+    # host:port/dbname, leaving out any password in the DSN.
+    dsn = parse_dsn(pool.dsn)
+    return (f"{dsn.get('host', 'localhost')}:{dsn.get('port', 5432)}/"
+            f"{dsn.get('dbname', '')}")
+
+
+REPLICA_LAG = """
+    SELECT GREATEST(pg_wal_lsn_diff(%(primary)s::pg_lsn,
+                                    pg_last_wal_replay_lsn()), 0) AS bytes,
+           CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn()
+                THEN 0
+                ELSE EXTRACT(epoch FROM now() - pg_last_xact_replay_timestamp())
+           END AS seconds
+    """
+
+
+def measure_replica_lag(pool, replicas):
+    # How far each replica trails the primary, in WAL bytes and seconds of
+    # replay. A replica that has replayed everything it received counts as
+    # caught up, however long ago the last write was.
+    with pool.connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute('SELECT pg_current_wal_lsn()::text')
+            primary = cursor.fetchone()[0]
+        conn.rollback()
+
+    lag = []
+    for replica in replicas:
+        row = {'replica': replica_name(replica), 'bytes': None,
+               'seconds': None}
+        try:
+            with replica.connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute(REPLICA_LAG, {'primary': primary})
+                    behind, seconds = cursor.fetchone()
+                conn.rollback()
+            if behind is not None:
+                row['bytes'] = int(behind)
+                row['seconds'] = float(seconds or 0)
+        except (psycopg2.Error, PoolTimeout) as error:
+            logger.warning("Replica %s is unavailable: %s", row['replica'],
+                           error)
+        lag.append(row)
+    return lag
+
+
+def replica_lag():
+    # measure_replica_lag for this process's pools, at most every
+    # DB_REPLICA_LAG_INTERVAL seconds.
+    global _replica_lag
+    checked_at, lag = _replica_lag
+    interval = float(os.environ.get('DB_REPLICA_LAG_INTERVAL', 5))
+    replicas = get_replica_pools()
+    if replicas and time.monotonic() - checked_at >= interval:
+        lag = measure_replica_lag(get_pool(), replicas)
+        _replica_lag = (time.monotonic(), lag)
+    return lag
+
+
+TRIP_SORT_COLUMNS = (
+    "COALESCE({table}.depart_date, 'infinity'::date)",
+    "COALESCE({table}.return_date, 'infinity'::date)",
+    "{table}.id",
+)
+
+
+def trip_sort_key(table, direction=''):
+    return ', '.join(
+        f'{column.format(table=table)} {direction}'.rstrip()
+        for column in TRIP_SORT_COLUMNS
+        )
+
+
+def trips_page_query(seek_operator=None, direction='ASC'):
+    seek = ''
+    if seek_operator:
+        seek = f"""AND ({trip_sort_key('trips')}) {seek_operator}
+                   (%(depart)s::date, %(return)s::date, %(id)s)"""
+    return f"""
+            WITH total AS (
+                SELECT COUNT(*) AS total
+                FROM trips
+                WHERE user_id = %(user_id)s
+            )
+            SELECT total.total, page.*
+            FROM total
+            LEFT JOIN LATERAL (
+                SELECT users.full_name AS name,
+                       trips.*,
+                       COALESCE(trip_totals.activity_count, 0)
+                           AS activity_count,
+                       COALESCE(trip_totals.total_cost, 0) AS total_cost
+                FROM trips
+                JOIN users ON trips.user_id = users.id
+                LEFT JOIN trip_totals ON trip_totals.trip_id = trips.id
+                WHERE trips.user_id = %(user_id)s
+                {seek}
+                ORDER BY {trip_sort_key('trips', direction)}
+                LIMIT %(limit)s OFFSET %(offset)s
+            ) AS page ON true
+            ORDER BY {trip_sort_key('page', direction)}
+            """
+
+
+# The queries behind every page view are prepared once per connection;
+# Database._execute falls back to plain execution when that is turned off.
+USER_CREDENTIALS = prepared_statement('user_credentials', """
+    SELECT * FROM users WHERE lower(email) = lower(%(email)s)
+    """)
+
+TRIPS_VERSION = prepared_statement('trips_version', """
+    SELECT trips_revision AS revision,
+           trips_updated_at AS updated_at
+    FROM users
+    WHERE id = %(user_id)s
+    """)
+
+TRIPS_PAGE = prepared_statement('trips_page', trips_page_query())
+TRIPS_PAGE_AFTER = prepared_statement(
+    'trips_page_after', trips_page_query('>', 'ASC'))
+TRIPS_PAGE_BEFORE = prepared_statement(
+    'trips_page_before', trips_page_query('<', 'DESC'))
+
+# The marker column splits the row into the trip's and the activity's
+# columns, whatever those tables currently contain.
+TRIP_FOR_USER = prepared_statement('trip_for_user', """
+    SELECT trips.*,
+           users.full_name AS name,
+           COALESCE(trip_totals.activity_count, 0) AS activity_count,
+           COALESCE(trip_totals.total_cost, 0) AS total_cost,
+           NULL AS activity_columns,
+           plans.*
+    FROM trips
+    JOIN users ON users.id = trips.user_id
+    LEFT JOIN trip_totals ON trip_totals.trip_id = trips.id
+    LEFT JOIN plans
+        ON plans.id = %(activity_id)s AND plans.trip_id = trips.id
+    WHERE trips.id = %(trip_id)s AND trips.user_id = %(user_id)s
+    """)
+
+SESSION = prepared_statement('session', """
+    SELECT data, expires_at
+    FROM sessions
+    WHERE id = %(id)s AND expires_at > now()
+    """)
+
+# Days come from plan_day_totals, numbered in the order the itinerary is
+# shown with the NULL "no date" bucket last. Only the plans on the
+# requested page of days are returned, each carrying its day's totals,
+# alongside the day count.
+ITINERARY_PAGE = prepared_statement('itinerary_page', """
+    WITH days AS (
+        SELECT at_date,
+               activity_count,
+               total_cost,
+               first_time,
+               last_time,
+               row_number() OVER (ORDER BY at_date NULLS LAST) AS day_number
+        FROM plan_day_totals
+        WHERE trip_id = %(trip_id)s
+    ),
+    total AS (
+        SELECT COUNT(*) AS total_days FROM days
+    )
+    SELECT total.total_days, page.*
+    FROM total
+    LEFT JOIN LATERAL (
+        SELECT plans.*,
+               days.activity_count AS day_activity_count,
+               days.total_cost AS day_total_cost,
+               days.first_time AS day_first_time,
+               days.last_time AS day_last_time
+        FROM plans
+        JOIN days ON plans.at_date IS NOT DISTINCT FROM days.at_date
+        WHERE plans.trip_id = %(trip_id)s
+          AND days.day_number BETWEEN %(first)s AND %(last)s
+    ) AS page ON true
+    ORDER BY page.at_date, page.at_time, page.id
+    """)
+
+# ts_headline wraps matches in these; highlight_parts splits on them so the
+# template can escape the text itself.
+HIGHLIGHT_START = '\x02'
+HIGHLIGHT_STOP = '\x03'
+HIGHLIGHT_OPTIONS = (f'StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_STOP}, '
+                     'HighlightAll=true')
+SEARCH_TERM = re.compile(r'\w+')
+
+
+# Documents of archived trips live in search_documents_archive under ids
+# from the same sequence, so matches from both page together on (rank, id).
+SEARCH_MATCHES = """
+    SELECT id, trip_id, plan_id, false AS archived,
+           ts_rank(document, query.query) AS rank
+    FROM search_documents, query
+    WHERE user_id = %(user_id)s
+      AND document @@ query.query
+    UNION ALL
+    SELECT id, trip_id, plan_id, true AS archived,
+           ts_rank(document, query.query) AS rank
+    FROM search_documents_archive, query
+    WHERE user_id = %(user_id)s
+      AND document @@ query.query
+    """
+
+# The page's matches joined to their trips and plans, wherever they live.
+SEARCH_SOURCES = """
+    SELECT page.*, trips.destination, trips.depart_date, trips.return_date,
+           plans.at_date, plans.at_time, plans.activity, plans.note
+    FROM page
+    JOIN trips ON trips.id = page.trip_id
+    LEFT JOIN plans ON plans.id = page.plan_id
+    WHERE NOT page.archived
+    UNION ALL
+    SELECT page.*, trips_archive.destination, trips_archive.depart_date,
+           trips_archive.return_date, plans_archive.at_date,
+           plans_archive.at_time, plans_archive.activity, plans_archive.note
+    FROM page
+    JOIN trips_archive ON trips_archive.id = page.trip_id
+    LEFT JOIN plans_archive ON plans_archive.id = page.plan_id
+    WHERE page.archived
+    """
+
+
+def search_query(seek=False):
+    # Matches are ranked in full, but only the page is joined to trips and
+    # plans and highlighted. One extra row tells whether another follows.
+    after = ''
+    if seek:
+        after = """AND (rank < %(rank)s::real
+                        OR (rank = %(rank)s::real AND id > %(id)s))"""
+    return f"""
+            WITH query AS (
+                SELECT websearch_to_tsquery('english', %(query)s) AS query
+            ),
+            page AS (
+                SELECT *
+                FROM ({SEARCH_MATCHES}) AS matches
+                WHERE true {after}
+                ORDER BY rank DESC, id
+                LIMIT %(limit)s
+            ),
+            found AS (
+                {SEARCH_SOURCES}
+            )
+            SELECT found.id, found.rank, found.trip_id, found.plan_id,
+                   found.archived, found.destination, found.depart_date,
+                   found.return_date, found.at_date, found.at_time,
+                   ts_headline('english',
+                               COALESCE(found.activity, found.destination),
+                               query.query, %(highlight)s) AS title,
+                   CASE WHEN found.note IS NOT NULL THEN
+                       ts_headline('english', found.note, query.query,
+                                   %(highlight)s)
+                   END AS note
+            FROM found
+            CROSS JOIN query
+            ORDER BY found.rank DESC, found.id
+            """
+
+
+SEARCH = search_query()
+SEARCH_AFTER = search_query(seek=True)
+
+# As-you-type suggestions: the titles of the best prefix matches, each once.
+SUGGEST = f"""
+    WITH query AS (
+        SELECT to_tsquery('english', %(query)s) AS query
+    ),
+    page AS (
+        SELECT *
+        FROM ({SEARCH_MATCHES}) AS matches
+        ORDER BY rank DESC, id
+        LIMIT %(candidates)s
+    ),
+    found AS (
+        {SEARCH_SOURCES}
+    )
+    SELECT COALESCE(activity, destination) AS title
+    FROM found
+    GROUP BY 1
+    ORDER BY max(rank) DESC, 1
+    LIMIT %(limit)s
+    """
+
+
+def prefix_tsquery(text):
+    # Every word typed so far, the last one possibly unfinished. Only word
+    # characters get through, so the result is always a valid tsquery.
+    return ' & '.join(f"'{term}':*" for term in SEARCH_TERM.findall(text))
+
+
+def highlight_parts(headline):
+    # [(text, matched), ...] from a ts_headline result.
+    first, *rest = headline.split(HIGHLIGHT_START)
+    parts = [(first, False)]
+    for chunk in rest:
+        matched, _, text = chunk.partition(HIGHLIGHT_STOP)
+        parts.extend(((matched, True), (text, False)))
+    return [part for part in parts if part[0]]
+
+
+# The day and trip totals that differ from a fresh count of the plans, as
+# the day_drift and trip_drift CTEs, for a query to follow.
+PLAN_TOTALS_DRIFT = """
+    WITH expected AS (
+        SELECT trip_id, at_date, COUNT(*) AS activity_count,
+               COALESCE(SUM(cost), 0) AS total_cost,
+               MIN(at_time) AS first_time,
+               MAX(at_time) AS last_time
+        FROM plans
+        GROUP BY trip_id, at_date
+    ),
+    actual AS (
+        SELECT trip_id, at_date, activity_count, total_cost,
+               first_time, last_time
+        FROM plan_day_totals
+    ),
+    expected_trips AS (
+        SELECT trip_id, SUM(activity_count) AS activity_count,
+               SUM(total_cost) AS total_cost
+        FROM expected
+        GROUP BY trip_id
+    ),
+    actual_trips AS (
+        SELECT trip_id, activity_count, total_cost
+        FROM trip_totals
+    ),
+    day_drift AS (
+        (TABLE expected EXCEPT TABLE actual)
+        UNION ALL
+        (TABLE actual EXCEPT TABLE expected)
+    ),
+    trip_drift AS (
+        (TABLE expected_trips EXCEPT TABLE actual_trips)
+        UNION ALL
+        (TABLE actual_trips EXCEPT TABLE expected_trips)
+    )
+    """
+
+# Up to %(limit)s trips that returned before %(before)s, oldest first,
+# copied into the archive with their totals. Trips locked by a writer are
+# left for the next run.
+ARCHIVE_TRIPS = """
+    WITH moving AS (
+        SELECT id
+        FROM trips
+        WHERE return_date < %(before)s
+        ORDER BY return_date, id
+        LIMIT %(limit)s
+        FOR UPDATE SKIP LOCKED
+    )
+    INSERT INTO trips_archive (id, destination, depart_date, return_date,
+                               user_id, activity_count, total_cost,
+                               updated_at)
+    SELECT trips.id, trips.destination, trips.depart_date, trips.return_date,
+           trips.user_id, COALESCE(trip_totals.activity_count, 0),
+           COALESCE(trip_totals.total_cost, 0), trips.updated_at
+    FROM moving
+    JOIN trips ON trips.id = moving.id
+    LEFT JOIN trip_totals ON trip_totals.trip_id = trips.id
+    RETURNING id, user_id
+    """
+
+ARCHIVE_PLANS = """
+    INSERT INTO plans_archive (id, trip_id, at_date, at_time, activity, cost,
+                               note)
+    SELECT id, trip_id, at_date, at_time, activity, cost, note
+    FROM plans
+    WHERE trip_id = ANY(%(trip_ids)s)
+    """
+
+ARCHIVE_SEARCH_DOCUMENTS = """
+    INSERT INTO search_documents_archive (id, user_id, trip_id, plan_id,
+                                          document)
+    SELECT id, user_id, trip_id, plan_id, document
+    FROM search_documents
+    WHERE trip_id = ANY(%(trip_ids)s)
+    """
+
+
+def past_trips_query(seek=False):
+    after = ''
+    if seek:
+        after = "AND (return_date, id) < (%(return)s::date, %(id)s)"
+    return f"""
+            SELECT id, destination, depart_date, return_date,
+                   activity_count, total_cost
+            FROM trips_archive
+            WHERE user_id = %(user_id)s {after}
+            ORDER BY return_date DESC, id DESC
+            LIMIT %(limit)s
+            """
+
+
+PAST_TRIPS = past_trips_query()
+PAST_TRIPS_AFTER = past_trips_query(seek=True)
+
+
+# When a plan is due; plans with a date but no time count as 9 AM.
+REMINDER_DUE_AT = "plans.at_date + COALESCE(plans.at_time, time '09:00')"
+
+# The date range lets the scan use plans_at_date_at_time_idx; the primary
+# key keeps a due time from being queued twice.
+QUEUE_REMINDERS = f"""
+    INSERT INTO reminder_deliveries (plan_id, due_at)
+    SELECT plans.id, {REMINDER_DUE_AT}
+    FROM plans
+    WHERE plans.at_date BETWEEN %(start)s::date AND %(end)s::date
+      AND {REMINDER_DUE_AT} > %(start)s
+      AND {REMINDER_DUE_AT} <= %(end)s
+    ON CONFLICT DO NOTHING
+    """
+
+# SKIP LOCKED lets several workers claim at once without waiting on or
+# taking each other's rows. Claimed rows are marked sending before anything
+# goes out, so a second worker never picks them up.
+CLAIM_REMINDERS = f"""
+    WITH claimed AS (
+        SELECT plan_id, due_at
+        FROM reminder_deliveries
+        WHERE status = 'pending'
+          AND due_at <= %(until)s
+          AND (claimed_at IS NULL OR claimed_at <= now() - %(retry_delay)s)
+        ORDER BY due_at
+        LIMIT %(limit)s
+        FOR UPDATE SKIP LOCKED
+    )
+    UPDATE reminder_deliveries AS deliveries
+    SET status = 'sending',
+        claimed_at = now(),
+        attempts = deliveries.attempts + 1
+    FROM claimed
+    JOIN plans ON plans.id = claimed.plan_id
+    JOIN trips ON trips.id = plans.trip_id
+    JOIN users ON users.id = trips.user_id
+    WHERE deliveries.plan_id = claimed.plan_id
+      AND deliveries.due_at = claimed.due_at
+    RETURNING deliveries.plan_id, deliveries.due_at, deliveries.attempts,
+              {REMINDER_DUE_AT} AS current_due_at,
+              plans.at_date, plans.at_time, plans.activity, plans.note,
+              trips.id AS trip_id, trips.destination,
+              users.full_name, users.email
+    """
+
+
+@traced_methods
 class Database:
 
+    # Methods that only read pass read=True and may be sent to a replica;
+    # everything else goes to the primary.
     @contextmanager
-    def _database_connect(self):
-        if os.environ.get('FLASK_ENV') =='production':
-            connection = psycopg2.connect(os.environ['DATABASE_URL'])
-        else:
-            connection = psycopg2.connect(dbname='wanderly')
+    def _database_connect(self, read=False):
+        if read and self._use_replica():
+            with self._replica_connection:
+                yield self._replica_connection
+            return
+
+        self._wrote = self._wrote or not read
+        if self._connection is not None and self._connection.closed:
+            self._pool.putconn(self._connection, discard=True)
+            self._connection = None
+        if self._connection is None:
+            self._connection = self._pool.getconn()
 
+        with self._connection:
+            yield self._connection
+
+    def __init__(self, pool=None, identity_map=None, cache=None, prepare=None,
+                 replicas=None, read_after=None):
+        self._pool = pool or get_pool()
+        self._connection = None
+        self._identity_map = {} if identity_map is None else identity_map
+        self._cache = get_cache() if cache is None else cache
+        if prepare is None:
+            prepare = os.environ.get('DB_PREPARED_STATEMENTS', '1') != '0'
+        self._prepare = prepare
+        self._replicas = get_replica_pools() if replicas is None else replicas
+        self._replica_pool = None
+        self._replica_connection = None
+        self._replica_skipped = False
+        # (lsn, deadline) from read_after_writes() of this session's last
+        # write request.
+        self._read_after = read_after
+        self._sticky_seconds = float(
+            os.environ.get('DB_REPLICA_STICKY_SECONDS', 10))
+        self._wrote = False
+
+    def close(self):
+        if self._connection is not None:
+            self._pool.putconn(self._connection)
+            self._connection = None
+        if self._replica_connection is not None:
+            self._replica_pool.putconn(self._replica_connection)
+            self._replica_connection = None
+
+    def _use_replica(self):
+        # Reads stay on the primary once this instance has written, and
+        # while a replica has not yet replayed the session's last write
+        # (for up to DB_REPLICA_STICKY_SECONDS). The choice of replica is
+        # made once and kept for the instance's lifetime.
+        if self._wrote or self._replica_skipped or not self._replicas:
+            return False
+        if self._replica_connection is not None:
+            if not self._replica_connection.closed:
+                return True
+            self._replica_pool.putconn(self._replica_connection, discard=True)
+            self._replica_connection = None
+
+        pool = random.choice(self._replicas)
         try:
-            with connection:
-                yield connection
-        finally:
-            connection.close()
+            conn = pool.getconn()
+            if not self._replayed(conn):
+                pool.putconn(conn)
+                self._replica_skipped = True
+                return False
+        except (psycopg2.Error, PoolTimeout) as error:
+            logger.warning("Reading from the primary; replica %s failed: %s",
+                           replica_name(pool), error)
+            self._replica_skipped = True
+            return False
+
+        self._replica_pool, self._replica_connection = pool, conn
+        return True
 
-    def __init__(self):
-        self._setup_schema()
+    def _replayed(self, conn):
+        if not self._read_after:
+            return True
+        lsn, deadline = self._read_after
+        if time.time() >= deadline:
+            return True
+        with conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    'SELECT pg_last_wal_replay_lsn() >= %s::pg_lsn', (lsn,))
+                replayed = cursor.fetchone()[0]
+        return bool(replayed)
 
-    def _setup_schema(self):
+    def read_after_writes(self):
+        # After a request that wrote, the primary's WAL position and how
+        # long to wait for a replica to replay it. The session keeps this
+        # so its next reads see its own writes.
+        if not (self._wrote and self._replicas):
+            return None
         with self._database_connect() as conn:
             with conn.cursor() as cursor:
-                cursor.execute("""
-                               SELECT COUNT(*)
-                               FROM information_schema.tables
-                               WHERE table_schema = 'public' AND table_name = 'users'
-                               """)
-                if cursor.fetchone()[0] == 0:
-                    cursor.execute("""
-                                   CREATE TABLE users(
-                                        id SERIAL PRIMARY KEY,
-                                        full_name varchar(255) NOT NULL,
-                                        email varchar(255) UNIQUE NOT NULL,
-                                        password text NOT NULL,
-                                        created_at date NOT NULL DEFAULT now()
-                                    );
-                                   """)
-                cursor.execute("""
-                               SELECT COUNT(*)
-                               FROM information_schema.tables
-                               WHERE table_schema = 'public' AND table_name = 'trips'
-                               """)
-                if cursor.fetchone()[0] == 0:
-                    cursor.execute("""
-                                   CREATE TABLE trips(
-                                        id serial PRIMARY KEY,
-                                        destination text NOT NULL,
-                                        depart_date date,
-                                        return_date date,
-                                        user_id integer NOT NULL REFERENCES users(id) ON DELETE CASCADE
-                                    );
-                                   """)
-                cursor.execute("""
-                               SELECT COUNT(*)
-                               FROM information_schema.tables
-                               WHERE table_schema = 'public' AND table_name = 'plans'
-                               """)
-                if cursor.fetchone()[0] == 0:
-                    cursor.execute("""
-                                   CREATE TABLE plans(
-                                        id serial PRIMARY KEY,
-                                        at_date date,
-                                        at_time time,
-                                        activity text NOT NULL,
-                                        cost numeric CHECK (cost >= 0.00),
-                                        note text,
-                                        trip_id integer NOT NULL,
-                                        FOREIGN KEY (trip_id) REFERENCES trips(id) ON DELETE CASCADE
-                                    );
-                                    """)
+                cursor.execute('SELECT pg_current_wal_lsn()::text')
+                lsn = cursor.fetchone()[0]
+        return [lsn, time.time() + self._sticky_seconds]
 
-# -------- AUTH --------
-    def user_exists(self, email):
-        return self.get_user_credentials(email)
+    # Cached reads put the revision they were read at (users.trips_revision
+    # for a user's trips, trips.revision for a trip) in the key. Writes bump
+    # those revisions in the database, so every worker moves on to new keys
+    # at once, and entries for older revisions age out with CACHE_TTL. The
+    # revision is read before the page, on the same connection, so a cached
+    # page is never older than the revision in its key.
+    def _trips_revision(self, user_id):
+        version = self.get_trips_version(user_id)
+        return version['revision'] if version else None
+
+    def _trip_revision(self, trip_id):
+        trip = self._identity_map.get(('trip', trip_id))
+        if trip:
+            return trip['revision']
+        with self._database_connect(read=True) as conn:
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT revision FROM trips WHERE id = %s',
+                               (trip_id,))
+                row = cursor.fetchone()
+        return row[0] if row else None
+
+    def _execute(self, cursor, statement, values):
+        if not self._prepare:
+            cursor.execute(statement.query, values)
+            return
+        pool = self._pool
+        if cursor.connection is self._replica_connection:
+            pool = self._replica_pool
+        prepared = pool.state(cursor.connection).setdefault('prepared', set())
+        execute_prepared(cursor, statement, values, prepared)
 
+    @staticmethod
+    def _touch_trip(cursor, trip_id):
+        # A plan change moves the trip's totals, which the trips list shows
+        # too, so the owner's list revision is bumped alongside the trip's.
+        cursor.execute("""
+                       WITH trip AS (
+                           UPDATE trips
+                           SET revision = revision + 1,
+                           updated_at = now()
+                           WHERE id = %s
+                           RETURNING user_id
+                       )
+                       UPDATE users
+                       SET trips_revision = trips_revision + 1,
+                       trips_updated_at = now()
+                       FROM trip
+                       WHERE users.id = trip.user_id
+                       """, (trip_id,))
+
+    @staticmethod
+    def _touch_user_trips(cursor, user_id):
+        cursor.execute("""
+                       UPDATE users
+                       SET trips_revision = trips_revision + 1,
+                       trips_updated_at = now()
+                       WHERE id = %s
+                       """, (user_id,))
+
+# -------- AUTH --------
     def create_new_user(self, name, email, password):
+        # Emails are unique regardless of case (users_email_lower_key), so
+        # a taken email, even one being signed up for concurrently, is a
+        # conflict rather than an error. Returns None when taken.
         query = """
                 INSERT INTO users (full_name, email, password)
                 VALUES (%s, %s, %s)
+                ON CONFLICT DO NOTHING
+                RETURNING id
                 """
         values = (name, email, password,)
         with self._database_connect() as conn:
             with conn.cursor() as cursor:
                 cursor.execute(query, values)
+                row = cursor.fetchone()
+        return row[0] if row else None
 
-    def get_user_credentials(self, email):
-        query = 'SELECT * FROM users WHERE email ILIKE %s'
+    def update_user_password(self, user_id, password):
+        query = 'UPDATE users SET password = %s WHERE id = %s'
         with self._database_connect() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(query, (password, user_id,))
+
+    def get_user_credentials(self, email):
+        with self._database_connect(read=True) as conn:
             with conn.cursor(cursor_factory=DictCursor) as cursor:
-                cursor.execute(query, (email,))
+                self._execute(cursor, USER_CREDENTIALS, {'email': email})
                 user = cursor.fetchone()
         return user
 
 
 # -------- TRIPS --------
-    def get_trip_count(self, user_id):
-        query = 'SELECT COUNT(*) FROM trips where user_id = %s'
-        with self._database_connect() as conn:
-            with conn.cursor(cursor_factory=DictCursor) as cursor:
-                cursor.execute(query, (user_id,))
-                row =  cursor.fetchone()
-        return row['count']
-
     def get_name_by_id(self, user_id):
+        key = ('user_name', user_id)
+        if key in self._identity_map:
+            return self._identity_map[key]
+
         query = 'SELECT full_name from users WHERE id = %s'
-        with self._database_connect() as conn:
+        with self._database_connect(read=True) as conn:
             with conn.cursor(cursor_factory=DictCursor) as cursor:
                 cursor.execute(query, (user_id,))
                 row = cursor.fetchone()
+
+        self._identity_map[key] = row['full_name']
         return row['full_name']
 
-    def get_trips_by_user_id(self, user_id, limit, offset):
-        query = """
-                SELECT users.full_name AS name, trips.*
-                FROM trips
-                JOIN users ON trips.user_id = users.id
-                WHERE trips.user_id = %s
-                ORDER BY trips.depart_date, trips.return_date, trips.id
-                LIMIT %s OFFSET %s
-                """
+    def get_trips_version(self, user_id):
+        key = ('trips_version', user_id)
+        if key in self._identity_map:
+            return self._identity_map[key]
 
-        with self._database_connect() as conn:
+        with self._database_connect(read=True) as conn:
+            with conn.cursor(cursor_factory=DictCursor) as cursor:
+                self._execute(cursor, TRIPS_VERSION, {'user_id': user_id})
+                version = cursor.fetchone()
+
+        self._identity_map[key] = version
+        return version
+
+    def get_trips_page(self, user_id, limit, offset=0, after=None,
+                       before=None):
+        key = (f"user:{user_id}:{self._trips_revision(user_id)}:trips:"
+               f"{limit}:{offset}:{after}:{before}")
+        page = self._cache.get(key)
+        if page is not None:
+            return page
+
+        # Trips are ordered on TRIP_SORT_COLUMNS, which matches the old
+        # ORDER BY depart_date, return_date, id (NULL dates last) and is
+        # indexed, so a cursor seeks straight to its page. One extra row is
+        # fetched to tell whether another page follows.
+        statement = TRIPS_PAGE
+        values = {
+            'user_id': user_id,
+            'limit': limit + 1,
+            'offset': offset,
+        }
+
+        cursor_key = after or before
+        if cursor_key:
+            statement = TRIPS_PAGE_AFTER if after else TRIPS_PAGE_BEFORE
+            values.update(zip(('depart', 'return', 'id'), cursor_key))
+            values['offset'] = 0
+
+        with self._database_connect(read=True) as conn:
             with conn.cursor(cursor_factory=DictCursor) as cursor:
-                cursor.execute(query, (user_id, limit, offset,))
-                trips = cursor.fetchall()
-        return trips
+                self._execute(cursor, statement, values)
+                rows = cursor.fetchall()
+
+        trips = [dict(row) for row in rows if row['id'] is not None]
+        has_more = len(trips) > limit
+        trips = trips[:limit]
+        if before:
+            trips.reverse()
+
+        page = {'trips': trips, 'total': rows[0]['total'],
+                'has_more': has_more}
+        self._cache.set(key, page)
+        return page
 
     def edit_trip_heading(self, destination, start_date, end_date, trip_id):
         query = """
                 UPDATE trips
                 SET destination = %s,
                 depart_date = %s,
-                return_date = %s
+                return_date = %s,
+                revision = revision + 1,
+                updated_at = now()
                 WHERE id = %s
+                RETURNING *
                 """
 
         values = (destination, start_date, end_date, trip_id,)
+        self._identity_map.clear()
         with self._database_connect() as conn:
-            with conn.cursor() as cursor:
+            with conn.cursor(cursor_factory=DictCursor) as cursor:
                 cursor.execute(query, values)
+                row = cursor.fetchone()
+                if row:
+                    self._touch_user_trips(cursor, row['user_id'])
+
+        if row is None:
+            return None
+        return dict(row)
 
     def create_new_trip(self, destination, start_date, end_date, user_id ):
         query = """
@@ -150,47 +817,295 @@ class Database:
                 VALUES (%s, %s, %s, %s)
                 """
         values = (destination, start_date, end_date, user_id,)
+        self._identity_map.clear()
         with self._database_connect() as conn:
             with conn.cursor() as cursor:
                 cursor.execute(query, values)
+                self._touch_user_trips(cursor, user_id)
 
     def delete_trip_by_id(self, trip_id):
-        query = 'DELETE FROM trips WHERE id = %s'
+        query = 'DELETE FROM trips WHERE id = %s RETURNING user_id'
+        self._identity_map.clear()
         with self._database_connect() as conn:
             with conn.cursor() as cursor:
                 cursor.execute(query, (trip_id, ))
+                row = cursor.fetchone()
+                if row:
+                    self._touch_user_trips(cursor, row[0])
 
-    def find_trip_by_id(self, trip_id):
-        query = 'SELECT * FROM trips WHERE id = %s'
-        with self._database_connect() as conn:
-            with conn.cursor(cursor_factory=DictCursor) as cursor:
-                cursor.execute(query, (trip_id,))
-                trip = cursor.fetchone()
-        return trip
+    def find_trip_for_user(self, trip_id, user_id, activity_id=None):
+        trip = self._identity_map.get(('trip', trip_id))
+        activity = self._identity_map.get(('activity', activity_id))
+        if trip and (activity_id is None or activity):
+            if trip['user_id'] != user_id:
+                return None, None
+            return trip, activity
+
+        values = {
+            'activity_id': activity_id,
+            'trip_id': trip_id,
+            'user_id': user_id,
+        }
+        with self._database_connect(read=True) as conn:
+            with conn.cursor() as cursor:
+                self._execute(cursor, TRIP_FOR_USER, values)
+                row = cursor.fetchone()
+                columns = [column.name for column in cursor.description]
+
+        if row is None:
+            return None, None
+
+        split = columns.index('activity_columns')
+        trip = dict(zip(columns[:split], row[:split]))
+        activity = dict(zip(columns[split + 1:], row[split + 1:]))
+        if activity['id'] is None:
+            activity = None
+
+        self._identity_map[('trip', trip_id)] = trip
+        self._identity_map[('user_name', user_id)] = trip['name']
+        if activity:
+            self._identity_map[('activity', activity_id)] = activity
+        return trip, activity
 
 # -------- ITINERARY --------
-    def get_itinerary(self, trip_id):
+    def get_itinerary_page(self, trip_id, page, days_per_page):
+        key = (f"trip:{trip_id}:{self._trip_revision(trip_id)}:itinerary:"
+               f"{page}:{days_per_page}")
+        itinerary = self._cache.get(key)
+        if itinerary is not None:
+            return itinerary
+
+        first = (page - 1) * days_per_page + 1
+        values = {
+            'trip_id': trip_id,
+            'first': first,
+            'last': first + days_per_page - 1,
+        }
+
+        with self._database_connect(read=True) as conn:
+            with conn.cursor(cursor_factory=DictCursor) as cursor:
+                self._execute(cursor, ITINERARY_PAGE, values)
+                rows = cursor.fetchall()
+
+        plans = []
+        day_totals = {}
+        for row in rows:
+            if row['id'] is None:
+                continue
+            plan = dict(row)
+            day_totals[plan['at_date'] or ''] = {
+                'activity_count': plan.pop('day_activity_count'),
+                'total_cost': plan.pop('day_total_cost'),
+                'first_time': plan.pop('day_first_time'),
+                'last_time': plan.pop('day_last_time'),
+            }
+            del plan['total_days']
+            plans.append(plan)
+
+        itinerary = {
+            'plans': plans,
+            'day_totals': day_totals,
+            'total_days': rows[0]['total_days'],
+        }
+        self._cache.set(key, itinerary)
+        return itinerary
+
+    def get_itinerary_day(self, trip_id, at_date):
+        # One day of the itinerary with its totals and the trip's, for
+        # redrawing a single day after an inline edit.
+        day = 'plans.at_date IS NULL' if at_date is None else (
+            'plans.at_date = %(at_date)s')
+        query = f"""
+                SELECT plans.*,
+                       plan_day_totals.activity_count AS day_activity_count,
+                       plan_day_totals.total_cost AS day_total_cost,
+                       plan_day_totals.first_time AS day_first_time,
+                       plan_day_totals.last_time AS day_last_time,
+                       trip_totals.activity_count AS trip_activity_count,
+                       trip_totals.total_cost AS trip_total_cost
+                FROM plans
+                JOIN plan_day_totals
+                    ON plan_day_totals.trip_id = plans.trip_id
+                   AND plan_day_totals.at_date
+                       IS NOT DISTINCT FROM plans.at_date
+                JOIN trip_totals ON trip_totals.trip_id = plans.trip_id
+                WHERE plans.trip_id = %(trip_id)s AND {day}
+                ORDER BY plans.at_time, plans.id
+                """
+        values = {'trip_id': trip_id, 'at_date': at_date}
+        with self._database_connect(read=True) as conn:
+            with conn.cursor(cursor_factory=DictCursor) as cursor:
+                cursor.execute(query, values)
+                rows = cursor.fetchall()
+
+        if not rows:
+            return None
+
+        plans = []
+        for row in rows:
+            plan = dict(row)
+            totals = {
+                'activity_count': plan.pop('day_activity_count'),
+                'total_cost': plan.pop('day_total_cost'),
+                'first_time': plan.pop('day_first_time'),
+                'last_time': plan.pop('day_last_time'),
+            }
+            trip_totals = {
+                'activity_count': plan.pop('trip_activity_count'),
+                'total_cost': plan.pop('trip_total_cost'),
+            }
+            plans.append(plan)
+        return {
+            'plans': plans,
+            'totals': totals,
+            'trip_totals': trip_totals,
+        }
+
+    def apply_plan_batch(self, trip_id, creates, updates, deletes):
+        # creates and updates are (date, time, activity, note, cost) rows,
+        # updates with the plan id first; deletes are plan ids. Everything
+        # runs in one transaction with one statement per kind. If any id is
+        # not a plan of this trip nothing is written and the missing ids
+        # are returned instead.
+        result = {'created': [], 'missing': []}
+        changed_ids = [row[0] for row in updates] + list(deletes)
+
+        self._identity_map.clear()
+        with self._database_connect() as conn:
+            with conn.cursor() as cursor:
+                if changed_ids:
+                    cursor.execute("""
+                                   SELECT id FROM plans
+                                   WHERE trip_id = %s AND id = ANY(%s)
+                                   ORDER BY id
+                                   FOR UPDATE
+                                   """, (trip_id, changed_ids,))
+                    found = {row[0] for row in cursor.fetchall()}
+                    result['missing'] = [plan_id for plan_id in changed_ids
+                                         if plan_id not in found]
+                    if result['missing']:
+                        return result
+
+                if deletes:
+                    cursor.execute("""
+                                   DELETE FROM plans
+                                   WHERE trip_id = %s AND id = ANY(%s)
+                                   """, (trip_id, list(deletes),))
+
+                if updates:
+                    execute_values(cursor, """
+                        UPDATE plans
+                        SET at_date = changes.at_date,
+                        at_time = changes.at_time,
+                        activity = changes.activity,
+                        note = changes.note,
+                        cost = changes.cost,
+                        revision = plans.revision + 1
+                        FROM (VALUES %s) AS changes
+                            (id, at_date, at_time, activity, note, cost,
+                             trip_id)
+                        WHERE plans.id = changes.id
+                          AND plans.trip_id = changes.trip_id
+                        """,
+                        [row + (trip_id,) for row in updates],
+                        template='(%s::integer, %s::date, %s::time, %s, %s, '
+                                 '%s::numeric, %s::integer)',
+                        page_size=len(updates),
+                        )
+
+                if creates:
+                    created = execute_values(cursor, """
+                        INSERT INTO plans
+                            (at_date, at_time, activity, note, cost, trip_id)
+                        VALUES %s
+                        RETURNING id
+                        """,
+                        [row + (trip_id,) for row in creates],
+                        template='(%s::date, %s::time, %s, %s, %s::numeric, '
+                                 '%s::integer)',
+                        page_size=len(creates),
+                        fetch=True,
+                        )
+                    result['created'] = [row[0] for row in created]
+
+                self._touch_trip(cursor, trip_id)
+
+        return result
+
+    def iter_trip_plans(self, trip_id, batch_size=500):
+        # A named cursor keeps the rows on the server and fetches them in
+        # batches, so exporting a large trip never holds it all in memory.
+        # It is held past the query's transaction, so nothing is left open
+        # while the rows are yielded, and closed however iteration ends.
         query = """
-                SELECT *
+                SELECT id, at_date, at_time, activity, note, cost
                 FROM plans
-                WHERE plans.trip_id = %s
-                ORDER BY at_date, at_time, plans.id
+                WHERE trip_id = %s
+                ORDER BY at_date, at_time, id
                 """
+        with self._database_connect(read=True) as conn:
+            cursor = conn.cursor(f'export_trip_{trip_id}',
+                                 cursor_factory=DictCursor, withhold=True)
+            cursor.itersize = batch_size
+            cursor.execute(query, (trip_id,))
+
+        try:
+            yield from cursor
+        finally:
+            cursor.close()
+
+    def import_activities(self, trip_id, rows):
+        # Rows are copied into a scratch table and inserted with one
+        # statement, so the triggers and the trip touch run once per file.
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(
+            ['' if value is None else value for value in row] for row in rows
+            )
+        buffer.seek(0)
+
+        self._identity_map.clear()
         with self._database_connect() as conn:
-            with conn.cursor(cursor_factory=DictCursor) as cursor:
-                cursor.execute(query, (trip_id,))
-                itinerary = cursor.fetchall()
-        return itinerary
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                               CREATE TEMP TABLE plan_import (
+                                   at_date text,
+                                   at_time text,
+                                   activity text,
+                                   note text,
+                                   cost text
+                               ) ON COMMIT DROP
+                               """)
+                cursor.copy_expert(
+                    'COPY plan_import FROM STDIN WITH (FORMAT csv)', buffer)
+                cursor.execute("""
+                               INSERT INTO plans
+                                   (at_date, at_time, activity, note, cost,
+                                    trip_id)
+                               SELECT NULLIF(at_date, '')::date,
+                                      NULLIF(at_time, '')::time,
+                                      activity,
+                                      NULLIF(note, ''),
+                                      NULLIF(cost, '')::numeric,
+                                      %s
+                               FROM plan_import
+                               WHERE activity <> ''
+                               """, (trip_id,))
+                imported = cursor.rowcount
+                self._touch_trip(cursor, trip_id)
+
+        return imported
 
-    def add_new_activity(self, date, time, title, note, cost, trip_id):
+    def add_new_activity(self, date, at_time, title, note, cost, trip_id):
         query = """
                 INSERT INTO plans (at_date, at_time, activity, note, cost, trip_id)
                 VALUES (%s, %s, %s, %s, %s, %s)
                 """
-        values = (date, time, title, note, cost, trip_id,)
+        values = (date, at_time, title, note, cost, trip_id,)
+        self._identity_map.clear()
         with self._database_connect() as conn:
             with conn.cursor() as cursor:
                 cursor.execute(query, values)
+                self._touch_trip(cursor, trip_id)
 
     def delete_day_for_trip(self, trip_id, day):
         query = 'DELETE FROM plans WHERE trip_id = %s and at_date = %s'
@@ -200,20 +1115,24 @@ class Database:
             query = 'DELETE FROM plans WHERE trip_id = %s and at_date IS NULL'
             values = (trip_id,)
 
+        self._identity_map.clear()
         with self._database_connect() as conn:
             with conn.cursor() as cursor:
                 cursor.execute(query, values)
+                self._touch_trip(cursor, trip_id)
 
     def delete_activity_by_id(self, trip_id, activity_id):
         query = 'DELETE FROM plans WHERE trip_id = %s AND id = %s'
+        self._identity_map.clear()
         with self._database_connect() as conn:
             with conn.cursor() as cursor:
                 cursor.execute(query, (trip_id, activity_id,))
+                self._touch_trip(cursor, trip_id)
 
     def edit_activity_info(
             self,
             date,
-            time,
+            at_time,
             title,
             note,
             cost,
@@ -226,18 +1145,250 @@ class Database:
                 at_time = %s,
                 activity = %s,
                 note = %s,
-                cost = %s
+                cost = %s,
+                revision = revision + 1
                 WHERE trip_id = %s AND id = %s
                 """
-        values = (date, time, title, note, cost, trip_id, activity_id, )
+        values = (date, at_time, title, note, cost, trip_id, activity_id, )
+        self._identity_map.clear()
         with self._database_connect() as conn:
             with conn.cursor() as cursor:
                 cursor.execute(query, values)
+                self._touch_trip(cursor, trip_id)
+
+# -------- ARCHIVE --------
+    def archive_trips(self, before, limit=500):
+        # Moves one batch of trips that returned before `before`, with
+        # their plans and search documents, into the archive; returns how
+        # many moved. Deleting the trips cascades to their plans, totals
+        # and the original search documents.
+        with self._database_connect() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(ARCHIVE_TRIPS, {'before': before,
+                                               'limit': limit})
+                moved = cursor.fetchall()
+                trip_ids = [trip_id for trip_id, _ in moved]
+                user_ids = sorted({user_id for _, user_id in moved})
+                if moved:
+                    cursor.execute(ARCHIVE_PLANS, {'trip_ids': trip_ids})
+                    cursor.execute(ARCHIVE_SEARCH_DOCUMENTS,
+                                   {'trip_ids': trip_ids})
+                    cursor.execute('DELETE FROM trips WHERE id = ANY(%s)',
+                                   (trip_ids,))
+                    cursor.execute("""
+                                   UPDATE users
+                                   SET trips_revision = trips_revision + 1,
+                                   trips_updated_at = now()
+                                   WHERE id = ANY(%s)
+                                   """, (user_ids,))
+
+        self._identity_map.clear()
+        return len(moved)
 
-    def find_activity_by_id(self, activity_id):
-        query = 'SELECT * FROM plans WHERE id = %s'
+    def get_past_trips_page(self, user_id, limit, after=None):
+        key = (f"user:{user_id}:{self._trips_revision(user_id)}:past:"
+               f"{limit}:{after}")
+        page = self._cache.get(key)
+        if page is not None:
+            return page
+
+        statement = PAST_TRIPS_AFTER if after else PAST_TRIPS
+        values = {'user_id': user_id, 'limit': limit + 1}
+        if after:
+            values.update(zip(('return', 'id'), after))
+
+        with self._database_connect(read=True) as conn:
+            with conn.cursor(cursor_factory=DictCursor) as cursor:
+                cursor.execute(statement, values)
+                trips = [dict(row) for row in cursor.fetchall()]
+
+        page = {'trips': trips[:limit], 'has_more': len(trips) > limit}
+        self._cache.set(key, page)
+        return page
+
+    def find_past_trip(self, trip_id, user_id):
+        query = """
+                SELECT * FROM trips_archive
+                WHERE id = %s AND user_id = %s
+                """
+        with self._database_connect(read=True) as conn:
+            with conn.cursor(cursor_factory=DictCursor) as cursor:
+                cursor.execute(query, (trip_id, user_id,))
+                trip = cursor.fetchone()
+        return dict(trip) if trip else None
+
+    def get_past_itinerary(self, trip_id):
+        query = """
+                SELECT * FROM plans_archive
+                WHERE trip_id = %s
+                ORDER BY at_date, at_time, id
+                """
+        with self._database_connect(read=True) as conn:
+            with conn.cursor(cursor_factory=DictCursor) as cursor:
+                cursor.execute(query, (trip_id,))
+                plans = cursor.fetchall()
+        return [dict(plan) for plan in plans]
+
+# -------- SEARCH --------
+    def search(self, user_id, text, limit, after=None):
+        # after is the (rank, id) of the last result on the previous page.
+        values = {
+            'user_id': user_id,
+            'query': text,
+            'limit': limit + 1,
+            'highlight': HIGHLIGHT_OPTIONS,
+        }
+        if after:
+            values.update(zip(('rank', 'id'), after))
+
+        with self._database_connect(read=True) as conn:
+            with conn.cursor(cursor_factory=DictCursor) as cursor:
+                cursor.execute(SEARCH_AFTER if after else SEARCH, values)
+                rows = cursor.fetchall()
+
+        results = []
+        for row in rows[:limit]:
+            result = dict(row)
+            result['title'] = highlight_parts(result['title'])
+            result['note'] = highlight_parts(result['note'] or '')
+            results.append(result)
+        return {'results': results, 'has_more': len(rows) > limit}
+
+    def suggest(self, user_id, text, limit=8):
+        query = prefix_tsquery(text)
+        if not query:
+            return []
+
+        values = {
+            'user_id': user_id,
+            'query': query,
+            'candidates': limit * 5,
+            'limit': limit,
+        }
+        with self._database_connect(read=True) as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(SUGGEST, values)
+                rows = cursor.fetchall()
+        return [row[0] for row in rows]
+
+# -------- TOTALS --------
+    # plan_day_totals and trip_totals are kept current by triggers on
+    # plans (migration 0005). These compare them against a fresh count and
+    # rebuild them if they ever drift.
+    def check_plan_totals(self):
+        query = PLAN_TOTALS_DRIFT + """
+                SELECT
+                    (SELECT COUNT(DISTINCT (trip_id, at_date))
+                     FROM day_drift) AS day_mismatches,
+                    (SELECT COUNT(DISTINCT trip_id)
+                     FROM trip_drift) AS trip_mismatches
+                """
+        with self._database_connect() as conn:
+            with conn.cursor(cursor_factory=DictCursor) as cursor:
+                cursor.execute(query)
+                mismatches = cursor.fetchone()
+        return dict(mismatches)
+
+    def rebuild_plan_totals(self):
+        # The trips whose totals were wrong get new revisions, and so do
+        # their owners' lists, so no ETag keeps confirming the old totals.
+        drifted = PLAN_TOTALS_DRIFT + """
+                  SELECT trip_id FROM day_drift
+                  UNION
+                  SELECT trip_id FROM trip_drift
+                  """
+        self._identity_map.clear()
+        with self._database_connect() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(drifted)
+                trip_ids = [trip_id for trip_id, in cursor.fetchall()]
+                cursor.execute('SELECT rebuild_plan_totals()')
+                cursor.execute("""
+                               WITH touched AS (
+                                   UPDATE trips
+                                   SET revision = revision + 1,
+                                   updated_at = now()
+                                   WHERE id = ANY(%s)
+                                   RETURNING user_id
+                               )
+                               UPDATE users
+                               SET trips_revision = trips_revision + 1,
+                               trips_updated_at = now()
+                               WHERE id IN (SELECT user_id FROM touched)
+                               """, (trip_ids,))
+
+        self._cache.clear()
+        return len(trip_ids)
+
+# -------- SESSIONS --------
+    def load_session(self, session_id):
+        with self._database_connect() as conn:
+            with conn.cursor() as cursor:
+                self._execute(cursor, SESSION, {'id': session_id})
+                row = cursor.fetchone()
+        return row
+
+    def save_session(self, session_id, data, expires_at):
+        query = """
+                INSERT INTO sessions (id, data, expires_at)
+                VALUES (%s, %s, %s)
+                ON CONFLICT (id) DO UPDATE
+                SET data = EXCLUDED.data,
+                expires_at = EXCLUDED.expires_at
+                """
+        with self._database_connect() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(query, (session_id, data, expires_at,))
+
+    def delete_session(self, session_id):
+        query = 'DELETE FROM sessions WHERE id = %s'
+        with self._database_connect() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(query, (session_id,))
+
+    def purge_expired_sessions(self, limit=1000):
+        # Small batches keep each cleanup short; it runs again soon enough.
+        query = """
+                DELETE FROM sessions
+                WHERE id IN (
+                    SELECT id FROM sessions
+                    WHERE expires_at <= now()
+                    LIMIT %s
+                )
+                """
+        with self._database_connect() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(query, (limit,))
+                purged = cursor.rowcount
+        return purged
+
+# -------- REMINDERS --------
+    def queue_reminders(self, start, end):
+        with self._database_connect() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(QUEUE_REMINDERS, {'start': start, 'end': end})
+                queued = cursor.rowcount
+        return queued
+
+    def claim_reminders(self, until, limit, retry_delay):
+        values = {'until': until, 'limit': limit, 'retry_delay': retry_delay}
         with self._database_connect() as conn:
             with conn.cursor(cursor_factory=DictCursor) as cursor:
-                cursor.execute(query, (activity_id,))
-                activity = cursor.fetchone()
-        return activity
+                cursor.execute(CLAIM_REMINDERS, values)
+                claimed = cursor.fetchall()
+        return sorted((dict(row) for row in claimed),
+                      key=lambda row: row['due_at'])
+
+    def finish_reminder(self, plan_id, due_at, status, error=None):
+        query = """
+                UPDATE reminder_deliveries
+                SET status = %(status)s,
+                    last_error = %(error)s,
+                    sent_at = CASE WHEN %(status)s = 'sent' THEN now() END
+                WHERE plan_id = %(plan_id)s AND due_at = %(due_at)s
+                """
+        values = {'plan_id': plan_id, 'due_at': due_at, 'status': status,
+                  'error': error}
+        with self._database_connect() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(query, values)
@@ -0,0 +1,115 @@
+import csv
+from datetime import datetime, timezone
+import io
+
+from .filters import formatted_time
+from .utils import error_for_activity_input, remove_punc_for_cost
+
+CSV_COLUMNS = ('date', 'time', 'activity', 'note', 'cost')
+
+
+def _csv_line(values):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(values)
+    return buffer.getvalue()
+
+
+def csv_lines(plans):
+    # Dates are written as YYYY-MM-DD and times like the itinerary shows
+    # them, which is also what the import (and the activity form) accepts.
+    yield _csv_line(CSV_COLUMNS)
+    for plan in plans:
+        yield _csv_line((
+            plan['at_date'].isoformat() if plan['at_date'] else '',
+            formatted_time(plan['at_time']),
+            plan['activity'],
+            plan['note'] or '',
+            '' if plan['cost'] is None else plan['cost'],
+            ))
+
+
+def _ics_text(value):
+    return (str(value).replace('\\', '\\\\').replace(';', '\\;')
+            .replace(',', '\\,').replace('\n', '\\n'))
+
+
+def _ics_line(line):
+    # Lines longer than 75 octets are folded onto continuation lines that
+    # start with a space (RFC 5545, section 3.1).
+    encoded = line.encode('utf-8')
+    parts = []
+    while len(encoded) > 75:
+        cut = 75 if not parts else 74
+        while cut and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode('utf-8'))
+        encoded = encoded[cut:]
+    parts.append(encoded.decode('utf-8'))
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def ics_lines(trip, plans, host):
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    yield _ics_line('BEGIN:VCALENDAR')
+    yield _ics_line('VERSION:2.0')
+    yield _ics_line('PRODID:-//Wanderly//Itinerary//EN')
+    yield _ics_line(f"X-WR-CALNAME:{_ics_text(trip['destination'])}")
+
+    # Activities without a date have nowhere to go on a calendar. Those
+    # without a time become all-day events.
+    for plan in plans:
+        if not plan['at_date']:
+            continue
+        if plan['at_time']:
+            start = datetime.combine(plan['at_date'], plan['at_time'])
+            start = f"DTSTART:{start.strftime('%Y%m%dT%H%M%S')}"
+        else:
+            start = f"DTSTART;VALUE=DATE:{plan['at_date'].strftime('%Y%m%d')}"
+
+        description = plan['note'] or ''
+        if plan['cost'] is not None:
+            description = f"{description}\nCost: {plan['cost']}".lstrip()
+
+        yield _ics_line('BEGIN:VEVENT')
+        yield _ics_line(f"UID:plan-{plan['id']}@{host}")
+        yield _ics_line(f'DTSTAMP:{stamp}')
+        yield _ics_line(start)
+        yield _ics_line(f"SUMMARY:{_ics_text(plan['activity'])}")
+        if description:
+            yield _ics_line(f'DESCRIPTION:{_ics_text(description)}')
+        yield _ics_line('END:VEVENT')
+
+    yield _ics_line('END:VCALENDAR')
+
+
+def read_plans_csv(stream, max_rows):
+    # Returns (rows, errors). Each row is validated the same way as the
+    # activity form; errors name the CSV line so the file can be fixed.
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8-sig'))
+    rows = []
+    errors = []
+    try:
+        # Reading the header decodes the first chunk of the file, which is
+        # all of a small one.
+        missing = set(CSV_COLUMNS) - set(reader.fieldnames or ())
+        if missing:
+            return [], [
+                f"CSV is missing columns: {', '.join(sorted(missing))}."]
+
+        for line, record in enumerate(reader, start=2):
+            if len(rows) >= max_rows:
+                return [], [f"CSV has more than {max_rows} activities."]
+
+            date = (record['date'] or '').strip() or None
+            time = (record['time'] or '').strip() or None
+            activity = (record['activity'] or '').strip()
+            note = (record['note'] or '').strip() or None
+            cost = remove_punc_for_cost((record['cost'] or '').strip()) or None
+
+            for error in error_for_activity_input(date, time, activity, cost):
+                errors.append(f"Line {line}: {error}")
+            rows.append((date, time, activity, note, cost))
+    except (UnicodeDecodeError, csv.Error):
+        return [], ["CSV file could not be read."]
+
+    return rows, errors
@@ -0,0 +1,45 @@
+import hashlib
+
+from markupsafe import Markup
+
+
+class Fragments:
+    # Rendered pieces of a page kept in the cache. Keys carry the revisions
+    # of the rows a piece shows, so a change orphans exactly the pieces it
+    # touched and the rest are reused. The release is part of every key so
+    # a deploy with new templates starts afresh.
+
+    def __init__(self, env, cache, release=''):
+        self.env = env
+        self.cache = cache
+        self.release = release
+
+    def render(self, key, template_name, **context):
+        if key is None:
+            return Markup(self.env.get_template(template_name).render(context))
+
+        key = f'fragment:{self.release}:{key}'
+        html = self.cache.get(key)
+        if html is None:
+            html = self.env.get_template(template_name).render(context)
+            self.cache.set(key, html)
+        return Markup(html)
+
+
+def activity_key(trip_id, activity, page):
+    # The row links back to the page it is on.
+    return (f"activity:{trip_id}:{activity['id']}:{activity['revision']}:"
+            f"{page}")
+
+
+def day_key(trip_id, date, activities, page, prefill):
+    # A day shows every plan on its date, so the plans' ids and revisions
+    # pin down its totals as well as its rows. The add form at the bottom
+    # is prefilled from the query string.
+    version = repr((
+        str(date),
+        [(activity['id'], activity['revision']) for activity in activities],
+        prefill,
+        ))
+    digest = hashlib.sha256(version.encode('utf-8')).hexdigest()[:16]
+    return f'day:{trip_id}:{page}:{digest}'
@@ -0,0 +1,141 @@
+from collections import defaultdict
+import os
+import time
+
+_metrics = None
+
+REQUEST_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+DB_BUCKETS = (.0005, .001, .0025, .005, .01, .025, .05, .1, .25, 1)
+
+
+class Metrics:
+    # Prometheus metrics for the app. Under gunicorn, set
+    # PROMETHEUS_MULTIPROC_DIR to an empty directory before the workers
+    # start; each worker then writes its samples there and /metrics adds
+    # them up across workers.
+
+    def __init__(self, gauge_interval=1.0):
+        try:
+            import prometheus_client  # pylint: disable=import-outside-toplevel
+        except ImportError as error:
+            raise RuntimeError(
+                "WANDERLY_METRICS is set but the prometheus_client package "
+                "is not installed. Run `pip install prometheus_client`."
+                ) from error
+
+        self._client = prometheus_client
+        self.multiprocess = bool(os.environ.get('PROMETHEUS_MULTIPROC_DIR'))
+        self.gauge_interval = gauge_interval
+        self._gauges_updated = 0.0
+        self._children = {}
+
+        counter = prometheus_client.Counter
+        gauge = prometheus_client.Gauge
+        histogram = prometheus_client.Histogram
+        self.requests = counter(
+            'wanderly_requests', "Requests handled.",
+            ['endpoint', 'method', 'status'])
+        self.request_seconds = histogram(
+            'wanderly_request_duration_seconds', "Time to handle a request.",
+            ['endpoint'], buckets=REQUEST_BUCKETS)
+        self.db_seconds = histogram(
+            'wanderly_db_duration_seconds',
+            "Database time per Database method call in a request.",
+            ['method'], buckets=DB_BUCKETS)
+        self.db_queries = counter(
+            'wanderly_db_queries', "Queries run, by Database method.",
+            ['method'])
+        self.page_redirects = counter(
+            'wanderly_page_redirects',
+            "Out-of-range or invalid page numbers that were redirected.",
+            ['endpoint'])
+        self.flashes = counter(
+            'wanderly_flashes', "Flashed messages by category.",
+            ['endpoint', 'category'])
+        # Gauges are per worker; livesum adds up the workers still running.
+        self.pool = gauge(
+            'wanderly_pool_connections', "Database connections by state.",
+            ['state'], multiprocess_mode='livesum')
+        self.cache = gauge(
+            'wanderly_cache_events',
+            "Cache hits, misses and evictions since the worker started.",
+            ['event'], multiprocess_mode='livesum')
+        # Every worker measures the same replicas; report the worst.
+        self.replica_lag_seconds = gauge(
+            'wanderly_replica_lag_seconds',
+            "Seconds of WAL a replica has received but not replayed.",
+            ['replica'], multiprocess_mode='max')
+        self.replica_lag_bytes = gauge(
+            'wanderly_replica_lag_bytes',
+            "Bytes of WAL a replica has yet to replay.",
+            ['replica'], multiprocess_mode='max')
+
+    def _child(self, metric, *labels):
+        # metric.labels() validates and locks on every call; the labelled
+        # children are cached so a request only pays a dict lookup.
+        key = (metric, labels)
+        child = self._children.get(key)
+        if child is None:
+            child = self._children[key] = metric.labels(*labels)
+        return child
+
+    def count_page_redirect(self, endpoint):
+        self._child(self.page_redirects, endpoint).inc()
+
+    def count_flash(self, endpoint, category):
+        self._child(self.flashes, endpoint, category).inc()
+
+    def record_request(self, endpoint, method, status, seconds, trace):
+        self._child(self.requests, endpoint, method, status).inc()
+        self._child(self.request_seconds, endpoint).observe(seconds)
+
+        if trace is not None and trace.queries:
+            per_method = defaultdict(lambda: [0, 0.0])
+            for query in trace.queries:
+                totals = per_method[query['method'] or 'request']
+                totals[0] += 1
+                totals[1] += query['seconds']
+            for name, (count, db_seconds) in per_method.items():
+                self._child(self.db_queries, name).inc(count)
+                self._child(self.db_seconds, name).observe(db_seconds)
+
+    def gauges_due(self):
+        # Reading the pool and cache takes their locks, so the gauges are
+        # refreshed at most once per interval rather than on every request.
+        now = time.monotonic()
+        if now - self._gauges_updated < self.gauge_interval:
+            return False
+        self._gauges_updated = now
+        return True
+
+    def update_gauges(self, pool_stats, cache_stats, replica_lag=()):
+        for state in ('in_use', 'idle', 'waiting'):
+            self._child(self.pool, state).set(pool_stats[state])
+        for event in ('hits', 'misses', 'evictions'):
+            if event in cache_stats:
+                self._child(self.cache, event).set(cache_stats[event])
+        # A replica that could not be reached is left at its last value.
+        for replica in replica_lag:
+            if replica['seconds'] is not None:
+                self._child(self.replica_lag_seconds,
+                            replica['replica']).set(replica['seconds'])
+                self._child(self.replica_lag_bytes,
+                            replica['replica']).set(replica['bytes'])
+
+    def render(self):
+        client = self._client
+        if self.multiprocess:
+            # pylint: disable-next=import-outside-toplevel
+            from prometheus_client import multiprocess
+            registry = client.CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        else:
+            registry = client.REGISTRY
+        return client.generate_latest(registry), client.CONTENT_TYPE_LATEST
+
+
+def get_metrics():
+    global _metrics
+    if _metrics is None:
+        _metrics = Metrics()
+    return _metrics
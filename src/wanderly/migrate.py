@@ -0,0 +1,119 @@
+from pathlib import Path
+import re
+import threading
+
+MIGRATIONS_DIR = Path(__file__).parent / 'migrations'
+MIGRATION_FILE = re.compile(r'^(\d{4})_(\w+)\.sql$')
+
+# Any constant works as long as every deploy uses the same one; it keeps two
+# concurrent `flask db upgrade` runs from applying the same migration twice.
+MIGRATION_LOCK_ID = 7_420_001
+
+_schema_checked = False
+_schema_lock = threading.Lock()
+
+
+class SchemaOutOfDate(RuntimeError):
+    pass
+
+
+class Migration:
+    def __init__(self, version, name, path):
+        self.version = version
+        self.name = name
+        self.path = path
+
+    def sql(self):
+        return self.path.read_text()
+
+
+def available_migrations(directory=MIGRATIONS_DIR):
+    migrations = []
+    for path in Path(directory).iterdir():
+        match = MIGRATION_FILE.match(path.name)
+        if match:
+            version, name = match.groups()
+            migrations.append(Migration(int(version), name, path))
+
+    migrations.sort(key=lambda migration: migration.version)
+    versions = [migration.version for migration in migrations]
+    if len(versions) != len(set(versions)):
+        raise ValueError("Two migrations share the same version number.")
+    return migrations
+
+
+def latest_version(directory=MIGRATIONS_DIR):
+    migrations = available_migrations(directory)
+    return migrations[-1].version if migrations else 0
+
+
+def current_version(conn):
+    with conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT to_regclass('public.schema_migrations')")
+            if cursor.fetchone()[0] is None:
+                return 0
+            cursor.execute('SELECT max(version) FROM schema_migrations')
+            return cursor.fetchone()[0] or 0
+
+
+def upgrade(conn, target=None, directory=MIGRATIONS_DIR):
+    applied = []
+    with conn:
+        with conn.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_lock(%s)', (MIGRATION_LOCK_ID,))
+            cursor.execute("""
+                           CREATE TABLE IF NOT EXISTS schema_migrations(
+                                version integer PRIMARY KEY,
+                                name text NOT NULL,
+                                applied_at timestamptz NOT NULL DEFAULT now()
+                           );
+                           """)
+
+    try:
+        version = current_version(conn)
+        for migration in available_migrations(directory):
+            if migration.version <= version:
+                continue
+            if target is not None and migration.version > target:
+                break
+
+            with conn:
+                with conn.cursor() as cursor:
+                    cursor.execute(migration.sql())
+                    cursor.execute("""
+                                   INSERT INTO schema_migrations (version, name)
+                                   VALUES (%s, %s)
+                                   """, (migration.version, migration.name))
+            applied.append(migration)
+    finally:
+        with conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    'SELECT pg_advisory_unlock(%s)',
+                    (MIGRATION_LOCK_ID,)
+                    )
+    return applied
+
+
+def check_schema(conn, directory=MIGRATIONS_DIR):
+    current = current_version(conn)
+    latest = latest_version(directory)
+    if current < latest:
+        raise SchemaOutOfDate(
+            f"Database schema is at version {current} but the app needs "
+            f"{latest}. Run `flask db upgrade`."
+            )
+    return current
+
+
+def check_schema_once(pool):
+    global _schema_checked
+    if _schema_checked:
+        return
+
+    with _schema_lock:
+        if not _schema_checked:
+            with pool.connection() as conn:
+                check_schema(conn)
+            _schema_checked = True
@@ -1,21 +1,22 @@
-
-CREATE TABLE users(
+-- Tables created by the old per-request bootstrap may already exist, so the
+-- first migration adopts them instead of failing.
+CREATE TABLE IF NOT EXISTS users(
     id SERIAL PRIMARY KEY,
-    full_name varchar(255) NOT NULL, 
+    full_name varchar(255) NOT NULL,
     email varchar(255) UNIQUE NOT NULL,
     password text NOT NULL,
     created_at date NOT NULL DEFAULT now()
 );
 
-CREATE TABLE trips(
+CREATE TABLE IF NOT EXISTS trips(
     id serial PRIMARY KEY,
-    destination text NOT NULL, 
+    destination text NOT NULL,
     depart_date date,
     return_date date,
     user_id integer NOT NULL REFERENCES users(id) ON DELETE CASCADE
 );
 
-CREATE TABLE plans(
+CREATE TABLE IF NOT EXISTS plans(
     id serial PRIMARY KEY,
     at_date date,
     at_time time,
@@ -23,7 +24,5 @@ CREATE TABLE plans(
     cost numeric CHECK (cost >= 0.00),
     note text,
     trip_id integer NOT NULL,
-    FOREIGN KEY (trip_id) REFERENCES trips(id) ON DELETE CASCADE,
+    FOREIGN KEY (trip_id) REFERENCES trips(id) ON DELETE CASCADE
 );
-
-
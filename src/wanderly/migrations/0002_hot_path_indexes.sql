@@ -0,0 +1,12 @@
+-- Composite indexes that match the ORDER BY of the dashboard and itinerary
+-- queries, so both the filter and the sort are served by one index scan.
+CREATE INDEX IF NOT EXISTS trips_user_id_sort_idx
+    ON trips (user_id, depart_date, return_date, id);
+
+CREATE INDEX IF NOT EXISTS plans_trip_id_sort_idx
+    ON plans (trip_id, at_date, at_time, id);
+
+-- Logins match emails case-insensitively; the UNIQUE btree on email cannot
+-- serve that, an expression index on lower(email) can.
+CREATE INDEX IF NOT EXISTS users_email_lower_idx
+    ON users (lower(email));
@@ -0,0 +1,12 @@
+-- The dashboard seeks on (depart_date, return_date, id) with NULL dates
+-- sorted last. Row comparisons do not handle NULLs, so the sort key maps
+-- them to 'infinity', and the index has to match that expression.
+CREATE INDEX IF NOT EXISTS trips_user_id_sort_key_idx
+    ON trips (
+        user_id,
+        COALESCE(depart_date, 'infinity'::date),
+        COALESCE(return_date, 'infinity'::date),
+        id
+    );
+
+DROP INDEX IF EXISTS trips_user_id_sort_idx;
@@ -0,0 +1,10 @@
+-- Version stamps for conditional GETs: a trip's revision moves with every
+-- change to the trip or its plans, and a user's trips_revision with every
+-- change to their list of trips.
+ALTER TABLE trips
+    ADD COLUMN IF NOT EXISTS revision bigint NOT NULL DEFAULT 1,
+    ADD COLUMN IF NOT EXISTS updated_at timestamptz NOT NULL DEFAULT now();
+
+ALTER TABLE users
+    ADD COLUMN IF NOT EXISTS trips_revision bigint NOT NULL DEFAULT 1,
+    ADD COLUMN IF NOT EXISTS trips_updated_at timestamptz NOT NULL DEFAULT now();
@@ -0,0 +1,149 @@
+-- Per-day and per-trip totals, kept current by statement-level triggers on
+-- plans. A change recounts only the (trip, day) pairs it touched, so a
+-- bulk insert refreshes each affected day once rather than once per row.
+CREATE TABLE IF NOT EXISTS plan_day_totals(
+    trip_id integer NOT NULL REFERENCES trips(id) ON DELETE CASCADE,
+    at_date date,
+    activity_count integer NOT NULL,
+    total_cost numeric NOT NULL,
+    first_time time,
+    last_time time
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS plan_day_totals_trip_day_idx
+    ON plan_day_totals (trip_id, COALESCE(at_date, 'infinity'::date));
+
+CREATE TABLE IF NOT EXISTS trip_totals(
+    trip_id integer PRIMARY KEY REFERENCES trips(id) ON DELETE CASCADE,
+    activity_count integer NOT NULL,
+    total_cost numeric NOT NULL,
+    first_activity_at timestamp,
+    last_activity_at timestamp
+);
+
+CREATE OR REPLACE FUNCTION refresh_plan_totals(
+    changed_trip_ids integer[],
+    changed_days date[]
+) RETURNS void LANGUAGE plpgsql AS $$
+BEGIN
+    -- Writers to the same trip take turns, so each recount sees the rows
+    -- the previous one committed.
+    PERFORM 1 FROM trips
+    WHERE id = ANY(changed_trip_ids)
+    ORDER BY id
+    FOR NO KEY UPDATE;
+
+    DELETE FROM plan_day_totals AS totals
+    USING unnest(changed_trip_ids, changed_days) AS changed(trip_id, at_date)
+    WHERE totals.trip_id = changed.trip_id
+      AND totals.at_date IS NOT DISTINCT FROM changed.at_date;
+
+    -- Joining trips skips trips that are being deleted (ON DELETE CASCADE
+    -- removes their plans after the trip row is already gone).
+    INSERT INTO plan_day_totals
+        (trip_id, at_date, activity_count, total_cost, first_time, last_time)
+    SELECT plans.trip_id,
+           plans.at_date,
+           COUNT(*),
+           COALESCE(SUM(plans.cost), 0),
+           MIN(plans.at_time),
+           MAX(plans.at_time)
+    FROM (
+        SELECT DISTINCT trip_id, at_date
+        FROM unnest(changed_trip_ids, changed_days) AS changed(trip_id, at_date)
+    ) AS changed
+    JOIN plans
+        ON plans.trip_id = changed.trip_id
+       AND plans.at_date IS NOT DISTINCT FROM changed.at_date
+    JOIN trips ON trips.id = plans.trip_id
+    GROUP BY plans.trip_id, plans.at_date;
+
+    DELETE FROM trip_totals WHERE trip_id = ANY(changed_trip_ids);
+
+    INSERT INTO trip_totals
+        (trip_id, activity_count, total_cost,
+         first_activity_at, last_activity_at)
+    SELECT trip_id,
+           SUM(activity_count),
+           SUM(total_cost),
+           MIN(at_date + COALESCE(first_time, time '00:00')),
+           MAX(at_date + COALESCE(last_time, time '00:00'))
+    FROM plan_day_totals
+    WHERE trip_id = ANY(changed_trip_ids)
+    GROUP BY trip_id;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION plans_totals_after_insert()
+RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM refresh_plan_totals(array_agg(trip_id), array_agg(at_date))
+    FROM (SELECT DISTINCT trip_id, at_date FROM new_plans) AS changed;
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION plans_totals_after_update()
+RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM refresh_plan_totals(array_agg(trip_id), array_agg(at_date))
+    FROM (
+        SELECT trip_id, at_date FROM old_plans
+        UNION
+        SELECT trip_id, at_date FROM new_plans
+    ) AS changed;
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION plans_totals_after_delete()
+RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM refresh_plan_totals(array_agg(trip_id), array_agg(at_date))
+    FROM (SELECT DISTINCT trip_id, at_date FROM old_plans) AS changed;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS plans_totals_insert ON plans;
+CREATE TRIGGER plans_totals_insert
+    AFTER INSERT ON plans
+    REFERENCING NEW TABLE AS new_plans
+    FOR EACH STATEMENT EXECUTE FUNCTION plans_totals_after_insert();
+
+DROP TRIGGER IF EXISTS plans_totals_update ON plans;
+CREATE TRIGGER plans_totals_update
+    AFTER UPDATE ON plans
+    REFERENCING OLD TABLE AS old_plans NEW TABLE AS new_plans
+    FOR EACH STATEMENT EXECUTE FUNCTION plans_totals_after_update();
+
+DROP TRIGGER IF EXISTS plans_totals_delete ON plans;
+CREATE TRIGGER plans_totals_delete
+    AFTER DELETE ON plans
+    REFERENCING OLD TABLE AS old_plans
+    FOR EACH STATEMENT EXECUTE FUNCTION plans_totals_after_delete();
+
+-- Recomputes both tables from plans; used to backfill here and by
+-- `flask totals rebuild` when the checker finds drift.
+CREATE OR REPLACE FUNCTION rebuild_plan_totals()
+RETURNS void LANGUAGE sql AS $$
+    TRUNCATE plan_day_totals, trip_totals;
+
+    INSERT INTO plan_day_totals
+        (trip_id, at_date, activity_count, total_cost, first_time, last_time)
+    SELECT trip_id, at_date, COUNT(*), COALESCE(SUM(cost), 0),
+           MIN(at_time), MAX(at_time)
+    FROM plans
+    GROUP BY trip_id, at_date;
+
+    INSERT INTO trip_totals
+        (trip_id, activity_count, total_cost,
+         first_activity_at, last_activity_at)
+    SELECT trip_id, SUM(activity_count), SUM(total_cost),
+           MIN(at_date + COALESCE(first_time, time '00:00')),
+           MAX(at_date + COALESCE(last_time, time '00:00'))
+    FROM plan_day_totals
+    GROUP BY trip_id;
+$$;
+
+SELECT rebuild_plan_totals();
@@ -0,0 +1,4 @@
+-- Every change to a plan bumps its revision, so a rendered activity row
+-- can be cached under (id, revision) and reused until the plan changes.
+ALTER TABLE plans
+    ADD COLUMN IF NOT EXISTS revision bigint NOT NULL DEFAULT 1;
@@ -0,0 +1,9 @@
+-- Server-side sessions for SESSION_BACKEND=postgres. The cookie carries
+-- only a signed session id; the app deletes expired rows as it goes.
+CREATE TABLE IF NOT EXISTS sessions (
+    id text PRIMARY KEY,
+    data text NOT NULL,
+    expires_at timestamptz NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS sessions_expires_at_idx ON sessions (expires_at);
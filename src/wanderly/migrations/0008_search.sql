@@ -0,0 +1,144 @@
+-- Full-text search over trips and plans. Every trip and every plan has one
+-- row here, kept current by statement-level triggers like the totals
+-- tables, which keeps the vectors out of every page query that selects
+-- trips or plans.
+--
+-- Searches are scoped by owner through the user_id index. The vectors get
+-- a GIN index in 0013.
+CREATE TABLE IF NOT EXISTS search_documents(
+    id bigserial PRIMARY KEY,
+    user_id integer NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    trip_id integer NOT NULL REFERENCES trips(id) ON DELETE CASCADE,
+    plan_id integer UNIQUE REFERENCES plans(id) ON DELETE CASCADE,
+    document tsvector NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS search_documents_user_idx
+    ON search_documents (user_id);
+
+CREATE INDEX IF NOT EXISTS search_documents_trip_idx
+    ON search_documents (trip_id);
+
+-- A plan also matches on its trip's destination, weighted lowest, so
+-- "lisbon tram" finds the tram plan on the Lisbon trip.
+CREATE OR REPLACE FUNCTION trip_search_document(destination text)
+RETURNS tsvector LANGUAGE sql IMMUTABLE AS $$
+    SELECT setweight(to_tsvector('english', destination), 'A');
+$$;
+
+CREATE OR REPLACE FUNCTION plan_search_document(
+    destination text,
+    activity text,
+    note text
+) RETURNS tsvector LANGUAGE sql IMMUTABLE AS $$
+    SELECT setweight(to_tsvector('english', activity), 'A')
+        || setweight(to_tsvector('english', COALESCE(note, '')), 'B')
+        || setweight(to_tsvector('english', destination), 'C');
+$$;
+
+CREATE OR REPLACE FUNCTION trips_search_after_insert()
+RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO search_documents (user_id, trip_id, document)
+    SELECT user_id, id, trip_search_document(destination)
+    FROM new_trips;
+    RETURN NULL;
+END;
+$$;
+
+-- Every plan change bumps its trip's revision, so only
+-- renamed trips are reindexed.
+CREATE OR REPLACE FUNCTION trips_search_after_update()
+RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE search_documents
+    SET document = trip_search_document(new_trips.destination)
+    FROM new_trips
+    JOIN old_trips ON old_trips.id = new_trips.id
+    WHERE search_documents.trip_id = new_trips.id
+      AND search_documents.plan_id IS NULL
+      AND new_trips.destination IS DISTINCT FROM old_trips.destination;
+
+    UPDATE search_documents
+    SET document = plan_search_document(
+        new_trips.destination, plans.activity, plans.note)
+    FROM new_trips
+    JOIN old_trips ON old_trips.id = new_trips.id
+    JOIN plans ON plans.trip_id = new_trips.id
+    WHERE search_documents.plan_id = plans.id
+      AND new_trips.destination IS DISTINCT FROM old_trips.destination;
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION plans_search_after_insert()
+RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO search_documents (user_id, trip_id, plan_id, document)
+    SELECT trips.user_id, trips.id, new_plans.id,
+           plan_search_document(
+               trips.destination, new_plans.activity, new_plans.note)
+    FROM new_plans
+    JOIN trips ON trips.id = new_plans.trip_id;
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION plans_search_after_update()
+RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE search_documents
+    SET document = plan_search_document(
+        trips.destination, new_plans.activity, new_plans.note)
+    FROM new_plans
+    JOIN old_plans ON old_plans.id = new_plans.id
+    JOIN trips ON trips.id = new_plans.trip_id
+    WHERE search_documents.plan_id = new_plans.id
+      AND (new_plans.activity, new_plans.note)
+          IS DISTINCT FROM (old_plans.activity, old_plans.note);
+    RETURN NULL;
+END;
+$$;
+
+-- Deletes need no trigger: the foreign keys cascade.
+DROP TRIGGER IF EXISTS trips_search_insert ON trips;
+CREATE TRIGGER trips_search_insert
+    AFTER INSERT ON trips
+    REFERENCING NEW TABLE AS new_trips
+    FOR EACH STATEMENT EXECUTE FUNCTION trips_search_after_insert();
+
+DROP TRIGGER IF EXISTS trips_search_update ON trips;
+CREATE TRIGGER trips_search_update
+    AFTER UPDATE ON trips
+    REFERENCING OLD TABLE AS old_trips NEW TABLE AS new_trips
+    FOR EACH STATEMENT EXECUTE FUNCTION trips_search_after_update();
+
+DROP TRIGGER IF EXISTS plans_search_insert ON plans;
+CREATE TRIGGER plans_search_insert
+    AFTER INSERT ON plans
+    REFERENCING NEW TABLE AS new_plans
+    FOR EACH STATEMENT EXECUTE FUNCTION plans_search_after_insert();
+
+DROP TRIGGER IF EXISTS plans_search_update ON plans;
+CREATE TRIGGER plans_search_update
+    AFTER UPDATE ON plans
+    REFERENCING OLD TABLE AS old_plans NEW TABLE AS new_plans
+    FOR EACH STATEMENT EXECUTE FUNCTION plans_search_after_update();
+
+INSERT INTO search_documents (user_id, trip_id, document)
+SELECT user_id, id, trip_search_document(destination)
+FROM trips
+WHERE NOT EXISTS (
+    SELECT 1 FROM search_documents
+    WHERE search_documents.trip_id = trips.id
+      AND search_documents.plan_id IS NULL
+);
+
+INSERT INTO search_documents (user_id, trip_id, plan_id, document)
+SELECT trips.user_id, trips.id, plans.id,
+       plan_search_document(trips.destination, plans.activity, plans.note)
+FROM plans
+JOIN trips ON trips.id = plans.trip_id
+ON CONFLICT (plan_id) DO NOTHING;
+
+ANALYZE search_documents;
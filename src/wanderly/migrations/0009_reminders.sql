@@ -0,0 +1,27 @@
+-- Reminders for upcoming activities, sent by `flask reminders run`. The
+-- worker finds plans coming up in the next hour or so through this index
+-- instead of scanning every plan.
+CREATE INDEX IF NOT EXISTS plans_at_date_at_time_idx
+    ON plans (at_date, at_time)
+    WHERE at_date IS NOT NULL;
+
+-- One row per reminder, keyed by the plan and the time it was due at. A
+-- plan moved to another time gets a new reminder; the same due time is
+-- never queued twice. status goes pending -> sending -> sent, or to
+-- failed after too many attempts, or to cancelled/expired when the plan
+-- moved or started before the reminder went out.
+CREATE TABLE IF NOT EXISTS reminder_deliveries(
+    plan_id integer NOT NULL REFERENCES plans(id) ON DELETE CASCADE,
+    due_at timestamp NOT NULL,
+    status text NOT NULL DEFAULT 'pending',
+    attempts integer NOT NULL DEFAULT 0,
+    last_error text,
+    queued_at timestamptz NOT NULL DEFAULT now(),
+    claimed_at timestamptz,
+    sent_at timestamptz,
+    PRIMARY KEY (plan_id, due_at)
+);
+
+CREATE INDEX IF NOT EXISTS reminder_deliveries_pending_idx
+    ON reminder_deliveries (due_at)
+    WHERE status = 'pending';
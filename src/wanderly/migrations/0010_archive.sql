@@ -0,0 +1,36 @@
+-- Trips that ended a while ago, with their plans, are moved here by
+-- `flask archive run`, so the trips list and itineraries only read the
+-- trips that are still coming up or recently over. Archived trips are
+-- read-only: they keep their ids and the totals they had when they moved,
+-- and leave the search index, totals and reminders behind.
+CREATE TABLE IF NOT EXISTS trips_archive(
+    id integer PRIMARY KEY,
+    destination text NOT NULL,
+    depart_date date,
+    return_date date NOT NULL,
+    user_id integer NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    activity_count integer NOT NULL,
+    total_cost numeric NOT NULL,
+    updated_at timestamptz NOT NULL,
+    archived_at timestamptz NOT NULL DEFAULT now()
+);
+
+-- The past trips page, read backwards for the most recent first.
+CREATE INDEX IF NOT EXISTS trips_archive_user_return_idx
+    ON trips_archive (user_id, return_date, id);
+
+CREATE TABLE IF NOT EXISTS plans_archive(
+    id integer PRIMARY KEY,
+    trip_id integer NOT NULL REFERENCES trips_archive(id) ON DELETE CASCADE,
+    at_date date,
+    at_time time,
+    activity text NOT NULL,
+    cost numeric,
+    note text
+);
+
+CREATE INDEX IF NOT EXISTS plans_archive_trip_idx
+    ON plans_archive (trip_id, at_date, at_time, id);
+
+-- Lets the job find trips to move without reading the whole table.
+CREATE INDEX IF NOT EXISTS trips_return_date_idx ON trips (return_date);
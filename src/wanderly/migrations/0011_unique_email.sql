@@ -0,0 +1,8 @@
+-- Two sign-ups whose emails differ only in case could both pass the
+-- existence check in create_new_user; a unique index on lower(email) lets
+-- the database turn the second one away. Accounts that already share an
+-- email this way have to be merged before this migration can run.
+CREATE UNIQUE INDEX IF NOT EXISTS users_email_lower_key
+    ON users (lower(email));
+
+DROP INDEX IF EXISTS users_email_lower_idx;
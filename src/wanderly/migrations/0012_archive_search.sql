@@ -0,0 +1,41 @@
+-- Archived trips stay searchable. archive_trips moves a trip's search
+-- documents here, ids and all, before deleting the trip cascades to the
+-- originals, so search reads both tables and pages over one id sequence.
+CREATE TABLE IF NOT EXISTS search_documents_archive(
+    id bigint PRIMARY KEY,
+    user_id integer NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    trip_id integer NOT NULL
+        REFERENCES trips_archive(id) ON DELETE CASCADE,
+    plan_id integer UNIQUE REFERENCES plans_archive(id) ON DELETE CASCADE,
+    document tsvector NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS search_documents_archive_user_idx
+    ON search_documents_archive (user_id);
+
+CREATE INDEX IF NOT EXISTS search_documents_archive_trip_idx
+    ON search_documents_archive (trip_id);
+
+-- Trips archived before this migration lost their documents; index them
+-- again.
+INSERT INTO search_documents_archive (id, user_id, trip_id, document)
+SELECT nextval('search_documents_id_seq'), user_id, id,
+       trip_search_document(destination)
+FROM trips_archive
+WHERE NOT EXISTS (
+    SELECT 1 FROM search_documents_archive
+    WHERE search_documents_archive.trip_id = trips_archive.id
+      AND search_documents_archive.plan_id IS NULL
+);
+
+INSERT INTO search_documents_archive (id, user_id, trip_id, plan_id,
+                                      document)
+SELECT nextval('search_documents_id_seq'), trips_archive.user_id,
+       trips_archive.id, plans_archive.id,
+       plan_search_document(trips_archive.destination,
+                            plans_archive.activity, plans_archive.note)
+FROM plans_archive
+JOIN trips_archive ON trips_archive.id = plans_archive.trip_id
+ON CONFLICT (plan_id) DO NOTHING;
+
+ANALYZE search_documents_archive;
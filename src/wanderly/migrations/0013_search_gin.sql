@@ -0,0 +1,11 @@
+-- GIN indexes on the search vectors. Searches keep their user_id filter:
+-- the planner reads a rare term's posting list and combines it with the
+-- user_id index, and for a term every user has (a common word's list
+-- spans the whole table) it still scans just that user's documents.
+CREATE INDEX IF NOT EXISTS search_documents_document_idx
+    ON search_documents USING gin (document);
+
+CREATE INDEX IF NOT EXISTS search_documents_archive_document_idx
+    ON search_documents_archive USING gin (document);
+
+ANALYZE search_documents, search_documents_archive;
@@ -0,0 +1,170 @@
+from concurrent.futures import (
+    ThreadPoolExecutor,
+    TimeoutError as FutureTimeout,
+    )
+import logging
+import os
+import threading
+import time
+
+import bcrypt
+
+from .tracing import timed
+
+logger = logging.getLogger(__name__)
+
+MIN_ROUNDS = 10
+MAX_ROUNDS = 16
+
+_hasher = None
+_hasher_lock = threading.Lock()
+
+
+class HasherBusy(Exception):
+    pass
+
+
+def calibrate_rounds(target_ms, minimum=MIN_ROUNDS, maximum=MAX_ROUNDS):
+    # Each extra round doubles the work, so one timed hash at the minimum
+    # cost is enough to pick the largest cost that stays under the target.
+    started = time.perf_counter()
+    bcrypt.hashpw(b'calibration', bcrypt.gensalt(rounds=minimum))
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    rounds = minimum
+    while rounds < maximum and elapsed_ms * 2 <= target_ms:
+        rounds += 1
+        elapsed_ms *= 2
+    return rounds
+
+
+def hash_rounds(hashed):
+    try:
+        return int(hashed.split('$')[2])
+    except (IndexError, ValueError):
+        return None
+
+
+class PasswordHasher:
+
+    def __init__(self, rounds, max_workers=2, max_queue=16, timeout=5):
+        self.rounds = rounds
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.pid = os.getpid()
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix='bcrypt',
+            )
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self._lock = threading.Lock()
+        self._stats = {
+            'queued': 0,
+            'running': 0,
+            'completed': 0,
+            'rejected': 0,
+            'timeouts': 0,
+            'queue_seconds': 0.0,
+            'hash_seconds': 0.0,
+        }
+
+    def hash(self, password):
+        salt = bcrypt.gensalt(rounds=self.rounds)
+        hashed = self._run(bcrypt.hashpw, password.encode('utf-8'), salt)
+        return hashed.decode('utf-8')
+
+    def check(self, password, hashed):
+        return self._run(
+            bcrypt.checkpw,
+            password.encode('utf-8'),
+            hashed.encode('utf-8')
+            )
+
+    def needs_rehash(self, hashed):
+        # Only ever upgrade: a process running at a lower cost must not
+        # weaken hashes another one stored.
+        rounds = hash_rounds(hashed)
+        return rounds is None or rounds < self.rounds
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update(
+            rounds=self.rounds,
+            max_workers=self.max_workers,
+            max_queue=self.max_queue,
+            )
+        return stats
+
+    def _run(self, func, *args):
+        # Hashing holds a CPU for hundreds of milliseconds. Capping the
+        # workers keeps a burst of logins from starving other requests, and
+        # capping the queue turns overload into a fast HasherBusy.
+        if not self._slots.acquire(blocking=False):
+            self._count('rejected')
+            raise HasherBusy("Too many password checks in progress.")
+
+        submitted = time.perf_counter()
+        with self._lock:
+            self._stats['queued'] += 1
+
+        def job():
+            started = time.perf_counter()
+            with self._lock:
+                self._stats['queued'] -= 1
+                self._stats['running'] += 1
+                self._stats['queue_seconds'] += started - submitted
+            try:
+                return func(*args)
+            finally:
+                with self._lock:
+                    self._stats['running'] -= 1
+                    self._stats['completed'] += 1
+                    self._stats['hash_seconds'] += (
+                        time.perf_counter() - started)
+
+        future = self._executor.submit(job)
+        future.add_done_callback(lambda _future: self._slots.release())
+        try:
+            with timed('bcrypt'):
+                return future.result(self.timeout)
+        except FutureTimeout as error:
+            self._count('timeouts')
+            raise HasherBusy("Password check timed out.") from error
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+
+def configured_rounds():
+    if os.environ.get('BCRYPT_ROUNDS'):
+        return int(os.environ['BCRYPT_ROUNDS'])
+
+    # Calibrated on this host at startup. Hosts may settle on different
+    # costs; needs_rehash only ever raises a stored hash's cost, so a
+    # slower host never weakens what a faster one stored.
+    target_ms = float(os.environ.get('BCRYPT_TARGET_MS', 250))
+    rounds = calibrate_rounds(target_ms)
+    logger.info("Calibrated bcrypt to %s rounds for a %sms target; set "
+                "BCRYPT_ROUNDS to override it.", rounds, target_ms)
+    return rounds
+
+
+def get_hasher():
+    # Like the connection pool, the executor's threads do not survive a
+    # fork, so each worker process builds its own with the same cost.
+    global _hasher
+    if _hasher is None or _hasher.pid != os.getpid():
+        with _hasher_lock:
+            if _hasher is None or _hasher.pid != os.getpid():
+                rounds = _hasher.rounds if _hasher else configured_rounds()
+                _hasher = PasswordHasher(
+                    rounds,
+                    max_workers=int(os.environ.get('BCRYPT_WORKERS', 2)),
+                    max_queue=int(os.environ.get('BCRYPT_QUEUE', 16)),
+                    timeout=float(os.environ.get('BCRYPT_TIMEOUT', 5)),
+                    )
+    return _hasher
@@ -0,0 +1,248 @@
+from collections import deque
+from contextlib import contextmanager
+import os
+import threading
+import time
+
+import psycopg2
+from psycopg2 import extensions
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class _ConnectionInfo:
+    def __init__(self):
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.uses = 0
+        self.state = {}
+
+
+class ConnectionPool:
+
+    def __init__(
+            self,
+            dsn,
+            min_size=1,
+            max_size=10,
+            max_uses=1000,
+            idle_timeout=300,
+            checkout_timeout=10,
+            health_check_interval=30,
+            **connect_kwargs
+            ):
+        if min_size > max_size:
+            raise ValueError("min_size must not be greater than max_size.")
+
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_uses = max_uses
+        self.idle_timeout = idle_timeout
+        self.checkout_timeout = checkout_timeout
+        self.health_check_interval = health_check_interval
+        self.pid = os.getpid()
+        self._connect_kwargs = connect_kwargs
+
+        self._cond = threading.Condition()
+        self._idle = deque()
+        self._info = {}
+        self._size = 0
+        self._waiting = 0
+        self._closed = False
+        self._counters = {
+            'checkouts': 0,
+            'timeouts': 0,
+            'created': 0,
+            'recycled': 0,
+            'expired': 0,
+            'unhealthy': 0,
+            'wait_seconds': 0.0,
+        }
+
+    # -------- CHECKOUT / RETURN --------
+    def getconn(self, timeout=None):
+        timeout = self.checkout_timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+
+        while True:
+            conn, create = self._reserve(deadline)
+            if create:
+                conn = self._create()
+            else:
+                problem = self._check(conn)
+                if problem:
+                    self._discard(conn, problem)
+                    continue
+
+            with self._cond:
+                self._counters['checkouts'] += 1
+                self._counters['wait_seconds'] += time.monotonic() - started
+            return conn
+
+    def putconn(self, conn, discard=False):
+        info = self._info.get(id(conn))
+        if info is None:
+            conn.close()
+            return
+
+        info.uses += 1
+        info.last_used = time.monotonic()
+
+        if not discard and not conn.closed:
+            status = conn.get_transaction_status()
+            if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                discard = True
+            elif status != extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    discard = True
+
+        if discard or conn.closed or self._closed:
+            self._discard(conn, 'unhealthy')
+        elif info.uses >= self.max_uses:
+            self._discard(conn, 'recycled')
+        else:
+            with self._cond:
+                self._idle.append(conn)
+                self._cond.notify()
+            self._prune()
+
+    def state(self, conn):
+        # Per-connection scratch space for callers, such as the statements
+        # prepared on it. It goes away with the connection.
+        info = self._info.get(id(conn))
+        return info.state if info is not None else {}
+
+    @contextmanager
+    def connection(self, timeout=None):
+        conn = self.getconn(timeout)
+        try:
+            yield conn
+        except BaseException:
+            self.putconn(conn, discard=conn.closed)
+            raise
+        self.putconn(conn)
+
+    # -------- LIFECYCLE --------
+    def open(self):
+        conns = []
+        try:
+            while len(conns) < self.min_size:
+                conns.append(self.getconn())
+        finally:
+            for conn in conns:
+                self.putconn(conn)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._cond.notify_all()
+        for conn in idle:
+            self._discard(conn, None)
+
+    def stats(self):
+        with self._cond:
+            idle = len(self._idle)
+            stats = {
+                'size': self._size,
+                'idle': idle,
+                'in_use': self._size - idle,
+                'waiting': self._waiting,
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+            }
+            stats.update(self._counters)
+        return stats
+
+    # -------- INTERNALS --------
+    def _reserve(self, deadline):
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise PoolTimeout("Connection pool is closed.")
+                if self._idle:
+                    return self._idle.pop(), False
+                if self._size < self.max_size:
+                    self._size += 1
+                    return None, True
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._counters['timeouts'] += 1
+                    raise PoolTimeout(
+                        f"No connection available after "
+                        f"{self.checkout_timeout}s "
+                        f"(max_size={self.max_size})."
+                        )
+                self._waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+
+    def _create(self):
+        try:
+            conn = psycopg2.connect(self.dsn, **self._connect_kwargs)
+        except BaseException:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+        with self._cond:
+            self._info[id(conn)] = _ConnectionInfo()
+            self._counters['created'] += 1
+        return conn
+
+    def _check(self, conn):
+        if conn.closed:
+            return 'unhealthy'
+
+        info = self._info[id(conn)]
+        idle_for = time.monotonic() - info.last_used
+        if self.idle_timeout and idle_for > self.idle_timeout:
+            return 'expired'
+        if idle_for < self.health_check_interval:
+            return None
+
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            conn.rollback()
+        except psycopg2.Error:
+            return 'unhealthy'
+        return None
+
+    def _discard(self, conn, reason):
+        with self._cond:
+            self._info.pop(id(conn), None)
+            self._size -= 1
+            if reason:
+                self._counters[reason] += 1
+            self._cond.notify()
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def _prune(self):
+        if not self.idle_timeout:
+            return
+
+        now = time.monotonic()
+        expired = []
+        with self._cond:
+            while self._idle and self._size - len(expired) > self.min_size:
+                oldest = self._idle[0]
+                if now - self._info[id(oldest)].last_used <= self.idle_timeout:
+                    break
+                expired.append(self._idle.popleft())
+        for conn in expired:
+            self._discard(conn, 'expired')
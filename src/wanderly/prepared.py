@@ -0,0 +1,61 @@
+import re
+
+import psycopg2
+from psycopg2 import errorcodes
+
+_PARAMETER = re.compile(r'%\((\w+)\)s')
+
+# The server no longer has the statement (or has another one under its
+# name), or a schema change altered the columns it returns.
+_STALE = {
+    errorcodes.INVALID_SQL_STATEMENT_NAME,
+    errorcodes.DUPLICATE_PREPARED_STATEMENT,
+    errorcodes.FEATURE_NOT_SUPPORTED,
+}
+
+statements = {}
+
+
+class PreparedStatement:
+    # A query written with psycopg2's %(name)s parameters, rewritten to
+    # $1, $2, ... for PREPARE and paired with the matching EXECUTE.
+
+    def __init__(self, name, query):
+        self.name = name
+        self.query = query
+        self.parameters = []
+
+        def number(match):
+            if match.group(1) not in self.parameters:
+                self.parameters.append(match.group(1))
+            return f'${self.parameters.index(match.group(1)) + 1}'
+
+        self.sql = _PARAMETER.sub(number, query)
+        arguments = ', '.join(f'%({name})s' for name in self.parameters)
+        self.execute_sql = f'EXECUTE {name} ({arguments})'
+
+
+def prepared_statement(name, query):
+    statement = statements[name] = PreparedStatement(name, query)
+    return statement
+
+
+def execute_prepared(cursor, statement, values, prepared):
+    # `prepared` holds the names already prepared on the cursor's
+    # connection. The EXECUTE has to be the first statement of its
+    # transaction: if the server's copy turns out to be stale, the
+    # transaction is rolled back and everything is prepared afresh.
+    for retry in (False, True):
+        try:
+            if statement.name not in prepared:
+                cursor.execute(
+                    f'PREPARE {statement.name} AS {statement.sql}')
+                prepared.add(statement.name)
+            cursor.execute(statement.execute_sql, values)
+            return
+        except psycopg2.Error as exc:
+            if retry or exc.pgcode not in _STALE:
+                raise
+            cursor.connection.rollback()
+            cursor.execute('DEALLOCATE ALL')
+            prepared.clear()
@@ -0,0 +1,158 @@
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from email.utils import formataddr, formatdate
+import os
+import smtplib
+import tempfile
+from urllib.parse import unquote, urlsplit
+
+from .filters import formatted_date, formatted_time
+
+DEFAULT_OUTBOX = os.path.join(tempfile.gettempdir(), 'wanderly-outbox')
+
+
+class FileTransport:
+    # Writes each message to its own .eml file instead of sending it; for
+    # development and tests.
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def send(self, message):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory,
+                            f"{message['X-Wanderly-Reminder']}.eml")
+        # Write then rename, so a reader never sees half a message.
+        with open(path + '.tmp', 'wb') as file:
+            file.write(message.as_bytes())
+        os.replace(path + '.tmp', path)
+
+    def close(self):
+        pass
+
+
+class SmtpTransport:
+    # One connection is reused for a whole batch and closed after it.
+
+    def __init__(self, host, port, username=None, password=None,
+                 starttls=False, timeout=10):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+        self._smtp = None
+
+    def send(self, message):
+        if self._smtp is None:
+            smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.starttls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password or '')
+            self._smtp = smtp
+        try:
+            self._smtp.send_message(message)
+        except smtplib.SMTPServerDisconnected:
+            self._smtp = None
+            raise
+
+    def close(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except smtplib.SMTPException:
+                pass
+            self._smtp = None
+
+
+def create_transport():
+    url = os.environ.get('REMINDER_TRANSPORT', 'file://' + DEFAULT_OUTBOX)
+    parts = urlsplit(url)
+
+    if parts.scheme == 'file':
+        return FileTransport(unquote(parts.path))
+    if parts.scheme in ('smtp', 'smtp+starttls'):
+        starttls = parts.scheme == 'smtp+starttls'
+        return SmtpTransport(
+            parts.hostname or 'localhost',
+            parts.port or (587 if starttls else 25),
+            username=unquote(parts.username) if parts.username else None,
+            password=unquote(parts.password) if parts.password else None,
+            starttls=starttls,
+            )
+    raise RuntimeError(
+        "REMINDER_TRANSPORT must be a file:// or smtp:// URL, "
+        f"not {url!r}."
+        )
+
+
+def reminder_message(reminder, sender):
+    key = f"{reminder['plan_id']}-{reminder['due_at']:%Y%m%d%H%M}"
+    when = formatted_time(reminder['at_time']) or 'No set time'
+
+    message = EmailMessage()
+    message['Subject'] = f"Coming up: {reminder['activity']}"
+    message['From'] = sender
+    message['To'] = formataddr((reminder['full_name'], reminder['email']))
+    message['Date'] = formatdate(localtime=True)
+    # The same reminder always has the same id, so mail servers can drop
+    # a copy that slips through.
+    message['Message-ID'] = f"<reminder-{key}@wanderly>"
+    message['X-Wanderly-Reminder'] = key
+
+    lines = [
+        reminder['activity'],
+        f"{when}, {formatted_date(reminder['at_date'])}",
+        f"Trip: {reminder['destination']}",
+    ]
+    if reminder['note']:
+        lines.extend(('', reminder['note']))
+    message.set_content('\n'.join(lines) + '\n')
+    return message
+
+
+def send_due_reminders(storage, transport, sender, now=None,
+                       lead=timedelta(minutes=60), batch_size=50,
+                       max_attempts=5, retry_delay=timedelta(minutes=5)):
+    # Queues every plan due within the lead time, then claims and sends
+    # them a batch at a time. Each reminder is marked sent as soon as it
+    # goes out; one whose worker dies mid-send stays 'sending' and is never
+    # sent again.
+    now = now or datetime.now()
+    counts = dict.fromkeys(
+        ('queued', 'sent', 'retrying', 'failed', 'cancelled', 'expired'), 0)
+    counts['queued'] = storage.queue_reminders(now, now + lead)
+
+    try:
+        while True:
+            batch = storage.claim_reminders(now + lead, batch_size,
+                                            retry_delay)
+            for reminder in batch:
+                status, error = deliver(transport, reminder, sender, now,
+                                        max_attempts)
+                storage.finish_reminder(reminder['plan_id'],
+                                        reminder['due_at'], status, error)
+                counts['retrying' if status == 'pending' else status] += 1
+            if len(batch) < batch_size:
+                break
+    finally:
+        transport.close()
+    return counts
+
+
+def deliver(transport, reminder, sender, now, max_attempts):
+    # The plan moved or started since it was queued.
+    if reminder['current_due_at'] != reminder['due_at']:
+        return 'cancelled', None
+    if reminder['due_at'] <= now:
+        return 'expired', None
+
+    try:
+        transport.send(reminder_message(reminder, sender))
+    except OSError as error:
+        if reminder['attempts'] >= max_attempts:
+            return 'failed', str(error) or type(error).__name__
+        return 'pending', str(error) or type(error).__name__
+    return 'sent', None
@@ -0,0 +1,179 @@
+import csv
+from datetime import date, time, timedelta
+import io
+import random
+
+# Synthetic data for load testing. Everything is drawn from one seeded
+# random.Random, so the same seed and user count give the same rows.
+DESTINATIONS = (
+    'Reykjavik', 'Tokyo', 'Kyoto', 'Lisbon', 'Porto', 'Mexico City',
+    'Oaxaca', 'Cape Town', 'Marrakesh', 'Istanbul', 'Hanoi', 'Bangkok',
+    'Seoul', 'Vancouver', 'New York', 'Buenos Aires', 'Lima', 'Cusco',
+    'Rome', 'Florence', 'Paris', 'Berlin', 'Prague', 'Vienna', 'Oslo',
+    'Sydney', 'Auckland', 'Nairobi', 'Dubai', 'Singapore',
+)
+
+ACTIVITIES = (
+    'Breakfast', 'Lunch', 'Dinner', 'Coffee', 'Museum visit',
+    'Walking tour', 'Hike', 'Train', 'Flight', 'Check in', 'Check out',
+    'Market', 'Boat trip', 'Cooking class', 'Concert', 'Day trip',
+    'Shopping', 'Beach', 'Bike rental', 'Temple visit', 'Gallery',
+)
+
+NOTES = (
+    'Book ahead', 'Bring cash', 'Meet at the lobby', 'Tickets emailed',
+    'Dress code', 'Confirm the night before', 'Near the station',
+    'Reservation under my name', 'Free on the first Sunday',
+)
+
+FIRST_DAY = date(2019, 1, 1)
+DATE_SPAN_DAYS = 9 * 365
+
+
+class SyntheticData:
+
+    def __init__(self, seed, first_user_id, first_trip_id, first_plan_id):
+        self.rng = random.Random(seed)
+        self.next_user_id = first_user_id
+        self.next_trip_id = first_trip_id
+        self.next_plan_id = first_plan_id
+
+    def _skewed(self, alpha, cap):
+        # Pareto counts: most users have a few trips (and most trips a few
+        # plans), while a long tail has hundreds.
+        return min(int(self.rng.paretovariate(alpha)) - 1, cap)
+
+    def user(self, password):
+        user_id = self.next_user_id
+        self.next_user_id += 1
+        return (user_id, f'Traveler {user_id}',
+                f'traveler{user_id}@seed.wanderly.test', password)
+
+    def trips(self, user_id):
+        rng = self.rng
+        for _ in range(self._skewed(1.3, 300)):
+            trip_id = self.next_trip_id
+            self.next_trip_id += 1
+            depart = return_ = None
+            if rng.random() >= 0.03:
+                depart = FIRST_DAY + timedelta(rng.randrange(DATE_SPAN_DAYS))
+                length = int(rng.triangular(1, 21, 5))
+                return_ = depart + timedelta(days=length)
+            yield (trip_id, rng.choice(DESTINATIONS), depart, return_, user_id)
+
+    def plans(self, trip):
+        rng = self.rng
+        trip_id, _destination, depart, return_, _user_id = trip
+        days = (return_ - depart).days + 1 if depart else 0
+
+        for _ in range(self._skewed(1.15, 400)):
+            plan_id = self.next_plan_id
+            self.next_plan_id += 1
+
+            at_date = None
+            if days and rng.random() >= 0.08:
+                at_date = depart + timedelta(days=rng.randrange(days))
+
+            at_time = None
+            if rng.random() >= 0.1:
+                hour = int(rng.triangular(6, 23, 12))
+                at_time = time(hour, rng.choice((0, 15, 30, 45)))
+
+            cost = None
+            roll = rng.random()
+            if roll >= 0.4:
+                cost = round(rng.lognormvariate(3.5, 1.0), 2)
+            elif roll >= 0.3:
+                cost = 0
+
+            note = rng.choice(NOTES) if rng.random() < 0.4 else None
+            yield (plan_id, trip_id, at_date, at_time,
+                   rng.choice(ACTIVITIES), note, cost)
+
+
+def _copy(cursor, table, columns, rows):
+    if not rows:
+        return
+    buffer = io.StringIO()
+    # In CSV format an unquoted empty field is NULL.
+    csv.writer(buffer).writerows(
+        ['' if value is None else value for value in row] for row in rows
+        )
+    buffer.seek(0)
+    cursor.copy_expert(
+        f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)",
+        buffer,
+        )
+
+
+def _next_id(cursor, table):
+    cursor.execute(f'SELECT COALESCE(MAX(id), 0) + 1 FROM {table}')
+    return cursor.fetchone()[0]
+
+
+def seed_bulk(conn, users, password_hash, seed=0, batch_size=50_000,
+              progress=None):
+    # Rows are streamed to COPY in batches with explicit ids, in one
+    # transaction. The totals triggers are switched off for the load and
+    # the totals rebuilt once at the end, which is far cheaper than
+    # recounting after every batch.
+    counts = {'users': 0, 'trips': 0, 'plans': 0}
+    buffers = {'users': [], 'trips': [], 'plans': []}
+    columns = {
+        'users': ('id', 'full_name', 'email', 'password'),
+        'trips': ('id', 'destination', 'depart_date', 'return_date',
+                  'user_id'),
+        'plans': ('id', 'trip_id', 'at_date', 'at_time', 'activity', 'note',
+                  'cost'),
+    }
+
+    def flush(cursor):
+        # Parents go first so each batch satisfies the foreign keys.
+        for table in ('users', 'trips', 'plans'):
+            _copy(cursor, table, columns[table], buffers[table])
+            counts[table] += len(buffers[table])
+            buffers[table].clear()
+        if progress:
+            progress(counts)
+
+    with conn:
+        with conn.cursor() as cursor:
+            cursor.execute('LOCK TABLE users, trips, plans IN EXCLUSIVE MODE')
+            # The totals are rebuilt once at the end. Every other trigger,
+            # such as the one indexing plans for search, stays on.
+            cursor.execute('ALTER TABLE plans DISABLE TRIGGER '
+                           'plans_totals_insert')
+
+            data = SyntheticData(
+                seed,
+                _next_id(cursor, 'users'),
+                _next_id(cursor, 'trips'),
+                _next_id(cursor, 'plans'),
+                )
+            for _ in range(users):
+                user = data.user(password_hash)
+                buffers['users'].append(user)
+                for trip in data.trips(user[0]):
+                    buffers['trips'].append(trip)
+                    buffers['plans'].extend(data.plans(trip))
+                if len(buffers['plans']) >= batch_size:
+                    flush(cursor)
+            flush(cursor)
+
+            for table in ('users', 'trips', 'plans'):
+                cursor.execute(
+                    f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                    f"(SELECT MAX(id) FROM {table}))"
+                    )
+            cursor.execute('ALTER TABLE plans ENABLE TRIGGER '
+                           'plans_totals_insert')
+            cursor.execute('SELECT rebuild_plan_totals()')
+
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute('ANALYZE users, trips, plans, plan_day_totals, '
+                           'trip_totals, search_documents')
+    finally:
+        conn.autocommit = False
+    return counts
@@ -0,0 +1,224 @@
+from datetime import datetime, timezone
+import os
+import secrets
+import threading
+
+from flask import g, has_app_context
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SecureCookieSession, SessionInterface
+from itsdangerous import BadSignature, Signer
+
+from .cache import NullCache
+from .database import Database
+
+PURGE_EVERY = 100
+
+
+def secret_keys():
+    # Every worker and node has to sign with the same key. The key is
+    # rotated by making the old one a fallback: cookies signed with any
+    # fallback are still accepted, and new ones get the current key.
+    key = os.environ.get('SECRET_KEY')
+    fallbacks = [
+        fallback.strip()
+        for fallback in os.environ.get('SECRET_KEY_FALLBACKS', '').split(',')
+        if fallback.strip()
+    ]
+    if not key:
+        if os.environ.get('FLASK_ENV') == 'production':
+            raise RuntimeError(
+                "SECRET_KEY is not set. Every worker needs the same key, "
+                "e.g. `python -c 'import secrets; "
+                "print(secrets.token_hex(32))'`."
+                )
+        # Development only: sessions end when the server restarts.
+        key = secrets.token_hex(32)
+    return key, fallbacks
+
+
+class ServerSession(SecureCookieSession):
+    # The data lives in a store; the cookie holds only the signed id.
+
+    def __init__(self, initial=None, sid=None, expires_at=None):
+        super().__init__(initial)
+        self.sid = sid
+        self.expires_at = expires_at
+        self.loaded_user_id = self.get('user_id')
+
+
+class MemorySessionStore:
+    # One process only: gunicorn workers each get their own store, so use
+    # the Postgres store for more than one worker.
+
+    def __init__(self):
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def load(self, sid):
+        with self._lock:
+            entry = self._sessions.get(sid)
+        if entry is None or entry[1] <= datetime.now(timezone.utc):
+            return None
+        return entry
+
+    def save(self, sid, data, expires_at):
+        with self._lock:
+            self._sessions[sid] = (data, expires_at)
+
+    def delete(self, sid):
+        with self._lock:
+            self._sessions.pop(sid, None)
+
+    def purge(self):
+        now = datetime.now(timezone.utc)
+        with self._lock:
+            expired = [sid for sid, (_data, expires_at)
+                       in self._sessions.items() if expires_at <= now]
+            for sid in expired:
+                del self._sessions[sid]
+        return len(expired)
+
+
+class PostgresSessionStore:
+
+    def __init__(self, pool=None):
+        self._pool = pool
+
+    def _call(self, method, *args):
+        # Sessions are saved while the request's Database still holds its
+        # pooled connection. Reusing it keeps every request at one
+        # connection; checking out a second could wait forever once every
+        # thread holds one. Sessions are opened before the request's
+        # Database exists, so loading checks one out for a moment.
+        storage = g.get('storage') if has_app_context() else None
+        if storage is not None:
+            return getattr(storage, method)(*args)
+
+        storage = Database(pool=self._pool, cache=NullCache())
+        try:
+            return getattr(storage, method)(*args)
+        finally:
+            storage.close()
+
+    def load(self, sid):
+        return self._call('load_session', sid)
+
+    def save(self, sid, data, expires_at):
+        self._call('save_session', sid, data, expires_at)
+
+    def delete(self, sid):
+        self._call('delete_session', sid)
+
+    def purge(self):
+        return self._call('purge_expired_sessions')
+
+
+class ServerSessionInterface(SessionInterface):
+    serializer = TaggedJSONSerializer()
+    salt = 'wanderly-session'
+
+    def __init__(self, store, skip_paths=('/static/', '/assets/')):
+        self.store = store
+        self.skip_paths = skip_paths
+        self._saves = 0
+        self._lock = threading.Lock()
+
+    def _signer(self, app):
+        # itsdangerous signs with the last key and accepts any of them.
+        keys = [*(app.config.get('SECRET_KEY_FALLBACKS') or []),
+                app.secret_key]
+        return Signer(keys, salt=self.salt, key_derivation='hmac')
+
+    def open_session(self, app, request):
+        # Static files never touch the session, so they skip the lookup.
+        if request.path.startswith(self.skip_paths):
+            return None
+        if not app.secret_key:
+            return None
+
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if cookie:
+            try:
+                sid = self._signer(app).unsign(cookie).decode('ascii')
+            except BadSignature:
+                sid = None
+            entry = self.store.load(sid) if sid else None
+            if entry is not None:
+                data, expires_at = entry
+                return ServerSession(
+                    self.serializer.loads(data), sid=sid,
+                    expires_at=expires_at)
+        # Unknown ids are never adopted, so a client cannot choose its own.
+        return ServerSession()
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        cookie = {
+            'domain': self.get_cookie_domain(app),
+            'path': self.get_cookie_path(app),
+            'secure': self.get_cookie_secure(app),
+            'partitioned': self.get_cookie_partitioned(app),
+            'samesite': self.get_cookie_samesite(app),
+            'httponly': self.get_cookie_httponly(app),
+        }
+
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        if not session:
+            if session.modified:
+                if session.sid:
+                    self.store.delete(session.sid)
+                response.delete_cookie(name, **cookie)
+                response.vary.add('Cookie')
+            return
+
+        # Stored sessions are written when they change, and otherwise only
+        # once half their lifetime has passed, to push the expiry back.
+        lifetime = app.permanent_session_lifetime
+        now = datetime.now(timezone.utc)
+        refresh = (session.expires_at is not None
+                   and session.expires_at - now < lifetime / 2)
+        if not (session.modified or refresh):
+            return
+
+        # Signing in or out gets a fresh id.
+        sid = session.sid
+        if sid is None or session.get('user_id') != session.loaded_user_id:
+            if sid:
+                self.store.delete(sid)
+            sid = secrets.token_urlsafe(32)
+
+        self.store.save(sid, self.serializer.dumps(dict(session)),
+                        now + lifetime)
+        self._purge_now_and_then()
+
+        response.set_cookie(
+            name,
+            self._signer(app).sign(sid).decode('ascii'),
+            expires=self.get_expiration_time(app, session),
+            **cookie,
+            )
+        response.vary.add('Cookie')
+
+    def _purge_now_and_then(self):
+        with self._lock:
+            self._saves += 1
+            due = self._saves % PURGE_EVERY == 0
+        if due:
+            self.store.purge()
+
+
+def create_session_interface():
+    # `cookie` keeps Flask's signed-cookie sessions, which work across
+    # workers once they share SECRET_KEY.
+    backend = os.environ.get('SESSION_BACKEND', 'cookie')
+    if backend == 'postgres':
+        return ServerSessionInterface(PostgresSessionStore())
+    if backend == 'memory':
+        return ServerSessionInterface(MemorySessionStore())
+    if backend == 'cookie':
+        return None
+    raise RuntimeError(
+        f"Unknown SESSION_BACKEND {backend!r}; use cookie, postgres or "
+        "memory.")
@@ -1,16 +1,89 @@
 'use strict'
 
-document.addEventListener('DOMContentLoaded', function() {
-    let forms = document.querySelectorAll('form.delete');
-    forms.forEach(form => {
-        form.addEventListener('submit', function (event) {
+// Edit links and forms marked with data-fragment fetch just the piece of
+// the page they change. Every element with an id in the response replaces
+// the element with that id on the page. Anything unexpected falls back to
+// the link or form's normal full-page request.
+function swapFragments(html) {
+    let template = document.createElement('template');
+    template.innerHTML = html;
+    Array.from(template.content.children).forEach(fragment => {
+        let current = fragment.id && document.getElementById(fragment.id);
+        if (current) {
+            current.replaceWith(fragment);
+        }
+    })
+}
+
+function loadFragment(url, options) {
+    return fetch(url, options).then(response => {
+        let location = response.headers.get('Wanderly-Location');
+        if (location || response.redirected) {
+            window.location.assign(location || response.url);
+            return;
+        }
+        // 422 carries the edit form with its errors.
+        if (!response.ok && response.status !== 422) {
+            throw new Error(response.statusText);
+        }
+        return response.text().then(swapFragments);
+    })
+}
+
+document.addEventListener('click', function (event) {
+    let link = event.target.closest('a[data-fragment]');
+    if (!link || event.ctrlKey || event.metaKey || event.shiftKey) {
+        return;
+    }
+    event.preventDefault();
+    loadFragment(link.dataset.fragment)
+        .catch(() => window.location.assign(link.href));
+})
+
+document.addEventListener('submit', function (event) {
+    let form = event.target;
+
+    if (form.matches('form.delete')) {
+        if (!confirm("Are you sure? This cannot be undone!")) {
             event.preventDefault();
-            event.stopPropagation();
+        }
+        return;
+    }
 
-            if (confirm("Are you sure? This cannot be undone!")) {
-                event.target.submit();
-            }
+    if (form.matches('form[data-fragment]')) {
+        event.preventDefault();
+        loadFragment(form.dataset.fragment, {
+            method: 'POST',
+            body: new FormData(form),
+        }).catch(() => form.submit());
+    }
+})
 
-        })
-    })
+// Search boxes with data-suggest fill their datalist as the user types.
+let suggestTimer;
+
+document.addEventListener('input', function (event) {
+    let input = event.target;
+    if (!input.matches('input[data-suggest]')) {
+        return;
+    }
+    clearTimeout(suggestTimer);
+    suggestTimer = setTimeout(() => {
+        let typed = input.value;
+        fetch(input.dataset.suggest + '?q=' + encodeURIComponent(typed))
+            .then(response => response.ok ? response.json() : {suggestions: []})
+            .then(data => {
+                // A slower, older response must not replace a newer one.
+                if (input.value !== typed) {
+                    return;
+                }
+                let list = document.getElementById(input.getAttribute('list'));
+                list.replaceChildren(...data.suggestions.map(title => {
+                    let option = document.createElement('option');
+                    option.value = title;
+                    return option;
+                }));
+            })
+            .catch(() => {});
+    }, 150);
 })
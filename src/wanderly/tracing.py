@@ -0,0 +1,149 @@
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+import logging
+import time
+
+from psycopg2 import extensions
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar('wanderly_trace', default=None)
+_cursor_classes = {}
+
+
+class Trace:
+    # Everything one request spent time on: each query with the Database
+    # method that issued it, plus named timings such as template rendering.
+
+    def __init__(self, slow_query_ms=None):
+        self.started = time.perf_counter()
+        self.slow_query_ms = slow_query_ms
+        self.queries = []
+        self.timings = Counter()
+        self.method = None
+        self.render_started = None
+
+    def record_query(self, statement, sql, seconds, rows):
+        self.queries.append({
+            'statement': statement,
+            'sql': sql,
+            'seconds': seconds,
+            'rows': rows,
+            'method': self.method,
+        })
+        self.timings['db'] += seconds
+        # The log gets the statement without its parameters, which may
+        # hold password hashes or other user data.
+        if self.slow_query_ms is not None and (
+                seconds * 1000 >= self.slow_query_ms):
+            logger.warning("Slow query (%.1fms, %s rows) in %s: %s",
+                           seconds * 1000, rows, self.method or 'request',
+                           ' '.join(statement.split()))
+
+    def repeated_statements(self):
+        # The same SQL text run more than once in one request usually means
+        # a loop of lookups that one query could have answered.
+        counts = Counter(query['statement'] for query in self.queries)
+        return [
+            (statement, count, sorted({
+                query['method'] or 'request' for query in self.queries
+                if query['statement'] == statement
+            }))
+            for statement, count in counts.items() if count > 1
+        ]
+
+    def server_timing(self):
+        total = time.perf_counter() - self.started
+        parts = [f'db;dur={self.timings["db"] * 1000:.1f};'
+                 f'desc="{len(self.queries)} queries"']
+        for name in ('tpl', 'bcrypt'):
+            if name in self.timings:
+                parts.append(f'{name};dur={self.timings[name] * 1000:.1f}')
+        parts.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(parts)
+
+
+def start_trace(slow_query_ms=None):
+    trace = Trace(slow_query_ms)
+    _current.set(trace)
+    return trace
+
+
+def end_trace():
+    _current.set(None)
+
+
+def current_trace():
+    return _current.get()
+
+
+def add_timing(name, seconds):
+    trace = _current.get()
+    if trace is not None:
+        trace.timings[name] += seconds
+
+
+@contextmanager
+def timed(name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_timing(name, time.perf_counter() - started)
+
+
+class TracingCursor(extensions.cursor):
+
+    def execute(self, query, params=None):
+        trace = _current.get()
+        if trace is None:
+            return super().execute(query, params)
+
+        started = time.perf_counter()
+        try:
+            return super().execute(query, params)
+        finally:
+            trace.record_query(
+                query.decode('utf-8', 'replace')
+                if isinstance(query, bytes) else str(query),
+                self.query.decode('utf-8', 'replace') if self.query else query,
+                time.perf_counter() - started,
+                self.rowcount,
+                )
+
+
+class TracingConnection(extensions.connection):
+    # Used as the pool's connection_factory. Whatever cursor class a caller
+    # asks for gets the tracing execute mixed in.
+
+    def cursor(self, *args, **kwargs):
+        factory = kwargs.get('cursor_factory') or extensions.cursor
+        if factory not in _cursor_classes:
+            _cursor_classes[factory] = type(
+                f'Tracing{factory.__name__}', (TracingCursor, factory), {})
+        kwargs['cursor_factory'] = _cursor_classes[factory]
+        return super().cursor(*args, **kwargs)
+
+
+def traced_methods(cls):
+    # Tags the queries run inside each public method with its name, so the
+    # slow-query log and the repeat warning can say which call issued them.
+    def wrap(name, method):
+        @wraps(method)
+        def wrapper(*args, **kwargs):
+            trace = _current.get()
+            if trace is None:
+                return method(*args, **kwargs)
+            outer, trace.method = trace.method, name
+            try:
+                return method(*args, **kwargs)
+            finally:
+                trace.method = outer
+        return wrapper
+
+    for name, method in list(vars(cls).items()):
+        if callable(method) and not name.startswith('_'):
+            setattr(cls, name, wrap(name, method))
+    return cls
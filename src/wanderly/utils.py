@@ -1,8 +1,12 @@
 from datetime import datetime
+import base64
+import binascii
+import json
 import re
 
 def check_date_range(date, trip):
-    if date:
+    # A trip without both dates has no range to fall outside of.
+    if date and trip['depart_date'] and trip['return_date']:
         format_string = '%Y-%m-%d'
         date = datetime.strptime(date, format_string).date()
         if trip['depart_date'] > date or date > trip['return_date']:
@@ -87,12 +91,9 @@ def plans_by_date(all_plans):
         plans[date].append(activity)
     return plans
 
-def plans_per_page(itinerary, page, days_per_page):
-    start = (page - 1) * days_per_page
-    end = start + days_per_page
-    valid_days = list(itinerary.keys())[start:end]
-    page_days = {date:itinerary[date] for date in valid_days}
-    return page_days
+def page_number(page):
+    page = str(page)
+    return int(page) if page.isdigit() and int(page) > 0 else 1
 
 def error_for_page(page, pages):
     try:
@@ -109,5 +110,190 @@ def total_pages(total_items, items_per_page):
     pages = ((total_items + items_per_page - 1) // items_per_page) or 1
     return pages
 
+def page_window(current_page, pages, radius=2):
+    shown = {1, pages}
+    shown.update(range(max(1, current_page - radius),
+                       min(pages, current_page + radius) + 1))
+
+    window = []
+    for page in sorted(shown):
+        if window and page - window[-1] > 1:
+            window.append(None)
+        window.append(page)
+    return window
+
+def _sort_value(date):
+    return date.isoformat() if date else 'infinity'
+
+def _is_date(value):
+    try:
+        datetime.strptime(value, '%Y-%m-%d')
+    except (TypeError, ValueError):
+        return False
+    return True
+
+def _is_sort_date(value):
+    return value == 'infinity' or _is_date(value)
+
+def _is_id(value):
+    return isinstance(value, int)
+
+def _is_rank(value):
+    return isinstance(value, (int, float))
+
+def _encode_key(*fields):
+    encoded = base64.urlsafe_b64encode(json.dumps(fields).encode('utf-8'))
+    return encoded.decode('ascii').rstrip('=')
+
+def _decode_key(cursor, *checks):
+    # A cursor is the JSON list of a page's last sort key, base64 encoded.
+    # Returns its fields as a tuple, or None unless each passes its check.
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        fields = json.loads(base64.urlsafe_b64decode(padded))
+    except (binascii.Error, TypeError, ValueError):
+        return None
+    if not isinstance(fields, list) or len(fields) != len(checks):
+        return None
+    if not all(check(field) for check, field in zip(checks, fields)):
+        return None
+    return tuple(fields)
+
+def encode_cursor(trip):
+    return _encode_key(
+        _sort_value(trip['depart_date']),
+        _sort_value(trip['return_date']),
+        trip['id'],
+        )
+
+def decode_cursor(cursor):
+    return _decode_key(cursor, _is_sort_date, _is_sort_date, _is_id)
+
+def encode_search_cursor(result):
+    return _encode_key(result['rank'], result['id'])
+
+def decode_search_cursor(cursor):
+    return _decode_key(cursor, _is_rank, _is_id)
+
+def encode_past_cursor(trip):
+    return _encode_key(trip['return_date'].isoformat(), trip['id'])
+
+def decode_past_cursor(cursor):
+    return _decode_key(cursor, _is_date, _is_id)
+
 def remove_punc_for_cost(cost):
     return cost.replace(',', '')
+
+PLAN_OPERATIONS = ('create', 'update', 'delete')
+PLAN_FIELDS = ('date', 'time', 'activity', 'note', 'cost')
+
+def plan_fields(operation):
+    # Same clean-up the activity form applies: blanks become NULL and cost
+    # loses its thousands separators.
+    def text(name):
+        value = operation.get(name)
+        return '' if value is None else str(value).strip()
+
+    return (
+        text('date') or None,
+        text('time') or None,
+        text('activity'),
+        text('note') or None,
+        remove_punc_for_cost(text('cost')) or None,
+    )
+
+def error_for_plan_operation(operation, seen_ids):
+    if not isinstance(operation, dict):
+        return ["Operation must be an object."]
+
+    op = operation.get('op')
+    if op not in PLAN_OPERATIONS:
+        return ["op must be one of create, update or delete."]
+
+    errors = []
+    if op != 'create':
+        plan_id = operation.get('id')
+        if not isinstance(plan_id, int) or isinstance(plan_id, bool):
+            errors.append("id must be an integer.")
+        elif plan_id in seen_ids:
+            errors.append(
+                f"Activity {plan_id} appears in more than one operation.")
+        else:
+            seen_ids.add(plan_id)
+
+    if op != 'delete':
+        for name in PLAN_FIELDS:
+            value = operation.get(name)
+            if name == 'cost':
+                allowed, kind = (str, int, float), 'a number or string'
+            else:
+                allowed, kind = (str,), 'a string'
+            if value is not None and (not isinstance(value, allowed)
+                                      or isinstance(value, bool)):
+                errors.append(f"{name} must be {kind}.")
+        if not errors:
+            date, time, activity, _note, cost = plan_fields(operation)
+            errors.extend(error_for_activity_input(date, time, activity, cost))
+    return errors
+
+def error_for_plan_batch(payload, max_operations):
+    # (message, status) when the body is not a batch of operations at all.
+    operations = None
+    if isinstance(payload, dict):
+        operations = payload.get('operations')
+    if not isinstance(operations, list) or not operations:
+        return "operations must be a non-empty list.", 400
+    if len(operations) > max_operations:
+        return f"A batch can hold at most {max_operations} operations.", 413
+    return None
+
+def plan_batch_results(operations):
+    # One result per operation, in order; invalid ones carry their errors.
+    results = []
+    seen_ids = set()
+    for operation in operations:
+        errors = error_for_plan_operation(operation, seen_ids)
+        result = {'op': operation.get('op') if isinstance(operation, dict)
+                  else None}
+        if errors:
+            result.update(status='invalid', errors=errors)
+        results.append(result)
+    return results
+
+def split_plan_batch(operations, results, trip):
+    # The validated operations as apply_plan_batch takes them. Dates outside
+    # the trip are allowed, with a warning on their result.
+    creates, updates, deletes = [], [], []
+    for operation, result in zip(operations, results):
+        if operation['op'] == 'delete':
+            deletes.append(operation['id'])
+            result['id'] = operation['id']
+            continue
+
+        fields = plan_fields(operation)
+        warning = check_date_range(fields[0], trip)
+        if warning:
+            result['warning'] = warning
+        if operation['op'] == 'create':
+            creates.append(fields)
+        else:
+            updates.append((operation['id'],) + fields)
+            result['id'] = operation['id']
+    return creates, updates, deletes
+
+def finish_plan_batch(results, applied):
+    # Sets every result's status; True when the batch was written. applied
+    # is None when the batch was invalid and never reached the database.
+    if applied is None or applied['missing']:
+        missing = set(applied['missing']) if applied else set()
+        for result in results:
+            missed = result.get('id') in missing and result['op'] != 'create'
+            result.setdefault('status', 'not_found' if missed else 'skipped')
+        return False
+
+    created_ids = iter(applied['created'])
+    for result in results:
+        if result['op'] == 'create':
+            result['id'] = next(created_ids)
+        result['status'] = result['op'] + 'd'
+    return True
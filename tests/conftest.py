@@ -0,0 +1,217 @@
+from datetime import date
+import os
+
+import pytest
+
+psycopg2 = pytest.importorskip('psycopg2')
+
+# pylint: disable=wrong-import-position
+from psycopg2 import extensions
+
+from wanderly.cache import NullCache
+from wanderly.database import Database
+from wanderly.migrate import upgrade
+from wanderly.pool import ConnectionPool
+
+# Tests that need PostgreSQL run against a scratch database whose public
+# schema is dropped and rebuilt, so never point this at real data.
+TEST_DATABASE_URL = os.environ.get('WANDERLY_TEST_DATABASE_URL')
+# A streaming replica of that database, for the read/write splitting tests.
+TEST_REPLICA_URL = os.environ.get('WANDERLY_TEST_REPLICA_URL')
+
+SYNTHETIC_USERS = int(os.environ.get('WANDERLY_TEST_USERS', 20000))
+
+SYNTHETIC_DATASET = """
+SELECT setseed(0.42);
+
+INSERT INTO users (full_name, email, password)
+SELECT 'Traveler ' || n, 'traveler' || n || '@example.test', 'not-a-hash'
+FROM generate_series(1, %(users)s) AS n;
+
+-- Skewed ownership: low user ids own most of the trips. Earlier tests may
+-- have used up ids, so they are counted from the first traveler's.
+INSERT INTO trips (destination, depart_date, return_date, user_id)
+SELECT 'Trip ' || n,
+       depart,
+       depart + (n %% 15),
+       first_user.id + floor(%(users)s * power(random(), 3))::int
+FROM (
+    SELECT n, date '2020-01-01' + (random() * 2500)::int AS depart
+    FROM generate_series(1, %(users)s * 3) AS n
+) AS generated,
+(
+    SELECT min(id) AS id FROM users
+    WHERE email LIKE 'traveler%%@example.test'
+) AS first_user;
+
+INSERT INTO plans (at_date, at_time, activity, cost, note, trip_id)
+SELECT CASE WHEN k %% 17 = 0 THEN NULL ELSE trips.depart_date + (k %% 10) END,
+       time '07:00' + (k * interval '47 minutes'),
+       'Activity ' || k,
+       CASE WHEN k %% 3 = 0 THEN NULL ELSE round((random() * 200)::numeric, 2) END,
+       CASE WHEN k %% 4 = 0 THEN 'Note ' || k END,
+       trips.id
+FROM trips, generate_series(1, 1 + trips.id %% 20) AS k;
+
+-- Signed-in travelers, none expired yet.
+INSERT INTO sessions (id, data, expires_at)
+SELECT md5('session' || n), '{}', now() + (1 + random() * 30) * interval '1 day'
+FROM generate_series(1, %(users)s) AS n;
+
+-- Reminders already sent for every fifth timed plan.
+INSERT INTO reminder_deliveries (plan_id, due_at, status, attempts, sent_at)
+SELECT id, at_date + at_time, 'sent', 1, now()
+FROM plans
+WHERE at_date IS NOT NULL AND at_time IS NOT NULL AND id %% 5 = 0;
+"""
+
+# Trips that returned before this are moved to the archive.
+SYNTHETIC_ARCHIVE_BEFORE = date(2021, 1, 1)
+
+
+def recording_connection(statements):
+    cursor_classes = {}
+
+    def recording_cursor(factory):
+        if factory not in cursor_classes:
+            class RecordingCursor(factory):
+                def execute(self, query, vars=None):
+                    statements.append(self.mogrify(query, vars).decode())
+                    return super().execute(query, vars)
+
+            cursor_classes[factory] = RecordingCursor
+        return cursor_classes[factory]
+
+    class RecordingConnection(extensions.connection):
+        def cursor(self, *args, **kwargs):
+            factory = kwargs.get('cursor_factory') or extensions.cursor
+            kwargs['cursor_factory'] = recording_cursor(factory)
+            return super().cursor(*args, **kwargs)
+
+    return RecordingConnection
+
+
+@pytest.fixture(scope='session')
+def database_url():
+    if not TEST_DATABASE_URL:
+        pytest.skip("Set WANDERLY_TEST_DATABASE_URL to a scratch database.")
+    return TEST_DATABASE_URL
+
+
+@pytest.fixture(scope='session')
+def migrated_database(database_url):
+    conn = psycopg2.connect(database_url)
+    try:
+        with conn:
+            with conn.cursor() as cursor:
+                cursor.execute('DROP SCHEMA public CASCADE')
+                cursor.execute('CREATE SCHEMA public')
+        upgrade(conn)
+    finally:
+        conn.close()
+    return database_url
+
+
+@pytest.fixture(scope='session')
+def replica_url(migrated_database):
+    if not TEST_REPLICA_URL:
+        pytest.skip("Set WANDERLY_TEST_REPLICA_URL to a streaming replica "
+                    "of the scratch database.")
+    return TEST_REPLICA_URL
+
+
+@pytest.fixture(scope='session')
+def large_dataset(migrated_database):
+    conn = psycopg2.connect(migrated_database)
+    try:
+        with conn:
+            with conn.cursor() as cursor:
+                cursor.execute(SYNTHETIC_DATASET, {'users': SYNTHETIC_USERS})
+
+        pool = ConnectionPool(migrated_database, min_size=0, max_size=1)
+        storage = Database(pool=pool, cache=NullCache())
+        try:
+            while storage.archive_trips(SYNTHETIC_ARCHIVE_BEFORE, 5000):
+                pass
+        finally:
+            storage.close()
+            pool.close()
+
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute('VACUUM ANALYZE')
+            # A typical traveler: a handful of trips, each with activities.
+            cursor.execute("""
+                           SELECT user_id, array_agg(id ORDER BY id)
+                           FROM trips
+                           GROUP BY user_id
+                           HAVING count(*) BETWEEN 4 AND 10
+                           ORDER BY user_id
+                           LIMIT 1
+                           """)
+            user_id, trip_ids = cursor.fetchone()
+            cursor.execute('SELECT email FROM users WHERE id = %s',
+                           (user_id,))
+            email = cursor.fetchone()[0]
+            cursor.execute("""
+                           SELECT id, at_date FROM plans
+                           WHERE trip_id = %s AND at_date IS NOT NULL
+                           ORDER BY id LIMIT 1
+                           """, (trip_ids[1],))
+            activity_id, day = cursor.fetchone()
+            # The traveler with the most search documents.
+            cursor.execute("""
+                           SELECT user_id FROM search_documents
+                           GROUP BY user_id
+                           ORDER BY count(*) DESC, user_id
+                           LIMIT 1
+                           """)
+            heavy_user_id = cursor.fetchone()[0]
+    finally:
+        conn.close()
+
+    return {
+        'user_id': user_id,
+        'email': email,
+        'trip_id': trip_ids[0],
+        'activity_id': activity_id,
+        'activity_trip_id': trip_ids[1],
+        'day': day,
+        'doomed_trip_id': trip_ids[2],
+        'day_trip_id': trip_ids[3],
+        'heavy_user_id': heavy_user_id,
+    }
+
+
+@pytest.fixture
+def recorded_statements():
+    return []
+
+
+@pytest.fixture
+def recording_pool(migrated_database, recorded_statements):
+    pool = ConnectionPool(
+        migrated_database,
+        min_size=0,
+        max_size=2,
+        connection_factory=recording_connection(recorded_statements),
+        )
+    yield pool
+    pool.close()
+
+
+@pytest.fixture
+def replica_statements():
+    return []
+
+
+@pytest.fixture
+def replica_pool(replica_url, replica_statements):
+    pool = ConnectionPool(
+        replica_url,
+        min_size=0,
+        max_size=2,
+        connection_factory=recording_connection(replica_statements),
+        )
+    yield pool
+    pool.close()
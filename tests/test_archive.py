@@ -0,0 +1,107 @@
+from datetime import date
+import uuid
+
+from flask import Flask
+
+from wanderly.cache import LRUCache, NullCache
+from wanderly.cli import archive_cli
+from wanderly.database import Database
+
+# Earlier than any trip the other tests create.
+CUTOFF = date(2000, 1, 1)
+
+
+def make_traveler(storage):
+    return storage.create_new_user(
+        'Archive Tester', f'{uuid.uuid4().hex}@example.test', 'x')
+
+
+def test_past_trips_move_to_the_archive(
+        migrated_database, recording_pool):
+    storage = Database(pool=recording_pool, cache=LRUCache())
+    try:
+        user_id = make_traveler(storage)
+        other_id = make_traveler(storage)
+        storage.create_new_trip('Lisbon', '1998-05-01', '1998-05-09', user_id)
+        storage.create_new_trip('Kyoto', '1999-10-01', '1999-10-05', user_id)
+        storage.create_new_trip('Oslo', '2031-01-01', '2031-01-05', user_id)
+        storage.create_new_trip('Undated', None, None, user_id)
+        storage.create_new_trip('Cairo', '1997-03-01', '1997-03-04',
+                                other_id)
+        trips = {trip['destination']: trip
+                 for trip in storage.get_trips_page(user_id, 8)['trips']}
+        kyoto = trips['Kyoto']['id']
+        storage.add_new_activity('1999-10-02', '09:00 AM', 'Fushimi Inari',
+                                 'go early', '12', kyoto)
+        storage.add_new_activity(None, None, 'Tea ceremony', None, '30',
+                                 kyoto)
+        version = storage.get_trips_version(user_id)['revision']
+
+        assert storage.archive_trips(CUTOFF, limit=2) == 2
+        assert storage.archive_trips(CUTOFF, limit=2) == 1
+        assert storage.archive_trips(CUTOFF) == 0
+
+        # The trips list, cached before the move, shows only the hot set.
+        page = storage.get_trips_page(user_id, 8)
+        assert [trip['destination'] for trip in page['trips']] == [
+            'Oslo', 'Undated']
+        assert page['total'] == 2
+        assert storage.get_trips_version(user_id)['revision'] > version
+        assert storage.find_trip_for_user(kyoto, user_id) == (None, None)
+
+        # The archive keeps the plans and the totals they added up to.
+        past = storage.find_past_trip(kyoto, user_id)
+        assert (past['activity_count'], past['total_cost']) == (2, 42)
+        assert storage.find_past_trip(kyoto, other_id) is None
+        assert [plan['activity'] for plan in
+                storage.get_past_itinerary(kyoto)] == [
+                    'Fushimi Inari', 'Tea ceremony']
+
+        # Archived trips and plans can still be searched.
+        [found] = storage.search(user_id, 'inari', 10)['results']
+        assert (found['archived'], found['trip_id']) == (True, kyoto)
+        assert found['destination'] == 'Kyoto'
+        assert storage.suggest(user_id, 'fush') == ['Fushimi Inari']
+
+        first = storage.get_past_trips_page(user_id, 1)
+        assert [trip['destination'] for trip in first['trips']] == ['Kyoto']
+        assert first['has_more']
+        last = first['trips'][-1]
+        second = storage.get_past_trips_page(
+            user_id, 1, (last['return_date'].isoformat(), last['id']))
+        assert [trip['destination'] for trip in second['trips']] == [
+            'Lisbon']
+        assert not second['has_more']
+    finally:
+        storage.close()
+
+
+def test_archive_run_keeps_plans_searchable(
+        migrated_database, recording_pool, monkeypatch):
+    monkeypatch.setattr('wanderly.database._pool', recording_pool)
+    storage = Database(pool=recording_pool, cache=NullCache())
+    try:
+        user_id = make_traveler(storage)
+        storage.create_new_trip('Osaka', '1999-04-01', '1999-04-06', user_id)
+        trip_id = storage.get_trips_page(user_id, 8)['trips'][0]['id']
+        storage.add_new_activity('1999-04-02', '07:00 PM', 'Ramen crawl',
+                                 'Dotonbori ramen alley', None, trip_id)
+    finally:
+        storage.close()
+
+    app = Flask(__name__)
+    app.cli.add_command(archive_cli)
+    after_days = (date.today() - CUTOFF).days
+    result = app.test_cli_runner().invoke(
+        args=['archive', 'run', '--after-days', str(after_days)])
+    assert result.exit_code == 0, result.output
+    assert result.output.startswith('Archived ')
+
+    storage = Database(pool=recording_pool, cache=NullCache())
+    try:
+        assert storage.find_past_trip(trip_id, user_id)
+        results = storage.search(user_id, 'ramen', 10)['results']
+        assert [(result['plan_id'] is not None, result['archived'])
+                for result in results] == [(True, True)]
+    finally:
+        storage.close()
@@ -0,0 +1,67 @@
+import gzip
+import os
+import shutil
+
+from werkzeug.datastructures import Accept
+
+from wanderly import assets
+
+STATIC = os.path.join(os.path.dirname(assets.__file__), 'static')
+
+
+def test_minify_css_keeps_selectors_and_values():
+    source = """
+    /* Buttons */
+    .trip-card > a, .day-header .title {
+      margin: 0 auto;
+      width: calc(100% - 2rem);
+    }
+    @media (max-width: 480px) {
+      .logo :hover { color: red; }
+    }
+    """
+    assert assets.minify_css(source) == (
+        '.trip-card>a,.day-header .title{margin:0 auto;'
+        'width:calc(100% - 2rem)}'
+        '@media (max-width:480px){.logo :hover{color:red}}'
+        )
+
+
+def test_build_writes_hashed_precompressed_bundles(tmp_path):
+    static = tmp_path / 'static'
+    shutil.copytree(os.path.join(STATIC, 'css'), static / 'css')
+    shutil.copytree(os.path.join(STATIC, 'js'), static / 'js')
+
+    manifest, has_brotli = assets.build(str(static))
+    assert set(manifest) == set(assets.BUNDLES)
+    assert assets.load_manifest(str(static)) == manifest
+
+    dist = static / assets.DIST_DIR
+    bundle = manifest['itinerary.css']
+    data = (dist / bundle).read_bytes()
+    assert bundle.startswith('itinerary.') and bundle.endswith('.css')
+    assert gzip.decompress((dist / (bundle + '.gz')).read_bytes()) == data
+    assert (dist / (bundle + '.br')).exists() == has_brotli
+
+    # Unchanged sources give the same names; a change gives a new one.
+    assert assets.build(str(static))[0] == manifest
+    with open(static / 'css' / 'itinerary.css', 'a', encoding='utf-8') as file:
+        file.write('.extra { color: red; }\n')
+    rebuilt = assets.build(str(static))[0]
+    assert rebuilt['itinerary.css'] != bundle
+    assert rebuilt['auth.css'] == manifest['auth.css']
+
+
+def test_pick_encoding_prefers_what_the_client_accepts(tmp_path):
+    for name in ('a.css', 'a.css.gz', 'a.css.br', 'b.css', 'b.css.gz'):
+        (tmp_path / name).write_bytes(b'')
+    dist = str(tmp_path)
+
+    def pick(filename, *accepted):
+        return assets.pick_encoding(dist, filename, Accept(accepted))
+
+    assert pick('a.css', ('gzip', 1), ('br', 1)) == ('br', 'a.css.br')
+    assert pick('a.css', ('gzip', 1), ('br', 0)) == ('gzip', 'a.css.gz')
+    assert pick('b.css', ('br', 1)) == (None, 'b.css')
+    assert pick('b.css', ('*', 1)) == ('gzip', 'b.css.gz')
+    assert pick('a.css') == (None, 'a.css')
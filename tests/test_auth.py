@@ -0,0 +1,67 @@
+import logging
+import threading
+import uuid
+
+import psycopg2
+import pytest
+
+from wanderly.cache import NullCache
+from wanderly.database import Database
+from wanderly.passwords import (
+    MIN_ROUNDS,
+    PasswordHasher,
+    configured_rounds,
+    )
+
+
+def test_hashes_are_only_rehashed_upward():
+    hasher = PasswordHasher(12)
+    salt = '$2b${:02d}$' + 'x' * 53
+
+    assert hasher.needs_rehash(salt.format(11))
+    assert not hasher.needs_rehash(salt.format(12))
+    assert not hasher.needs_rehash(salt.format(13))
+    assert hasher.needs_rehash('not-a-hash')
+
+
+def test_cost_is_calibrated_unless_configured(monkeypatch, caplog):
+    monkeypatch.setenv('FLASK_ENV', 'production')
+    monkeypatch.delenv('BCRYPT_ROUNDS', raising=False)
+    monkeypatch.setenv('BCRYPT_TARGET_MS', '0')
+    with caplog.at_level(logging.INFO, logger='wanderly.passwords'):
+        assert configured_rounds() == MIN_ROUNDS
+    assert f'Calibrated bcrypt to {MIN_ROUNDS} rounds' in caplog.text
+
+    monkeypatch.setenv('BCRYPT_ROUNDS', '13')
+    assert configured_rounds() == 13
+
+
+def test_concurrent_sign_ups_differing_in_case(
+        migrated_database, recording_pool):
+    email = f'{uuid.uuid4().hex}@example.test'
+    first = psycopg2.connect(migrated_database)
+    results = []
+
+    def sign_up():
+        storage = Database(pool=recording_pool, cache=NullCache())
+        try:
+            results.append(storage.create_new_user('Second', email, 'x'))
+        finally:
+            storage.close()
+
+    try:
+        with first.cursor() as cursor:
+            cursor.execute("""
+                           INSERT INTO users (full_name, email, password)
+                           VALUES ('First', %s, 'x')
+                           """, (email.upper(),))
+        # The second sign-up waits on the first's uncommitted row.
+        second = threading.Thread(target=sign_up)
+        second.start()
+        second.join(0.5)
+        first.commit()
+        second.join()
+    finally:
+        first.close()
+
+    assert results == [None]
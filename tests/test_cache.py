@@ -0,0 +1,101 @@
+import uuid
+
+from wanderly import cache as cache_module
+from wanderly.cache import LRUCache
+from wanderly.database import Database
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = LRUCache(max_entries=2, ttl=0)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+    stats = cache.stats()
+    assert (stats['size'], stats['evictions']) == (2, 1)
+    assert (stats['hits'], stats['misses']) == (3, 1)
+
+
+def test_entries_expire(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(cache_module.time, 'monotonic', lambda: now[0])
+    cache = LRUCache(ttl=10)
+    cache.set('page', 'cached')
+    cache.set('pinned', 'cached', ttl=0)
+    cache.set('short', 'cached', ttl=1)
+
+    now[0] += 5
+    assert cache.get('page') == 'cached'
+    assert cache.get('short') is None
+    now[0] += 5
+    assert cache.get('page') is None
+    assert cache.get('pinned') == 'cached'
+    assert cache.stats()['expirations'] == 2
+
+
+def test_workers_see_each_others_writes(migrated_database, recording_pool):
+    # Each worker has its own in-process cache.
+    caches = [LRUCache(), LRUCache()]
+
+    def request(worker):
+        return Database(pool=recording_pool, cache=caches[worker])
+
+    storage = request(0)
+    try:
+        user_id = storage.create_new_user(
+            'Cache Tester', f'{uuid.uuid4().hex}@example.test', 'x')
+        storage.create_new_trip('Porto', '2031-05-01', '2031-05-09', user_id)
+        trip_id = storage.get_trips_page(user_id, 8)['trips'][0]['id']
+        assert storage.get_itinerary_page(trip_id, 1, 3)['plans'] == []
+    finally:
+        storage.close()
+
+    storage = request(1)
+    try:
+        storage.create_new_trip('Lyon', '2031-06-01', '2031-06-03', user_id)
+        storage.add_new_activity('2031-05-02', '10:00 AM', 'Port tasting',
+                                 None, None, trip_id)
+    finally:
+        storage.close()
+
+    storage = request(0)
+    try:
+        assert storage.get_trips_page(user_id, 8)['total'] == 2
+        assert [plan['activity'] for plan in
+                storage.get_itinerary_page(trip_id, 1, 3)['plans']] == [
+                    'Port tasting']
+    finally:
+        storage.close()
+
+
+def test_pages_are_read_under_the_revision_in_their_etag(
+        migrated_database, recording_pool, recorded_statements):
+    cache = LRUCache()
+    storage = Database(pool=recording_pool, cache=cache)
+    try:
+        user_id = storage.create_new_user(
+            'Cache Tester', f'{uuid.uuid4().hex}@example.test', 'x')
+        storage.create_new_trip('Porto', '2031-05-01', '2031-05-09', user_id)
+    finally:
+        storage.close()
+
+    recorded_statements.clear()
+    storage = Database(pool=recording_pool, cache=cache, prepare=False)
+    try:
+        version = storage.get_trips_version(user_id)
+        page = storage.get_trips_page(user_id, 8)
+        trip, _ = storage.find_trip_for_user(page['trips'][0]['id'], user_id)
+        storage.get_itinerary_page(trip['id'], 1, 3)
+    finally:
+        storage.close()
+
+    # One revision read each, shared by the ETag and the cache key.
+    assert sum('trips_revision AS revision' in statement
+               for statement in recorded_statements) == 1
+    assert not any(statement.startswith('SELECT revision FROM trips')
+                   for statement in recorded_statements)
+    assert f":{version['revision']}:trips:" in ' '.join(cache._entries)
+    assert f":{trip['revision']}:itinerary:" in ' '.join(cache._entries)
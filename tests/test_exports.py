@@ -0,0 +1,98 @@
+from datetime import date, time
+import io
+import uuid
+
+from wanderly.cache import NullCache
+from wanderly.database import Database
+from wanderly.exports import _ics_line, ics_lines, read_plans_csv
+
+HEADER = 'date,time,activity,note,cost\n'
+
+
+def read(text, max_rows=10):
+    return read_plans_csv(io.BytesIO(text.encode('utf-8')), max_rows)
+
+
+def test_long_ics_lines_are_folded():
+    assert _ics_line('SUMMARY:Tram 28') == 'SUMMARY:Tram 28\r\n'
+
+    for text in ('x' * 200, 'é' * 100, 'a' + '日本' * 60):
+        line = f'SUMMARY:{text}'
+        folded = _ics_line(line)
+        physical = folded[:-2].split('\r\n')
+        assert all(len(part.encode('utf-8')) <= 75 for part in physical)
+        assert all(part.startswith(' ') for part in physical[1:])
+        assert folded[:-2].replace('\r\n ', '') == line
+
+
+def test_ics_events():
+    plans = [
+        {'id': 1, 'at_date': date(2026, 5, 2), 'at_time': time(10),
+         'activity': 'Tram 28, Alfama', 'note': None, 'cost': 3},
+        {'id': 2, 'at_date': date(2026, 5, 3), 'at_time': None,
+         'activity': 'Sintra', 'note': 'Book ahead', 'cost': None},
+        {'id': 3, 'at_date': None, 'at_time': None,
+         'activity': 'Someday', 'note': None, 'cost': None},
+    ]
+    calendar = ''.join(ics_lines({'destination': 'Lisbon'}, plans,
+                                 'wanderly.test'))
+
+    assert calendar.count('BEGIN:VEVENT') == 2
+    assert 'DTSTART:20260502T100000\r\n' in calendar
+    assert 'SUMMARY:Tram 28\\, Alfama\r\n' in calendar
+    assert 'DESCRIPTION:Cost: 3\r\n' in calendar
+    assert 'DTSTART;VALUE=DATE:20260503\r\n' in calendar
+    assert 'UID:plan-2@wanderly.test\r\n' in calendar
+    assert 'Someday' not in calendar
+
+
+def test_plans_csv_is_read_like_the_activity_form():
+    rows, errors = read(HEADER + '2026-05-02,10:00 AM, Tram 28 ,,"1,250"\n'
+                                 ',,Sintra,Book ahead,\n')
+    assert errors == []
+    assert rows == [('2026-05-02', '10:00 AM', 'Tram 28', None, '1250'),
+                    (None, None, 'Sintra', 'Book ahead', None)]
+
+
+def test_plans_csv_errors():
+    assert read('date,activity\n2026-05-02,Tram 28\n') == (
+        [], ["CSV is missing columns: cost, note, time."])
+    assert read('') == (
+        [], ["CSV is missing columns: activity, cost, date, note, time."])
+    assert read(HEADER + ',,Tram 28,,\n' * 3, max_rows=2) == (
+        [], ["CSV has more than 2 activities."])
+
+    _, errors = read(HEADER + ',,Tram 28,,\n'
+                              '2026-13-02,25:00,,,-4\n')
+    assert errors == ["Line 3: Activity description is required.",
+                      "Line 3: Date must be in YYY-MM-DD format.",
+                      "Line 3: Time must be in HH:MM AM/PM format.",
+                      "Line 3: Cost must be greater than or equal to 0."]
+
+    stream = io.BytesIO(HEADER.encode('utf-8') + b',,Caf\xe9,,\n')
+    assert read_plans_csv(stream, 10) == (
+        [], ["CSV file could not be read."])
+
+
+def test_export_outlives_the_querys_transaction(
+        migrated_database, recording_pool):
+    storage = Database(pool=recording_pool, cache=NullCache())
+    try:
+        user_id = storage.create_new_user(
+            'Exporter', f'{uuid.uuid4().hex}@example.test', 'x')
+        storage.create_new_trip('Porto', '2031-05-01', '2031-05-09', user_id)
+        trip_id = storage.get_trips_page(user_id, 8)['trips'][0]['id']
+        for day in range(2, 7):
+            storage.add_new_activity(f'2031-05-0{day}', None, f'Day {day}',
+                                     None, None, trip_id)
+
+        plans = storage.iter_trip_plans(trip_id, batch_size=2)
+        exported = [next(plans)['activity']]
+        # Other queries on the same connection commit in between batches.
+        storage.add_new_activity('2031-05-08', None, 'Late addition',
+                                 None, None, trip_id)
+        exported += [plan['activity'] for plan in plans]
+
+        assert exported == [f'Day {day}' for day in range(2, 7)]
+    finally:
+        storage.close()
@@ -0,0 +1,39 @@
+from jinja2 import DictLoader, Environment
+
+from wanderly.cache import LRUCache
+from wanderly.fragments import Fragments, activity_key, day_key
+
+
+def make_fragments(renders):
+    env = Environment(loader=DictLoader({'row.html': '{{ row() }}'}))
+    return Fragments(env, LRUCache(), release='r1'), {
+        'row': lambda: renders.append(1) or f'<p>{len(renders)}</p>'}
+
+
+def test_fragment_reused_until_revision_changes():
+    renders = []
+    fragments, context = make_fragments(renders)
+    plan = {'id': 7, 'revision': 1}
+
+    first = fragments.render(activity_key(3, plan, 1), 'row.html', **context)
+    again = fragments.render(activity_key(3, plan, 1), 'row.html', **context)
+    assert first == again == '<p>1</p>'
+    assert len(renders) == 1
+
+    plan['revision'] = 2
+    fragments.render(activity_key(3, plan, 1), 'row.html', **context)
+    fragments.render(activity_key(3, plan, 2), 'row.html', **context)
+    fragments.render(None, 'row.html', **context)
+    assert len(renders) == 4
+
+
+def test_day_key_follows_its_plans():
+    plans = [{'id': 1, 'revision': 1}, {'id': 2, 'revision': 1}]
+    key = day_key(3, '2026-05-01', plans, 1, ('', '', '', ''))
+
+    assert key == day_key(3, '2026-05-01', list(plans), 1, ('', '', '', ''))
+    assert key != day_key(3, '2026-05-01', plans[:1], 1, ('', '', '', ''))
+    assert key != day_key(3, '2026-05-01', plans, 2, ('', '', '', ''))
+    assert key != day_key(3, '2026-05-01', plans, 1, ('', 'Museum', '', ''))
+    plans[1]['revision'] = 2
+    assert key != day_key(3, '2026-05-01', plans, 1, ('', '', '', ''))
@@ -0,0 +1,90 @@
+from psycopg2 import extensions
+import pytest
+
+from wanderly import database, pool as pool_module
+from wanderly.pool import ConnectionPool, PoolTimeout
+
+
+class FakeConnection:
+    # Just enough of a psycopg2 connection for the pool's bookkeeping.
+
+    def __init__(self):
+        self.closed = 0
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+        self.rollbacks = 0
+
+    def get_transaction_status(self):
+        return self.status
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+
+@pytest.fixture
+def fake_pool(monkeypatch):
+    monkeypatch.setattr(pool_module.psycopg2, 'connect',
+                        lambda dsn, **kwargs: FakeConnection())
+    return ConnectionPool('dbname=fake', min_size=0, max_size=2,
+                          max_uses=3, checkout_timeout=0)
+
+
+def test_connections_are_reused(fake_pool):
+    conn = fake_pool.getconn()
+    fake_pool.putconn(conn)
+    assert fake_pool.getconn() is conn
+    assert fake_pool.stats()['created'] == 1
+
+
+def test_unhealthy_connections_are_discarded(fake_pool):
+    conn = fake_pool.getconn()
+    fake_pool.putconn(conn, discard=True)
+    assert conn.closed
+
+    closed = fake_pool.getconn()
+    closed.closed = 1
+    fake_pool.putconn(closed)
+
+    lost = fake_pool.getconn()
+    lost.status = extensions.TRANSACTION_STATUS_UNKNOWN
+    fake_pool.putconn(lost)
+
+    stats = fake_pool.stats()
+    assert stats['unhealthy'] == 3
+    assert stats['size'] == 0
+    assert lost.closed
+
+
+def test_returned_connections_are_rolled_back_then_recycled(fake_pool):
+    conn = fake_pool.getconn()
+    conn.status = extensions.TRANSACTION_STATUS_INTRANS
+    fake_pool.putconn(conn)
+    assert conn.rollbacks == 1
+    assert fake_pool.getconn() is conn
+
+    # The third return reaches max_uses.
+    fake_pool.putconn(conn)
+    fake_pool.putconn(fake_pool.getconn())
+    assert conn.closed
+    assert fake_pool.stats()['recycled'] == 1
+
+
+def test_an_exhausted_pool_times_out(fake_pool):
+    fake_pool.getconn()
+    fake_pool.getconn()
+    with pytest.raises(PoolTimeout):
+        fake_pool.getconn()
+    assert fake_pool.stats()['timeouts'] == 1
+
+
+def test_a_forked_process_builds_its_own_pool(monkeypatch):
+    inherited = ConnectionPool('dbname=fake', min_size=0)
+    inherited.pid -= 1
+    monkeypatch.setattr(database, '_pool', inherited)
+
+    pool = database.get_pool()
+    assert pool is not inherited
+    assert database.get_pool() is pool
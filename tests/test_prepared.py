@@ -0,0 +1,102 @@
+import pytest
+from psycopg2.extras import DictRow
+
+from wanderly.cache import NullCache
+from wanderly.database import Database
+
+from .test_query_plans import explain, sequential_scans
+
+HOT_QUERIES = [
+    ('get_user_credentials', lambda d: (d['email'].upper(),)),
+    ('get_trips_version', lambda d: (d['user_id'],)),
+    ('get_trips_page', lambda d: (d['user_id'], 8)),
+    ('get_trips_page',
+     lambda d: (d['user_id'], 8, 0, ('2022-01-01', 'infinity', 1))),
+    ('get_trips_page',
+     lambda d: (d['user_id'], 8, 0, None, ('2022-01-01', 'infinity', 1))),
+    ('find_trip_for_user', lambda d: (d['trip_id'], d['user_id'])),
+    ('find_trip_for_user',
+     lambda d: (d['activity_trip_id'], d['user_id'], d['activity_id'])),
+    ('get_itinerary_page', lambda d: (d['trip_id'], 1, 4)),
+]
+
+
+def run(storage, method, arguments, dataset):
+    result = getattr(storage, method)(*arguments(dataset))
+    return dict(result) if isinstance(result, DictRow) else result
+
+
+@pytest.mark.parametrize('method, arguments', HOT_QUERIES,
+                         ids=[name for name, _ in HOT_QUERIES])
+def test_prepared_matches_plain(large_dataset, recording_pool, method,
+                                arguments):
+    plain = Database(pool=recording_pool, cache=NullCache(), prepare=False)
+    prepared = Database(pool=recording_pool, cache=NullCache(), prepare=True)
+    try:
+        expected = run(plain, method, arguments, large_dataset)
+        # Postgres switches to a generic plan after five executions.
+        for _ in range(7):
+            assert run(prepared, method, arguments, large_dataset) == expected
+    finally:
+        plain.close()
+        prepared.close()
+
+
+def test_generic_plans_avoid_sequential_scans(
+        large_dataset, recording_pool, recorded_statements):
+    storage = Database(pool=recording_pool, cache=NullCache(), prepare=True)
+    try:
+        with storage._database_connect() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute('SET plan_cache_mode = force_generic_plan')
+        for method, arguments in HOT_QUERIES:
+            run(storage, method, arguments, large_dataset)
+
+        executed = [statement for statement in recorded_statements
+                    if statement.startswith('EXECUTE')]
+        assert len(executed) == len(HOT_QUERIES)
+        with storage._database_connect() as conn:
+            for statement in executed:
+                scans = list(sequential_scans(explain(conn, statement)))
+                assert not scans, (
+                    f"generic plan sequentially scans {', '.join(scans)}:\n"
+                    f"{statement}"
+                    )
+    finally:
+        storage.close()
+
+
+def test_statements_are_prepared_again(large_dataset, recording_pool,
+                                       recorded_statements):
+    storage = Database(pool=recording_pool, cache=NullCache(), prepare=True)
+    arguments = (large_dataset['trip_id'], large_dataset['user_id'])
+    try:
+        trip, _activity = storage.find_trip_for_user(*arguments)
+
+        # The server forgets every statement, e.g. after DISCARD ALL.
+        with storage._database_connect() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute('DEALLOCATE ALL')
+        storage._identity_map.clear()
+        assert storage.find_trip_for_user(*arguments)[0] == trip
+
+        # A new column changes the result type of trips.*.
+        with storage._database_connect() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute('ALTER TABLE trips ADD COLUMN scratch int')
+        try:
+            storage._identity_map.clear()
+            assert storage.find_trip_for_user(*arguments)[0]['scratch'] is None
+        finally:
+            with storage._database_connect() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute('ALTER TABLE trips DROP COLUMN scratch')
+
+        storage._identity_map.clear()
+        assert storage.find_trip_for_user(*arguments)[0] == trip
+    finally:
+        storage.close()
+
+    prepares = [statement for statement in recorded_statements
+                if statement.startswith('PREPARE trip_for_user')]
+    assert len(prepares) == 4
@@ -0,0 +1,193 @@
+from datetime import datetime, timedelta
+import threading
+import uuid
+
+from flask import Flask
+import psycopg2
+
+from wanderly import cli
+from wanderly.cache import NullCache
+from wanderly.database import Database
+from wanderly.reminders import FileTransport, send_due_reminders
+
+SENDER = 'Wanderly <wanderly@example.test>'
+
+# Each test plans around its own moment, well clear of other tests' data.
+MOMENTS = {
+    'edits': datetime(2031, 5, 1, 12, 0),
+    'retries': datetime(2031, 6, 1, 12, 0),
+    'workers': datetime(2031, 7, 1, 23, 30),
+}
+
+
+class FlakyTransport(FileTransport):
+
+    def __init__(self, directory, failures):
+        super().__init__(directory)
+        self.failures = failures
+
+    def send(self, message):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionRefusedError('SMTP server is down')
+        super().send(message)
+
+
+def plan_trip(storage, now, offsets):
+    user_id = storage.create_new_user(
+        'Reminder Tester', f'{uuid.uuid4().hex}@example.test', 'x')
+    storage.create_new_trip('Lisbon', now.date(), now.date() + timedelta(2),
+                            user_id)
+    trip_id = storage.get_trips_page(user_id, 1)['trips'][0]['id']
+    for minutes in offsets:
+        due = now + timedelta(minutes=minutes)
+        storage.add_new_activity(due.date(), due.strftime('%I:%M %p'),
+                                 f'Plan in {minutes} minutes', 'Bring cash',
+                                 None, trip_id)
+    return trip_id
+
+
+def sent(outbox):
+    return sorted(path.name for path in outbox.glob('*.eml'))
+
+
+def test_reminders_are_sent_once_and_follow_edits(
+        migrated_database, recording_pool, tmp_path):
+    storage = Database(pool=recording_pool, cache=NullCache())
+    now = MOMENTS['edits']
+    transport = FileTransport(tmp_path)
+    try:
+        trip_id = plan_trip(storage, now, (-30, 20, 50, 90))
+
+        counts = send_due_reminders(storage, transport, SENDER, now=now)
+        assert counts['queued'] == counts['sent'] == 2
+        assert len(sent(tmp_path)) == 2
+        message = (tmp_path / sent(tmp_path)[0]).read_text()
+        assert 'Subject: Coming up: Plan in 20 minutes' in message
+        assert 'Bring cash' in message
+
+        # Nothing is queued or sent twice.
+        counts = send_due_reminders(storage, transport, SENDER, now=now)
+        assert not any(counts.values())
+
+        # Moving a queued plan cancels its old reminder; the new time
+        # gets a reminder of its own once it comes into range.
+        plan = next(plan
+                    for plan in storage.get_itinerary_page(trip_id, 1, 4)
+                    ['plans']
+                    if plan['activity'] == 'Plan in 90 minutes')
+        assert storage.queue_reminders(now, now + timedelta(minutes=95)) == 1
+        moved = now + timedelta(minutes=150)
+        storage.edit_activity_info(moved.date(), moved.strftime('%I:%M %p'),
+                                   plan['activity'], None, None, trip_id,
+                                   plan['id'])
+        counts = send_due_reminders(storage, transport, SENDER,
+                                    now=now + timedelta(minutes=35))
+        assert counts['cancelled'] == 1 and counts['sent'] == 0
+        counts = send_due_reminders(storage, transport, SENDER,
+                                    now=now + timedelta(minutes=100))
+        assert counts['sent'] == 1
+        assert len(sent(tmp_path)) == 3
+    finally:
+        storage.close()
+
+
+def test_failed_sends_are_retried_then_given_up(
+        migrated_database, recording_pool, tmp_path):
+    storage = Database(pool=recording_pool, cache=NullCache())
+    now = MOMENTS['retries']
+    try:
+        plan_trip(storage, now, (10, 15))
+
+        counts = send_due_reminders(storage, FlakyTransport(tmp_path, 1),
+                                    SENDER, now=now)
+        assert counts['retrying'] == 1 and counts['sent'] == 1
+        counts = send_due_reminders(storage, FlakyTransport(tmp_path, 0),
+                                    SENDER, now=now,
+                                    retry_delay=timedelta(0))
+        assert counts['sent'] == 1
+        assert len(sent(tmp_path)) == 2
+
+        plan_trip(storage, now, (25,))
+        statuses = [
+            send_due_reminders(storage, FlakyTransport(tmp_path, 1), SENDER,
+                               now=now, max_attempts=3,
+                               retry_delay=timedelta(0))
+            for _ in range(4)
+        ]
+        assert [counts['retrying'] for counts in statuses] == [1, 1, 0, 0]
+        assert [counts['failed'] for counts in statuses] == [0, 0, 1, 0]
+        assert len(sent(tmp_path)) == 2
+    finally:
+        storage.close()
+
+
+def test_concurrent_workers_never_send_the_same_reminder(
+        migrated_database, recording_pool, tmp_path):
+    setup = Database(pool=recording_pool, cache=NullCache())
+    now = MOMENTS['workers']
+    try:
+        plan_trip(setup, now, range(1, 41))
+        setup.queue_reminders(now, now + timedelta(minutes=60))
+    finally:
+        setup.close()
+
+    counts = []
+
+    def worker():
+        storage = Database(pool=recording_pool, cache=NullCache())
+        try:
+            counts.append(send_due_reminders(
+                storage, FileTransport(tmp_path), SENDER, now=now,
+                batch_size=5))
+        finally:
+            storage.close()
+
+    workers = [threading.Thread(target=worker) for _ in range(2)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+
+    assert sum(count['sent'] for count in counts) == 40
+    assert len(sent(tmp_path)) == 40
+
+
+def test_worker_outlives_a_dropped_connection(
+        migrated_database, recording_pool, tmp_path, monkeypatch):
+    monkeypatch.setattr('wanderly.database._pool', recording_pool)
+    monkeypatch.setenv('REMINDER_TRANSPORT', f'file://{tmp_path}')
+    scans = []
+
+    def scan(*args, **kwargs):
+        try:
+            scans.append(send_due_reminders(*args, **kwargs))
+        except psycopg2.Error:
+            scans.append(None)
+            raise
+        return scans[-1]
+
+    def sleep(_seconds):
+        if len(scans) == 1:
+            # The server goes away and drops the worker's idle connection.
+            admin = psycopg2.connect(migrated_database)
+            try:
+                with admin.cursor() as cursor:
+                    for conn in recording_pool._idle:
+                        cursor.execute('SELECT pg_terminate_backend(%s)',
+                                       (conn.get_backend_pid(),))
+            finally:
+                admin.close()
+        elif len(scans) == 3:
+            raise KeyboardInterrupt
+
+    monkeypatch.setattr(cli, 'send_due_reminders', scan)
+    monkeypatch.setattr(cli.time, 'sleep', sleep)
+    app = Flask(__name__)
+    app.cli.add_command(cli.reminders_cli)
+    result = app.test_cli_runner().invoke(args=['reminders', 'run'])
+
+    assert result.exit_code == 0, result.output
+    assert 'Scan failed, retrying' in result.output
+    assert scans[1] is None
+    assert scans[2] is not None
@@ -0,0 +1,157 @@
+from contextlib import contextmanager
+import time
+import uuid
+
+import psycopg2
+
+from wanderly.cache import LRUCache, NullCache
+from wanderly.database import Database, measure_replica_lag
+from wanderly.pool import ConnectionPool
+
+
+def primary_position(pool):
+    with pool.connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute('SELECT pg_current_wal_lsn()::text')
+            lsn = cursor.fetchone()[0]
+        conn.rollback()
+    return lsn
+
+
+def catch_up(replica_url, lsn, timeout=10):
+    conn = psycopg2.connect(replica_url)
+    conn.autocommit = True
+    try:
+        deadline = time.monotonic() + timeout
+        with conn.cursor() as cursor:
+            while True:
+                cursor.execute('SELECT pg_last_wal_replay_lsn() >= %s::pg_lsn',
+                               (lsn,))
+                if cursor.fetchone()[0]:
+                    return
+                assert time.monotonic() < deadline, "replica fell behind"
+                time.sleep(0.05)
+    finally:
+        conn.close()
+
+
+@contextmanager
+def replay_paused(replica_url):
+    conn = psycopg2.connect(replica_url)
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute('SELECT pg_wal_replay_pause()')
+        yield
+    finally:
+        with conn.cursor() as cursor:
+            cursor.execute('SELECT pg_wal_replay_resume()')
+        conn.close()
+
+
+def make_user(recording_pool, replica_pool, replica_url):
+    storage = Database(pool=recording_pool, cache=NullCache(),
+                       replicas=[replica_pool])
+    try:
+        user_id = storage.create_new_user(
+            'Replica Tester', f'{uuid.uuid4().hex}@example.test', 'x')
+    finally:
+        storage.close()
+    catch_up(replica_url, primary_position(recording_pool))
+    return user_id
+
+
+def test_reads_go_to_a_replica_and_writes_to_the_primary(
+        recording_pool, recorded_statements, replica_pool,
+        replica_statements, replica_url):
+    user_id = make_user(recording_pool, replica_pool, replica_url)
+    recorded_statements.clear()
+
+    storage = Database(pool=recording_pool, cache=NullCache(),
+                       replicas=[replica_pool])
+    try:
+        assert storage.get_name_by_id(user_id) == 'Replica Tester'
+        assert storage.get_trips_page(user_id, 8)['total'] == 0
+        assert recorded_statements == []
+        assert replica_statements
+
+        storage.create_new_trip('Porto', '2026-05-01', '2026-05-09', user_id)
+        assert recorded_statements
+
+        # Reads after a write in the same request see it.
+        replica_statements.clear()
+        assert storage.get_trips_page(user_id, 8)['total'] == 1
+        assert replica_statements == []
+    finally:
+        storage.close()
+
+
+def test_sessions_read_their_own_writes(
+        recording_pool, replica_pool, replica_statements, replica_url):
+    user_id = make_user(recording_pool, replica_pool, replica_url)
+    cache = LRUCache()
+
+    def session(read_after=None, cache=cache):
+        return Database(pool=recording_pool, cache=cache,
+                        replicas=[replica_pool], read_after=read_after)
+
+    with replay_paused(replica_url):
+        writer = session()
+        try:
+            writer.create_new_trip('Porto', '2026-05-01', '2026-05-09',
+                                   user_id)
+            read_after = writer.read_after_writes()
+        finally:
+            writer.close()
+
+        # Another session reads from the replica, which has not replayed
+        # the trip yet, and caches what it read under the old revision.
+        other = session()
+        try:
+            assert other.get_trips_page(user_id, 8)['total'] == 0
+        finally:
+            other.close()
+
+        writers_next = session(read_after)
+        try:
+            assert writers_next.get_trips_page(user_id, 8)['total'] == 1
+        finally:
+            writers_next.close()
+
+        # Past its deadline the session reads from the replica again.
+        expired = session([read_after[0], time.time() - 1], NullCache())
+        try:
+            assert expired.get_trips_page(user_id, 8)['total'] == 0
+        finally:
+            expired.close()
+
+    catch_up(replica_url, read_after[0])
+    replica_statements.clear()
+    caught_up = session(read_after, NullCache())
+    try:
+        assert caught_up.get_trips_page(user_id, 8)['total'] == 1
+        assert replica_statements
+    finally:
+        caught_up.close()
+
+
+def test_replica_lag_is_measured(recording_pool, replica_pool, replica_url):
+    user_id = make_user(recording_pool, replica_pool, replica_url)
+    unreachable = ConnectionPool('host=/tmp port=1 dbname=nowhere',
+                                 min_size=0, checkout_timeout=1)
+
+    with replay_paused(replica_url):
+        storage = Database(pool=recording_pool, cache=NullCache())
+        try:
+            storage.create_new_trip('Porto', '2026-05-01', '2026-05-09',
+                                    user_id)
+        finally:
+            storage.close()
+
+        replica, missing = measure_replica_lag(
+            recording_pool, [replica_pool, unreachable])
+        assert replica['bytes'] > 0
+        assert replica['seconds'] >= 0
+        assert missing == {'replica': '/tmp:1/nowhere', 'bytes': None,
+                           'seconds': None}
+    unreachable.close()
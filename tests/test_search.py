@@ -0,0 +1,95 @@
+import uuid
+
+from wanderly.cache import NullCache
+from wanderly.database import Database, highlight_parts, prefix_tsquery
+
+
+def test_highlight_parts_and_prefix_queries():
+    assert highlight_parts('best \x02ramen\x03 <place>') == [
+        ('best ', False), ('ramen', True), (' <place>', False)]
+    assert highlight_parts('') == []
+
+    assert prefix_tsquery("ram' pl") == "'ram':* & 'pl':*"
+    assert prefix_tsquery(" ' & ! ") == ''
+
+
+def make_traveler(storage, destination):
+    user_id = storage.create_new_user(
+        'Search Tester', f'{uuid.uuid4().hex}@example.test', 'x')
+    storage.create_new_trip(destination, '2026-05-01', '2026-05-09', user_id)
+    trip = storage.get_trips_page(user_id, 1)['trips'][0]
+    return user_id, trip['id']
+
+
+def titles(page):
+    return [''.join(text for text, _ in result['title'])
+            for result in page['results']]
+
+
+def test_search_is_scoped_ranked_and_kept_current(
+        migrated_database, recording_pool):
+    storage = Database(pool=recording_pool, cache=NullCache())
+    try:
+        user_id, trip_id = make_traveler(storage, 'Tokyo')
+        other_id, other_trip_id = make_traveler(storage, 'Osaka')
+        storage.add_new_activity('2026-05-02', None, 'Ramen at Ichiran',
+                                 'the best ramen place', None, trip_id)
+        storage.add_new_activity('2026-05-02', None, 'Sushi breakfast',
+                                 'ramen stall next door', None, trip_id)
+        storage.add_new_activity('2026-05-02', None, 'Ramen crawl', None,
+                                 None, other_trip_id)
+
+        page = storage.search(user_id, 'ramen', 10)
+        # A match in the title outranks one in the note.
+        assert titles(page) == ['Ramen at Ichiran', 'Sushi breakfast']
+        assert page['results'][0]['title'][0] == ('Ramen', True)
+        assert ('ramen', True) in page['results'][1]['note']
+        assert titles(storage.search(other_id, 'ramen', 10)) == [
+            'Ramen crawl']
+
+        # Plans match on their trip's destination too, and follow renames.
+        assert 'Ramen at Ichiran' in titles(
+            storage.search(user_id, 'tokyo ramen', 10))
+        storage.edit_trip_heading('Kyoto', '2026-05-01', '2026-05-09',
+                                  trip_id)
+        assert titles(storage.search(user_id, 'kyoto ramen', 10)) == [
+            'Ramen at Ichiran', 'Sushi breakfast']
+        assert storage.search(user_id, 'tokyo', 10)['results'] == []
+
+        plan = storage.get_itinerary_page(trip_id, 1, 4)['plans'][0]
+        storage.edit_activity_info('2026-05-02', None, 'Udon lunch', None,
+                                   None, trip_id, plan['id'])
+        assert 'Udon lunch' in titles(storage.search(user_id, 'udon', 10))
+        storage.delete_activity_by_id(trip_id, plan['id'])
+        assert storage.search(user_id, 'udon', 10)['results'] == []
+    finally:
+        storage.close()
+
+
+def test_search_pages_and_suggestions(migrated_database, recording_pool):
+    storage = Database(pool=recording_pool, cache=NullCache())
+    try:
+        user_id, trip_id = make_traveler(storage, 'Lisbon')
+        for number in range(25):
+            note = 'museum pass' if number % 3 == 0 else None
+            storage.add_new_activity('2026-05-03', None,
+                                     f'Museum {number}', note, None, trip_id)
+
+        seen = []
+        after = None
+        while True:
+            page = storage.search(user_id, 'museum', 10, after)
+            seen.extend(result['id'] for result in page['results'])
+            if not page['has_more']:
+                break
+            last = page['results'][-1]
+            after = (last['rank'], last['id'])
+        assert len(seen) == len(set(seen)) == 25
+
+        # The trip itself ranks above the plans that only match its name.
+        assert storage.suggest(user_id, 'lis')[0] == 'Lisbon'
+        suggestions = storage.suggest(user_id, 'mus', limit=5)
+        assert len(suggestions) == len(set(suggestions)) == 5
+        assert storage.suggest(user_id, '  ') == []
+    finally:
+        storage.close()
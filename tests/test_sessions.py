@@ -0,0 +1,169 @@
+from datetime import datetime, timedelta, timezone
+
+from flask import Flask, g, session
+
+from wanderly.cache import NullCache
+from wanderly.database import Database
+from wanderly.pool import ConnectionPool
+from wanderly.sessions import (
+    MemorySessionStore,
+    PostgresSessionStore,
+    ServerSessionInterface,
+    )
+
+
+def make_app(store, key='current', fallbacks=()):
+    app = Flask(__name__)
+    app.secret_key = key
+    app.config['SECRET_KEY_FALLBACKS'] = list(fallbacks)
+    app.session_interface = ServerSessionInterface(store)
+
+    @app.route('/login/<int:user_id>')
+    def login(user_id):
+        session['user_id'] = user_id
+        return ''
+
+    @app.route('/whoami')
+    def whoami():
+        return str(session.get('user_id'))
+
+    @app.route('/note/<text>')
+    def note(text):
+        session['note'] = text
+        return ''
+
+    @app.route('/logout')
+    def logout():
+        session.clear()
+        return ''
+
+    return app
+
+
+def session_cookie(client):
+    cookie = client.get_cookie('session')
+    return cookie.value if cookie else None
+
+
+def test_cookie_holds_only_a_signed_id():
+    store = MemorySessionStore()
+    client = make_app(store).test_client()
+
+    assert client.get('/whoami').text == 'None'
+    assert session_cookie(client) is None
+    assert not store._sessions
+
+    client.get('/login/7')
+    cookie = session_cookie(client)
+    assert cookie.rsplit('.', 1)[0] in store._sessions
+    assert client.get('/whoami').text == '7'
+    assert len(store._sessions) == 1
+
+    # Other changes keep the id; signing in again gets a new one.
+    client.get('/note/hello')
+    assert session_cookie(client) == cookie
+    client.get('/login/8')
+    assert session_cookie(client) != cookie
+    assert len(store._sessions) == 1
+
+    client.get('/logout')
+    assert session_cookie(client) is None
+    assert not store._sessions
+
+
+def test_forged_and_unknown_ids_start_a_new_session():
+    store = MemorySessionStore()
+    app = make_app(store)
+    client = app.test_client()
+    client.set_cookie('session', 'chosen-by-client.bad-signature')
+    assert client.get('/whoami').text == 'None'
+
+    signer = app.session_interface._signer(app)
+    client.set_cookie('session', signer.sign('unknown').decode())
+    client.get('/login/7')
+    assert not session_cookie(client).startswith('unknown.')
+
+
+def test_rotated_keys_keep_sessions():
+    store = MemorySessionStore()
+    old = make_app(store, key='old').test_client()
+    old.get('/login/7')
+    cookie = session_cookie(old)
+
+    rotated = make_app(store, key='new', fallbacks=['old']).test_client()
+    rotated.set_cookie('session', cookie)
+    assert rotated.get('/whoami').text == '7'
+
+    # Once the old key is dropped, its cookies stop working.
+    retired = make_app(store, key='new').test_client()
+    retired.set_cookie('session', cookie)
+    assert retired.get('/whoami').text == 'None'
+
+    # New cookies are signed with the current key alone.
+    rotated.get('/login/8')
+    current = make_app(store, key='new').test_client()
+    current.set_cookie('session', session_cookie(rotated))
+    assert current.get('/whoami').text == '8'
+
+
+def test_memory_store_expires_lazily():
+    store = MemorySessionStore()
+    past = datetime.now(timezone.utc) - timedelta(seconds=1)
+    store.save('gone', '{}', past)
+    store.save('kept', '{}', past + timedelta(days=1))
+
+    assert store.load('gone') is None
+    assert store.purge() == 1
+    assert set(store._sessions) == {'kept'}
+
+
+def test_postgres_store(migrated_database, recording_pool):
+    def stored_sessions():
+        with recording_pool.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT COUNT(*) FROM sessions')
+                count = cursor.fetchone()[0]
+            conn.rollback()
+        return count
+
+    # Other tests' datasets may hold sessions that have not expired.
+    before = stored_sessions()
+    store = PostgresSessionStore(pool=recording_pool)
+    client = make_app(store).test_client()
+    client.get('/login/7')
+    assert client.get('/whoami').text == '7'
+
+    past = datetime.now(timezone.utc) - timedelta(seconds=1)
+    store.save('expired', '{}', past)
+    assert store.load('expired') is None
+    assert store.purge() >= 1
+
+    client.get('/logout')
+    assert stored_sessions() == before
+
+
+def test_postgres_store_shares_the_requests_connection(migrated_database):
+    pool = ConnectionPool(migrated_database, min_size=0, max_size=1,
+                          checkout_timeout=1)
+    app = make_app(PostgresSessionStore(pool=pool))
+
+    @app.before_request
+    def load_db():
+        g.storage = Database(pool=pool, cache=NullCache())
+
+    @app.teardown_request
+    def release_db(_exception):
+        g.pop('storage').close()
+
+    @app.route('/trips/<int:user_id>')
+    def trips(user_id):
+        g.storage.get_trips_version(user_id)
+        session['user_id'] = user_id
+        return ''
+
+    # The request holds the pool's only connection while its session is
+    # saved.
+    client = app.test_client()
+    assert client.get('/trips/7').status_code == 200
+    assert client.get('/whoami').text == '7'
+    pool.close()
@@ -0,0 +1,75 @@
+from wanderly.cache import NullCache
+from wanderly.database import Database
+
+
+def test_triggers_keep_totals_in_step(large_dataset, recording_pool):
+    storage = Database(pool=recording_pool, cache=NullCache())
+    trip_id = large_dataset['activity_trip_id']
+    try:
+        assert storage.check_plan_totals() == {
+            'day_mismatches': 0,
+            'trip_mismatches': 0,
+        }
+
+        storage.add_new_activity('2026-05-02', '10:00 AM', 'Tram 28', None,
+                                 12, trip_id)
+        storage.edit_activity_info(None, None, 'Ferry', None, 4, trip_id,
+                                   large_dataset['activity_id'])
+        storage.delete_day_for_trip(trip_id, large_dataset['day'])
+        storage.delete_trip_by_id(large_dataset['day_trip_id'])
+
+        assert storage.check_plan_totals() == {
+            'day_mismatches': 0,
+            'trip_mismatches': 0,
+        }
+    finally:
+        storage.close()
+
+
+def test_rebuild_repairs_drift(large_dataset, recording_pool):
+    storage = Database(pool=recording_pool, cache=NullCache())
+    try:
+        with storage._database_connect() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    'UPDATE trip_totals SET total_cost = total_cost + 1 '
+                    'WHERE trip_id = %s', (large_dataset['trip_id'],))
+
+        assert storage.check_plan_totals()['trip_mismatches'] == 1
+        trip, _ = storage.find_trip_for_user(large_dataset['trip_id'],
+                                             large_dataset['user_id'])
+        other, _ = storage.find_trip_for_user(
+            large_dataset['activity_trip_id'], large_dataset['user_id'])
+        version = storage.get_trips_version(large_dataset['user_id'])
+
+        assert storage.rebuild_plan_totals() == 1
+        assert not any(storage.check_plan_totals().values())
+
+        # The repaired trip and its owner's list get new validators.
+        rebuilt, _ = storage.find_trip_for_user(large_dataset['trip_id'],
+                                                large_dataset['user_id'])
+        untouched, _ = storage.find_trip_for_user(
+            large_dataset['activity_trip_id'], large_dataset['user_id'])
+        assert rebuilt['revision'] == trip['revision'] + 1
+        assert untouched['revision'] == other['revision']
+        assert storage.get_trips_version(
+            large_dataset['user_id'])['revision'] == version['revision'] + 1
+    finally:
+        storage.close()
+
+
+def test_itinerary_day_matches_its_page(large_dataset, recording_pool):
+    storage = Database(pool=recording_pool, cache=NullCache())
+    trip_id = large_dataset['trip_id']
+    try:
+        page = storage.get_itinerary_page(trip_id, 1, 50)
+        for date, totals in page['day_totals'].items():
+            day = storage.get_itinerary_day(trip_id, date or None)
+            assert day['totals'] == totals
+            assert day['plans'] == [
+                plan for plan in page['plans']
+                if (plan['at_date'] or '') == date]
+
+        assert storage.get_itinerary_day(trip_id, '1999-01-01') is None
+    finally:
+        storage.close()
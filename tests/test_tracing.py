@@ -0,0 +1,46 @@
+import re
+
+from wanderly.tracing import Trace, end_trace, start_trace, timed
+
+TIMING = re.compile(r'^[a-z]+;dur=\d+\.\d(;desc="[^"]*")?$')
+
+
+def test_server_timing_header():
+    trace = Trace()
+    trace.record_query('SELECT 1', 'SELECT 1', 0.0123, 1)
+    trace.record_query('SELECT 2', 'SELECT 2', 0.0011, 1)
+    trace.timings['tpl'] += 0.004
+
+    header = trace.server_timing()
+    parts = header.split(', ')
+    assert all(TIMING.match(part) for part in parts)
+    assert parts[0] == 'db;dur=13.4;desc="2 queries"'
+    assert parts[1] == 'tpl;dur=4.0'
+    assert [part.split(';')[0] for part in parts] == ['db', 'tpl', 'total']
+
+
+def test_timings_go_to_the_current_trace():
+    trace = start_trace()
+    try:
+        with timed('bcrypt'):
+            pass
+    finally:
+        end_trace()
+    with timed('bcrypt'):
+        pass
+
+    assert 'bcrypt' in trace.timings
+    assert trace.server_timing().split(', ')[1].startswith('bcrypt;dur=')
+    assert trace.server_timing().startswith('db;dur=0.0;desc="0 queries"')
+
+
+def test_repeated_statements():
+    trace = Trace()
+    trace.method = 'find_trip_for_user'
+    for _ in range(3):
+        trace.record_query('SELECT * FROM trips WHERE id = %s', '', 0.001, 1)
+    trace.method = None
+    trace.record_query('SELECT 1', 'SELECT 1', 0.001, 1)
+
+    assert trace.repeated_statements() == [
+        ('SELECT * FROM trips WHERE id = %s', 3, ['find_trip_for_user'])]
@@ -0,0 +1,138 @@
+from datetime import date
+
+from wanderly.utils import (
+    decode_cursor,
+    decode_past_cursor,
+    decode_search_cursor,
+    encode_cursor,
+    encode_past_cursor,
+    encode_search_cursor,
+    error_for_plan_batch,
+    error_for_plan_operation,
+    finish_plan_batch,
+    page_window,
+    plan_batch_results,
+    plan_fields,
+    split_plan_batch,
+    )
+
+
+def test_plan_operations_are_validated():
+    def errors(operation, seen_ids=None):
+        return error_for_plan_operation(
+            operation, set() if seen_ids is None else seen_ids)
+
+    assert errors(['create']) == ["Operation must be an object."]
+    assert errors({'op': 'upsert'}) == [
+        "op must be one of create, update or delete."]
+    assert errors({'op': 'create', 'activity': 'Tram 28', 'cost': 3}) == []
+    assert errors({'op': 'create', 'activity': 'Tram 28',
+                   'cost': '1,250.50', 'date': '2026-05-02',
+                   'time': '10:00 AM'}) == []
+    assert errors({'op': 'create'}) == ["Activity description is required."]
+    assert errors({'op': 'create', 'activity': 'Tram 28',
+                   'cost': [3]}) == ["cost must be a number or string."]
+    assert errors({'op': 'create', 'activity': 'Tram 28',
+                   'cost': True}) == ["cost must be a number or string."]
+    assert errors({'op': 'create', 'activity': 7}) == [
+        "activity must be a string."]
+    assert errors({'op': 'create', 'activity': 'Tram 28',
+                   'cost': '-1'}) == [
+                       "Cost must be greater than or equal to 0."]
+    assert errors({'op': 'create', 'activity': 'Tram 28',
+                   'time': '25:00'}) == [
+                       "Time must be in HH:MM AM/PM format."]
+
+
+def test_plan_operation_ids():
+    seen_ids = set()
+    assert error_for_plan_operation({'op': 'delete', 'id': 4},
+                                    seen_ids) == []
+    assert error_for_plan_operation({'op': 'update', 'id': 4,
+                                     'activity': 'Ferry'}, seen_ids) == [
+        "Activity 4 appears in more than one operation."]
+    assert error_for_plan_operation({'op': 'delete', 'id': '4'},
+                                    seen_ids) == ["id must be an integer."]
+    assert error_for_plan_operation({'op': 'delete', 'id': True},
+                                    seen_ids) == ["id must be an integer."]
+
+
+def test_plan_fields_match_the_activity_form():
+    assert plan_fields({'activity': ' Tram 28 ', 'cost': '1,250',
+                        'note': '', 'date': None}) == (
+        None, None, 'Tram 28', None, '1250')
+    assert plan_fields({'activity': 'Ferry', 'cost': 4}) == (
+        None, None, 'Ferry', None, '4')
+
+
+def test_plan_batches():
+    assert error_for_plan_batch({'operations': []}, 2)[1] == 400
+    assert error_for_plan_batch([], 2)[1] == 400
+    assert error_for_plan_batch({'operations': [{}] * 3}, 2)[1] == 413
+
+    trip = {'depart_date': date(2026, 5, 1), 'return_date': date(2026, 5, 9)}
+    operations = [
+        {'op': 'create', 'activity': 'Tram 28', 'date': '2026-06-01'},
+        {'op': 'update', 'id': 4, 'activity': 'Ferry'},
+        {'op': 'delete', 'id': 5},
+    ]
+    results = plan_batch_results(operations)
+    creates, updates, deletes = split_plan_batch(operations, results, trip)
+    assert creates == [('2026-06-01', None, 'Tram 28', None, None)]
+    assert updates == [(4, None, None, 'Ferry', None, None)]
+    assert deletes == [5]
+    assert 'warning' in results[0]
+
+    assert finish_plan_batch(results, {'created': [9], 'missing': []})
+    assert [(result['id'], result['status']) for result in results] == [
+        (9, 'created'), (4, 'updated'), (5, 'deleted')]
+
+    results = plan_batch_results(operations)
+    split_plan_batch(operations, results, trip)
+    assert not finish_plan_batch(results, {'created': [], 'missing': [5]})
+    assert [result['status'] for result in results] == [
+        'skipped', 'skipped', 'not_found']
+
+    dateless = {'depart_date': None, 'return_date': None}
+    results = plan_batch_results(operations)
+    creates, _, _ = split_plan_batch(operations, results, dateless)
+    assert creates == [('2026-06-01', None, 'Tram 28', None, None)]
+    assert not any('warning' in result for result in results)
+
+    results = plan_batch_results([{'op': 'create'}, {'op': 'delete', 'id': 1}])
+    assert not finish_plan_batch(results, None)
+    assert [result['status'] for result in results] == ['invalid', 'skipped']
+
+
+def test_cursors_round_trip():
+    trip = {'depart_date': date(2026, 5, 1), 'return_date': None, 'id': 7}
+    assert decode_cursor(encode_cursor(trip)) == (
+        '2026-05-01', 'infinity', 7)
+    assert decode_search_cursor(
+        encode_search_cursor({'rank': 0.25, 'id': 3})) == (0.25, 3)
+    assert decode_past_cursor(encode_past_cursor(
+        {'return_date': date(2020, 1, 2), 'id': 9})) == ('2020-01-02', 9)
+    # Cursors are URL-safe and unpadded.
+    assert '=' not in encode_cursor(trip)
+
+
+def test_bad_cursors_are_rejected():
+    past = encode_past_cursor({'return_date': date(2020, 1, 2), 'id': 9})
+    search = encode_search_cursor({'rank': 0.25, 'id': 3})
+    trip = encode_cursor({'depart_date': date(2026, 5, 1),
+                          'return_date': date(2026, 5, 9), 'id': 7})
+    for cursor in ('', '!!!', 'e30', past[:-2], search):
+        assert decode_cursor(cursor) is None
+    for cursor in ('', 'bnVsbA', trip, search):
+        assert decode_past_cursor(cursor) is None
+    for cursor in ('', past, trip):
+        assert decode_search_cursor(cursor) is None
+
+
+def test_page_window():
+    assert page_window(1, 1) == [1]
+    assert page_window(1, 3) == [1, 2, 3]
+    assert page_window(1, 10) == [1, 2, 3, None, 10]
+    assert page_window(6, 10) == [1, None, 4, 5, 6, 7, 8, None, 10]
+    assert page_window(10, 10) == [1, None, 8, 9, 10]
+    assert page_window(4, 10) == [1, 2, 3, 4, 5, 6, None, 10]